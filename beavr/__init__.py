@@ -3,3 +3,5 @@
 # Copyright (C) North Carolina State University, 2016. It is licensed under
 # the three-clause BSD license; see LICENSE.
 #
+
+__version__ = "1.0"
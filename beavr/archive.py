@@ -0,0 +1,370 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+"""
+Access to pipeline execution data, either in a zip archive or in a directory
+laid out like one
+
+DataLoaders read their archive through the parts of the ZipFile interface
+which DirectoryArchive also provides.  Members which are stored as they are,
+files in a directory or zip members without compression, can be
+memory-mapped, so reading them needs neither decompression nor read calls;
+chunks of them are sliced straight out of the mapping.
+
+Archives of version 2 or later, as announced by the version option in the
+[archive] section of visinfo.cfg, hold the loaded data as typed arrays in
+.npy members instead of the text files a pipeline writes; see beavr.pack.
+"""
+
+import mmap
+import os
+import struct
+import time
+from io import BytesIO
+from os import path
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED, ZIP_STORED, ZIP64_LIMIT
+
+import numpy as np
+
+# Version of archives written by beavr.pack
+packed_version = 2
+# Alignment of the data of uncompressed .npy members, in bytes
+array_alignment = 64
+
+
+class DirectoryArchive(object):
+    """
+    A directory laid out like an archive, with the parts of the ZipFile
+    interface that DataLoaders use
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: name of the directory holding the members
+        """
+        if not path.isdir(directory):
+            raise IOError('Not a directory: {0}'.format(directory))
+        self.filename = directory
+
+    def member_path(self, name):
+        """Get the path of the file holding a member"""
+        return path.join(self.filename, *name.split('/'))
+
+    def namelist(self):
+        """Get the names of the members, with / separating directories"""
+        names = []
+        for root, dirs, files in os.walk(self.filename):
+            dirs.sort()
+            relative = path.relpath(root, self.filename)
+            prefix = '' if relative == '.' else \
+                    '/'.join(relative.split(os.sep)) + '/'
+            names.extend(prefix + name for name in sorted(files))
+        return names
+
+    def infolist(self):
+        """Get a ZipInfo for each member, giving its name and size"""
+        return [self.getinfo(name) for name in self.namelist()]
+
+    def getinfo(self, name):
+        """
+        Get a ZipInfo for a member
+        :raises KeyError: if there is no such member
+        """
+        member_path = self.member_path(name)
+        if not path.isfile(member_path):
+            raise KeyError('There is no item named {0!r} in the '
+                    'archive'.format(name))
+        info = ZipInfo(name)
+        info.file_size = info.compress_size = path.getsize(member_path)
+        info.compress_type = ZIP_STORED
+        return info
+
+    def open(self, name, mode='r'):
+        """Open a member for reading"""
+        self.getinfo(name)
+        return open(self.member_path(name), 'rb')
+
+    def read(self, name):
+        """Read the whole of a member"""
+        with self.open(name) as member_file:
+            return member_file.read()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class MappedFile(object):
+    """
+    Read-only file object for part of a memory-mapped file.  Data read is
+    sliced straight out of the mapping.
+    """
+
+    def __init__(self, mapping, start, end):
+        """
+        :param mapping: mmap object, which is closed with this file
+        :param start: offset of the first byte of the file in the mapping
+        :param end: offset one past the last byte of the file
+        """
+        self.mapping = mapping
+        self.start = start
+        self.end = end
+        self.position = start
+
+    def read(self, n=-1):
+        stop = self.end if n < 0 else min(self.position + n, self.end)
+        data = self.mapping[self.position:stop]
+        self.position = stop
+        return data
+
+    def readline(self, limit=-1):
+        stop = self.mapping.find('\n', self.position, self.end)
+        stop = self.end if stop == -1 else stop + 1
+        if limit >= 0:
+            stop = min(stop, self.position + limit)
+        return self.read(stop - self.position)
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def close(self):
+        self.mapping.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_archive(filename):
+    """
+    Open pipeline execution data
+    :param filename: name of a zip archive, or of a directory laid out like
+                     one
+    :returns: ZipFile or DirectoryArchive
+    """
+    if path.isdir(filename):
+        return DirectoryArchive(filename)
+    return ZipFile(filename, 'r')
+
+
+def map_member(archive, name):
+    """
+    Memory-map a member of an archive, if it is stored without compression
+    :param archive: ZipFile or DirectoryArchive
+    :param name: name of the member
+    :returns: MappedFile, or None if the member cannot be mapped
+    """
+    info = archive.getinfo(name)
+    if info.file_size == 0:
+        return None
+    if isinstance(archive, DirectoryArchive):
+        return map_file(archive.member_path(name), 0, info.file_size)
+
+    # Only unencrypted members stored as they are can be read in place
+    if (info.compress_type != ZIP_STORED or info.flag_bits & 0x1 or
+            archive.filename is None or not path.isfile(archive.filename)):
+        return None
+    with open(archive.filename, 'rb') as zip_file:
+        # The member's data follows its local header, whose name and extra
+        # field lengths may differ from those in the central directory
+        zip_file.seek(info.header_offset)
+        header = zip_file.read(30)
+        if len(header) != 30 or header[:4] != 'PK\x03\x04':
+            return None
+        name_length, extra_length = struct.unpack('<HH', header[26:30])
+    start = info.header_offset + 30 + name_length + extra_length
+    return map_file(archive.filename, start, start + info.file_size)
+
+
+def map_file(filename, start, end):
+    """
+    Memory-map part of a file
+    :returns: MappedFile, or None if the file cannot be mapped
+    """
+    try:
+        with open(filename, 'rb') as mapped_file:
+            mapping = mmap.mmap(mapped_file.fileno(), 0,
+                    access=mmap.ACCESS_READ)
+    except (IOError, OSError, ValueError, mmap.error):
+        return None
+    if end > len(mapping):
+        mapping.close()
+        return None
+    return MappedFile(mapping, start, end)
+
+
+def read_member(archive, name):
+    """
+    Read the whole of a member of an archive, from a memory mapping if it can
+    be mapped
+    """
+    mapped = map_member(archive, name)
+    if mapped is None:
+        return archive.read(name)
+    with mapped:
+        return mapped.read()
+
+
+def sample_member(archive, name, size):
+    """
+    Read the first and last bytes of a member of an archive, without reading
+    the rest
+    :param archive: ZipFile or DirectoryArchive
+    :param name: name of the member
+    :param size: number of bytes to read from each end
+    :returns: tuple of the first bytes, which are the whole member if it is
+              at most 2 * size bytes long, and the last bytes, or None if
+              the whole member was read or its end cannot be reached without
+              decompressing all of it
+    :raises KeyError: if there is no such member
+    """
+    info = archive.getinfo(name)
+    if info.file_size <= 2 * size:
+        return archive.read(name), None
+
+    mapped = map_member(archive, name)
+    if mapped is None:
+        with archive.open(name) as member_file:
+            return member_file.read(size), None
+    with mapped:
+        head = mapped.read(size)
+        mapped.position = mapped.end - size
+        return head, mapped.read()
+
+
+def line_start(tail):
+    """Find where the first whole line of a sample from a member starts"""
+    return tail.find('\n') + 1
+
+
+def line_end(head):
+    """Find where the last whole line of a sample from a member ends"""
+    return head.rfind('\n') + 1
+
+
+def check_samples(parse, head, tail, whole, head_end=line_end,
+        tail_start=line_start):
+    """
+    Parse samples from a member of an archive, cut to whole records
+    :param parse: function parsing a string of whole records, which raises
+                  ValueError if they are malformed
+    :param head: first bytes of the member, as returned by sample_member
+    :param tail: last bytes of the member, or None
+    :param whole: whether head is the whole member
+    :param head_end: function finding where the last whole record of head
+                     ends
+    :param tail_start: function finding where the first whole record of
+                       tail starts
+    :raises ValueError: saying which end of the member is malformed
+    """
+    if whole:
+        if head:
+            parse(head)
+        return
+    samples = [('start', head[:head_end(head)])]
+    if tail is not None:
+        samples.append(('end', tail[tail_start(tail):]))
+    for where, sample in samples:
+        if not sample:
+            continue
+        try:
+            parse(sample)
+        except ValueError as e:
+            raise ValueError('{0} near the {1}'.format(e, where))
+
+
+def check_array(head, tail, whole):
+    """Check that samples of a member start like a .npy file"""
+    if not head.startswith(np.lib.format.MAGIC_PREFIX):
+        raise ValueError('Not a .npy array')
+    try:
+        np.lib.format.read_magic(BytesIO(head))
+    except ValueError as e:
+        raise ValueError('Malformed .npy array: {0}'.format(e))
+
+
+def archive_version(parser):
+    """
+    Get the layout version of an archive
+    :param parser: ConfigParser holding the archive's visinfo.cfg
+    :returns: version number, which is 1 for archives written by pipelines
+    """
+    if parser.has_option('archive', 'version'):
+        return parser.getint('archive', 'version')
+    return 1
+
+
+def read_array(archive, name):
+    """
+    Read an array from a .npy member of an archive.  Uncompressed members
+    are memory-mapped, and the array refers to the mapping without copying.
+    :param archive: ZipFile or DirectoryArchive
+    :param name: name of the member
+    :returns: read-only array
+    """
+    mapped = map_member(archive, name)
+    if mapped is None:
+        array = np.load(BytesIO(archive.read(name)))
+        array.flags.writeable = False
+        return array
+
+    version = np.lib.format.read_magic(mapped)
+    if version == (1, 0):
+        shape, fortran_order, dtype = \
+                np.lib.format.read_array_header_1_0(mapped)
+    else:
+        shape, fortran_order, dtype = \
+                np.lib.format.read_array_header_2_0(mapped)
+    count = int(np.prod(shape))
+    if count == 0:
+        mapped.close()
+        return np.zeros(shape, dtype=dtype)
+    array = np.frombuffer(mapped.mapping, dtype=dtype, count=count,
+            offset=mapped.position)
+    return array.reshape(shape, order='F' if fortran_order else 'C')
+
+
+def write_array(zip_file, name, array, compress=False):
+    """
+    Write an array to a .npy member of a zip archive.  Uncompressed members
+    are padded so that their data is aligned for memory-mapping.
+    :param zip_file: ZipFile open for writing
+    :param name: name of the member
+    :param array: array to write
+    :param compress: whether to deflate the member
+    """
+    data = BytesIO()
+    np.save(data, np.asarray(array))
+    data = data.getvalue()
+
+    info = ZipInfo(name, time.localtime()[:6])
+    info.external_attr = 0644 << 16
+    if compress:
+        info.compress_type = ZIP_DEFLATED
+    else:
+        info.compress_type = ZIP_STORED
+        # Pad the local header with an extra field, so the member's data
+        # starts on an aligned offset.  Large members also get a Zip64 extra
+        # field of 20 bytes.
+        header_end = zip_file.fp.tell() + 30 + len(name) + 4
+        if len(data) > ZIP64_LIMIT:
+            header_end += 20
+        padding = -header_end % array_alignment
+        info.extra = struct.pack('<HH', 0xbea5, padding) + '\0' * padding
+    zip_file.writestr(info, data)
@@ -0,0 +1,59 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+"""
+Benchmarks of BEAVr's loaders and backends, each runnable as
+python -m beavr.bench.NAME
+"""
+
+import ctypes
+import gc
+import time
+from multiprocessing import Pipe, Process
+
+from beavr.loadstats import peak_memory, reset_peak_memory
+
+
+def _current_rss():
+    """
+    Reset the peak memory use Linux reports for this process to its current
+    memory use, and return that, in bytes.  Elsewhere, just return the peak
+    so far.
+    """
+    # Hand memory freed before the fork back to the system, or the function
+    # being measured could reuse it without its memory use showing
+    gc.collect()
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+    current = reset_peak_memory()
+    return peak_memory() if current is None else current
+
+
+def _measure_child(connection, func, args):
+    """Run func(*args) and send back the time taken and memory used"""
+    start_rss = _current_rss()
+    start = time.time()
+    func(*args)
+    elapsed = time.time() - start
+    connection.send((elapsed, peak_memory() - start_rss))
+    connection.close()
+
+
+def measure(func, *args):
+    """
+    Time a function in a fresh child process, so that the growth of the
+    process's peak memory use shows how much memory the function needed
+    :returns: tuple of the time taken in seconds and the peak memory growth
+              in bytes
+    """
+    receiver, sender = Pipe(False)
+    child = Process(target=_measure_child, args=(sender, func, args))
+    child.start()
+    result = receiver.recv()
+    child.join()
+    return result
@@ -0,0 +1,184 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+"""
+Benchmark of the DP table parser against the original line-by-line parser,
+comparing both the time taken and the size of the resulting tables
+
+Run with: python -m beavr.bench.dptable [ARCHIVE...]
+"""
+
+import argparse
+import ast
+import random
+import sys
+import time
+from cStringIO import StringIO
+from zipfile import ZipFile
+
+from beavr.concuss.dptable import read_dp_table
+
+
+def legacy_read_dp_table(dp_table_file):
+    """
+    The DP table parser BEAVr used before beavr.concuss.dptable, kept as the
+    baseline for this benchmark
+    """
+    table = {}
+    line = dp_table_file.readline().strip()
+    # Read until we reach eof
+    while line != "":
+        # Check if we have a new block
+        block = line[-1] == "{"
+        # If we have a block
+        if block:
+            # Get the vertices
+            vertex_list = [int(num) for num in line[1: line.find(']')].split(",")]
+            # Read the first line in the block
+            block_line = dp_table_file.readline().strip()
+            # Make a list to store each entry in the block
+            values = []
+            # Loop until we reach end of block
+            while block_line != "}":
+                # For each line in the block make a list
+                block_entry = []
+                # Get the count, k_pat_vertices and boundary from that line
+                count, k_pat_vertices, k_pat_boundary = tuple(block_line.split(";"))
+                # Get terms in the boundary
+                terms = []
+                for term in k_pat_boundary.strip()[1:-1].split(","):
+                    if term != "":
+                        terms.append(term.strip())
+                # Make a dictionary that represents pi
+                pi = {}
+                # Populate pi
+                for term in terms:
+                    key_val = term.split(":")
+                    pi[int(key_val[0])] = int(key_val[1])
+                # Add the count, k_pat_vertices and pi to our list
+                block_entry.append(int(count))
+                block_entry.append(ast.literal_eval(k_pat_vertices.strip()))
+                block_entry.append(pi)
+                # Add entry to values
+                values.append(block_entry)
+                # Go to the next line in the block
+                block_line = dp_table_file.readline().strip()
+            # Add $vertex_list$ as key and $values$ as value
+            table[tuple(vertex_list)] = values
+        # Get the next line in the file
+        line = dp_table_file.readline().strip()
+    # return the DP table
+    return table
+
+
+def write_synthetic_dp_table(out, blocks, rows_per_block, pattern_size=4,
+        depth=6, seed=0):
+    """
+    Write a DP table in the CONCUSS format with random contents
+    :param out: file object to write to
+    :param blocks: number of blocks
+    :param rows_per_block: number of k-pattern rows in each block
+    :param pattern_size: number of vertices in the pattern
+    :param depth: largest number of vertices in the key of a block
+    :param seed: seed for the random number generator
+    """
+    rand = random.Random(seed)
+    pattern = range(pattern_size)
+    for block in range(blocks):
+        key = [block * depth + i for i in range(rand.randint(1, depth))]
+        out.write('[{0}] {{\n'.format(', '.join(map(str, key))))
+        for _ in range(rows_per_block):
+            vertices = sorted(rand.sample(pattern,
+                rand.randint(0, pattern_size)))
+            boundary = rand.sample(vertices, rand.randint(0, len(vertices)))
+            out.write('\t{0}; [{1}]; [{2}]\n'.format(
+                rand.randint(1, 10 ** 6), ', '.join(map(str, vertices)),
+                ', '.join('{0}:{1}'.format(v, i)
+                    for i, v in enumerate(boundary))))
+        out.write('}\n')
+
+
+def legacy_table_size(table):
+    """
+    Estimate the number of bytes used by a table from legacy_read_dp_table,
+    counting every object it refers to once
+    """
+    seen = set()
+    size = 0
+    stack = [table]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.iterkeys())
+            stack.extend(obj.itervalues())
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+    return size
+
+
+def time_parsers(data, repeat=3):
+    """
+    Time both parsers on the given DP table contents
+    :returns: tuple of the best times of the legacy and new parsers, and the
+              sizes of the tables they return in bytes
+    """
+    results = []
+    for parser in legacy_read_dp_table, read_dp_table:
+        best = None
+        for _ in range(repeat):
+            start = time.time()
+            table = parser(StringIO(data))
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results.append(best)
+        if parser is legacy_read_dp_table:
+            legacy_size = legacy_table_size(table)
+        else:
+            size = table.nbytes() + legacy_table_size(table.index)
+        del table
+    return tuple(results) + (legacy_size, size)
+
+
+def report(name, data, repeat):
+    """Time both parsers and print a line comparing them"""
+    legacy, chunked, legacy_size, size = time_parsers(data, repeat)
+    print '{0:<28} {1:>10.1f} KB  legacy {2:8.3f} s {3:9.1f} MB  ' \
+            'chunked {4:8.3f} s {5:9.1f} MB  ({6:.1f}x faster, {7:.1f}x ' \
+            'smaller)'.format(name, len(data) / 1024.0, legacy,
+                    legacy_size / 1048576.0, chunked, size / 1048576.0,
+                    legacy / max(chunked, 1e-9), legacy_size / float(size))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the DP table '
+            'parser on CONCUSS archives and synthetic tables')
+    parser.add_argument('archives', nargs='*',
+            default=['testing/concuss/netscience_p4.zip'],
+            help='CONCUSS archives whose DP tables to parse')
+    parser.add_argument('--rows', type=int, nargs='*',
+            default=[10 ** 4, 10 ** 5, 10 ** 6],
+            help='numbers of rows in the synthetic tables')
+    parser.add_argument('--repeat', type=int, default=3,
+            help='number of times to time each parser')
+    args = parser.parse_args(argv)
+
+    for filename in args.archives:
+        with ZipFile(filename, 'r') as archive:
+            data = archive.read('count/dp_table.txt')
+        report(filename, data, args.repeat)
+
+    for rows in args.rows:
+        out = StringIO()
+        write_synthetic_dp_table(out, max(rows // 20, 1), 20)
+        report('synthetic {0} rows'.format(rows), out.getvalue(), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
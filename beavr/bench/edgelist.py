@@ -0,0 +1,150 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+"""
+Benchmark of the chunked edge list and LEDA readers against the original
+line-by-line readers, on large random graphs
+
+Run with: python -m beavr.bench.edgelist [--edges N...] [--processes N]
+"""
+
+import argparse
+from cStringIO import StringIO
+
+from networkx import Graph
+
+from beavr.bench import measure
+from beavr.bench.xmlgraph import random_edges
+from beavr.concuss.graphreaders import read_edgelist, read_edgelist_arrays, \
+        read_leda, read_leda_arrays
+
+
+# The following code is from CONCUSS, https://github.com/theoryinpractice/concuss/,
+# Copyright (C) North Carolina State University, 2015. It is licensed under
+# the three-clause BSD license; see LICENSE.  These are the readers BEAVr used
+# before beavr.concuss.graphreaders, kept as the baseline for this benchmark.
+def legacy_read_leda(graph_file):
+    graph = Graph()
+
+    numVertices = 10**10
+    lines = graph_file
+
+    # Skip preable
+    skip_lines(lines, 4)
+    numVertices = int(next(lines))
+
+    # We do not need vertex labels
+    skip_lines(lines, numVertices)
+
+    numEdges = int(next(lines))
+
+    for line in lines:
+        line = line.strip()
+        if line == '' or line[0] == '#':
+            continue
+        s, t, r, l = line.split(' ')
+        graph.add_edge(int(s)-1, int(t)-1)  # LEDA is 1-based.
+
+    return graph
+
+def legacy_read_edgelist(graph_file):
+    graph = Graph()
+    for line in graph_file:
+        line = line.strip()
+        if line[0] == '#':
+            continue
+        source, target = line.split()
+        s = int(source)
+        t = int(target)
+
+        graph.add_edge(s, t)
+
+    return graph
+
+def skip_lines(fileit, num):
+    skipped = 0
+    while skipped < num:
+        line = next(fileit).strip()
+        if line != '' and line[0] != '#':
+            skipped += 1
+# End of code from CONCUSS
+
+
+def write_edgelist(out, edges):
+    """Write a graph as an edge list, given a list of its edges"""
+    out.write('# Random graph\n')
+    out.write(''.join('{0} {1}\n'.format(s, t) for s, t in edges))
+
+
+def write_leda(out, edges):
+    """Write a graph in LEDA format, given a list of its edges"""
+    n = max(max(edge) for edge in edges) + 1
+    out.write('LEDA.GRAPH\nvoid\nvoid\n-2\n{0}\n'.format(n))
+    out.write('|{}|\n' * n)
+    out.write('{0}\n'.format(len(edges)))
+    out.write(''.join('{0} {1} 0 |{{}}|\n'.format(s + 1, t + 1)
+        for s, t in edges))
+
+
+class SizedStringIO(object):
+    """In-memory file with a size, as the loader's archive members have"""
+
+    def __init__(self, data):
+        self.data = StringIO(data)
+        self.size = len(data)
+
+    def read(self, n=-1):
+        return self.data.read(n)
+
+    def readline(self, limit=-1):
+        return self.data.readline(limit)
+
+
+def parse(reader, data):
+    reader(StringIO(data))
+
+
+def parse_parallel(reader, data, processes):
+    reader(SizedStringIO(data), parallel_size=0, processes=processes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the edge list '
+            'and LEDA readers on random graphs')
+    parser.add_argument('--edges', type=int, nargs='*',
+            default=[10 ** 4, 10 ** 5, 10 ** 6],
+            help='numbers of edges in the graphs')
+    parser.add_argument('--processes', type=int, default=None,
+            help='worker processes for the parallel readers (default: one '
+                    'per CPU)')
+    args = parser.parse_args(argv)
+
+    formats = [('edge list', write_edgelist, legacy_read_edgelist,
+            read_edgelist, read_edgelist_arrays),
+        ('LEDA', write_leda, legacy_read_leda, read_leda, read_leda_arrays)]
+    for n_edges in args.edges:
+        edges = random_edges(n_edges)
+        for name, writer, legacy_reader, reader, arrays_reader in formats:
+            out = StringIO()
+            writer(out, edges)
+            data = out.getvalue()
+            print '{0} with {1} edges ({2:.1f} MB)'.format(name, n_edges,
+                    len(data) / 1048576.0)
+            runs = [('legacy', parse, (legacy_reader, data)),
+                    ('chunked', parse, (reader, data)),
+                    ('chunked arrays', parse, (arrays_reader, data)),
+                    ('parallel arrays', parse_parallel,
+                        (arrays_reader, data, args.processes))]
+            for run_name, func, func_args in runs:
+                elapsed, memory = measure(func, *func_args)
+                print '  {0:<20} {1:8.3f} s {2:8.1f} MB/s {3:9.1f} MB ' \
+                        'peak'.format(run_name, elapsed,
+                                len(data) / 1048576.0 / elapsed,
+                                memory / 1048576.0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+"""
+Benchmark of the streaming GML reader against the original reader, on the
+netscience graph scaled up by copying it several times
+
+Run with: python -m beavr.bench.gml [--scale N...]
+"""
+
+import argparse
+import collections
+from cStringIO import StringIO
+from zipfile import ZipFile
+
+from networkx import Graph
+
+from beavr.bench import measure
+from beavr.concuss.graphreaders import read_gml, read_gml_arrays
+
+
+# The following code is from CONCUSS, https://github.com/theoryinpractice/concuss/,
+# Copyright (C) North Carolina State University, 2015. It is licensed under
+# the three-clause BSD license; see LICENSE.  It is the GML reader BEAVr used
+# before beavr.concuss.graphreaders, kept as the baseline for this benchmark.
+class multidict(object):
+
+    def __init__(self):
+        self.d = collections.defaultdict(list)
+
+    def __getitem__(self, key):
+        if len(self.d[key]) == 1:
+            return self.d[key][0]
+        return self.d[key]
+
+    def __setitem__(self, key, value):
+        if value is None:
+            self.d[key] = []
+        else:
+            self.d[key].append(value)
+
+    def __iter__(self):
+        return iter(self.d)
+
+    def __contains__(self, key):
+        return key in self.d
+
+    def __len__(self):
+        return len(self.d)
+
+
+def legacy_read_gml(graph_file):
+    graph = Graph()
+
+    data = legacy_read_gml_data(graph_file)
+    for n in data['graph']['node']:
+        graph.add_node(int(n['id']))
+
+    for e in data['graph']['edge']:
+        graph.add_edge(int(e['source']), int(e['target']))
+
+    return graph
+
+
+def legacy_read_gml_data(graph_file):
+    stream = []
+    for l in graph_file:
+        l = l.strip()
+        if len(l) == 0:
+            continue
+        fields = l.split(" ")
+        token = lambda: None  # Inline object
+        token.name = None
+        if len(fields) == 1 or (len(fields) == 2 and fields[1] == '['):
+            v = fields[0]
+            if v == "[":
+                token.type = "BLOCK_START"
+            elif v == "]":
+                token.type = "BLOCK_END"
+            else:
+                token.type = "BLOCK_NAME"
+                token.name = v
+        else:
+            token.type = "FIELD"
+            token.name = fields[0]
+            token.value = "".join(fields[1:])
+        stream.append(token)
+
+    data = multidict()
+    data[0] = 0
+    stack = [data]
+    del data.d[0]
+    for token in stream:
+        current = stack[-1]
+        if token.type == "BLOCK_NAME":
+            # Start new data block
+            block = multidict()
+            block[0] = 0
+            label = token.name
+            current[label] = block
+            stack.append(block)
+            del block.d[0]
+        elif token.type == "BLOCK_START":
+            pass
+        elif token.type == "BLOCK_END":
+            stack.pop()
+        elif token.type == "FIELD":
+            current[token.name] = token.value
+    return data
+# End of code from CONCUSS
+
+
+def write_scaled_gml(out, graph, scale):
+    """
+    Write a GML graph made of several disjoint copies of a graph
+    :param out: file object to write to
+    :param graph: GraphArrays to copy
+    :param scale: number of copies
+    """
+    nodes = graph.nodes().tolist()
+    edges = graph.edges().tolist()
+    offset = max(nodes) + 1
+    out.write('graph\n[\n  directed 0\n')
+    for copy in range(scale):
+        base = copy * offset
+        for v in nodes:
+            out.write('  node\n  [\n    id {0}\n    label "VERTEX {0}"\n'
+                    '  ]\n'.format(base + v))
+        for s, t in edges:
+            out.write('  edge\n  [\n    source {0}\n    target {1}\n'
+                    '    value 1.0\n  ]\n'.format(base + s, base + t))
+    out.write(']\n')
+
+
+def parse(reader, data):
+    reader(StringIO(data))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the GML readers '
+            'on copies of the netscience graph')
+    parser.add_argument('--archive', default='testing/concuss/netscience_p4.zip',
+            help='CONCUSS archive holding netscience.gml')
+    parser.add_argument('--scale', type=int, nargs='*', default=[1, 10, 100],
+            help='numbers of copies of the graph to read')
+    args = parser.parse_args(argv)
+
+    with ZipFile(args.archive, 'r') as archive:
+        graph = read_gml_arrays(StringIO(archive.read('netscience.gml')))
+
+    readers = [('legacy', legacy_read_gml), ('streaming', read_gml),
+            ('streaming arrays', read_gml_arrays)]
+    for scale in args.scale:
+        out = StringIO()
+        write_scaled_gml(out, graph, scale)
+        data = out.getvalue()
+        print 'netscience x{0} ({1:.1f} MB)'.format(scale,
+                len(data) / 1048576.0)
+        for name, reader in readers:
+            elapsed, memory = measure(parse, reader, data)
+            print '  {0:<18} {1:8.3f} s {2:8.1f} MB/s {3:9.1f} MB peak'.format(
+                    name, elapsed, len(data) / 1048576.0 / elapsed,
+                    memory / 1048576.0)
+
+
+if __name__ == '__main__':
+    main()
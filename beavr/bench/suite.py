@@ -0,0 +1,467 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+"""
+Benchmark suite of the CONCUSS loader and visualizer backends, which runs
+without a display
+
+For each input it times loading every attribute of the archive, indexing the
+host graph by color, finding and laying out the components of a
+decomposition on sampled color sets from scratch, toggling one of their
+colors off and on, coming back to them once they are cached, creating a
+CountGenerator and getting its attributes, and generating the color sets of
+the Combine tab.  Inputs are the bundled CONCUSS archives
+under testing/concuss, archives scaled up from them, which hold several
+disjoint copies of the host graph and its colorings, and synthetic archives
+of any size from beavr.bench.synthetic.
+
+Results are written as JSON, one record per benchmark and input, so runs on
+different versions can be compared with --compare.
+
+Run with: beavr-bench [ARCHIVE...] [--scale N...] [--synthetic N...]
+                      [--output FILE]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from functools import partial
+from os import path
+
+import networkx as nx
+import numpy as np
+
+import beavr
+from beavr.bench.synthetic import generate as generate_synthetic
+from beavr.dataloader import DataLoaderFactory, InvalidArchiveError, \
+        UnknownPipelineError
+from beavr.concuss.colorindex import ColorIndex
+from beavr.concuss.visualizerbackend import CombineSetGenerator, \
+        CountGenerator, DecompositionGenerator
+
+# Version of the layout of the results
+results_format = 1
+
+# Bundled CONCUSS archives, found next to the package in a source checkout
+bundled_directory = path.join(path.dirname(path.dirname(path.abspath(
+    beavr.__file__))), 'testing', 'concuss')
+
+# Archive that synthetic inputs are scaled up from
+default_scale_source = 'netscience_p4.zip'
+
+
+def timed(repeat, func, *args):
+    """
+    Time a function, keeping the fastest of several runs
+    :param repeat: number of runs
+    :returns: tuple of the result of the last run and the list of times in
+              seconds
+    """
+    runs = []
+    result = None
+    for _ in xrange(repeat):
+        start = time.time()
+        result = func(*args)
+        runs.append(time.time() - start)
+    return result, runs
+
+
+def record(results, input_name, benchmark, runs, **params):
+    """Add the times of a benchmark to the results"""
+    results.append({
+        'input': input_name,
+        'benchmark': benchmark,
+        'params': params,
+        'seconds': min(runs),
+        'runs': runs
+    })
+
+
+def sample_color_sets(colors, size, count, seed):
+    """
+    Pick color sets to decompose on, the same ones every time
+    :param colors: colors of a coloring
+    :param size: number of colors in each set
+    :param count: number of sets
+    :returns: list of sets of colors
+    """
+    colors = sorted(colors)
+    size = min(size, len(colors))
+    rng = random.Random(seed)
+    return [set(rng.sample(colors, size)) for _ in xrange(count)]
+
+
+def bench_loader(results, input_name, source, graph_backend):
+    """
+    Time loading each attribute of an archive, parsing it without the cache,
+    and then seeking to a coloring step
+    :returns: the DataLoader, with every attribute loaded
+    """
+    dl = DataLoaderFactory(cache=False, stats=True,
+            graph_backend=graph_backend).load_data(source, lazy=True)
+    dl.load()
+    for stats in dl.load_stats:
+        measured = stats.to_dict()
+        record(results, input_name, 'load.' + stats.name,
+                [measured.pop('seconds')], graph_backend=graph_backend,
+                **measured)
+
+    # Jump to a step which has not been looked at yet
+    step = len(dl.colorings) // 2
+    coloring, runs = timed(1, dl.colorings.__getitem__, step)
+    record(results, input_name, 'colorings.seek', runs, step=step,
+            history=type(dl.colorings).__name__)
+    return dl
+
+
+def bench_decompose(results, input_name, dl, color_sets, repeat):
+    """Time finding and laying out the components on each color set"""
+    coloring = dl.colorings[-1]
+    index, runs = timed(repeat, ColorIndex, dl.graph, coloring)
+    record(results, input_name, 'decompose.color_index', runs,
+            pairs=len(index.pair_keys))
+
+    def decompose_fresh(color_set):
+        # A generator keeps the components of its latest color set, so each
+        # run starts from a new one, sharing only the color index
+        generator = DecompositionGenerator(dl.graph, coloring)
+        generator.index = index
+        return generator.get_connected_components(color_set)
+
+    generator = DecompositionGenerator(dl.graph, coloring)
+    generator.index = index
+    for color_set in color_sets:
+        params = {'color_set': sorted(color_set)}
+        components, runs = timed(repeat, decompose_fresh, color_set)
+        record(results, input_name, 'decompose.connected_components', runs,
+                components=len(components), **params)
+        layouts, runs = timed(repeat, generator.get_tree_layouts, components,
+                coloring)
+        record(results, input_name, 'decompose.tree_layouts', runs,
+                components=len(components), **params)
+        # Toggling the largest color off and on again, which only updates
+        # the components of that color
+        if color_set:
+            toggled = set(color_set) - set([max(color_set)])
+
+            def toggle():
+                generator.get_connected_components(toggled)
+                return generator.get_connected_components(color_set)
+
+            generator.get_connected_components(color_set)
+            result, runs = timed(repeat, toggle)
+            record(results, input_name, 'decompose.toggle', runs,
+                    components=len(components), **params)
+        # Coming back to a color set, as when toggling a color off and on
+        generator.decompose(color_set)
+        result, runs = timed(repeat, generator.decompose, color_set)
+        record(results, input_name, 'decompose.revisit', runs,
+                components=len(components), **params)
+
+
+def bench_count(results, input_name, dl, repeat, seed, palette_name='brewer'):
+    """Time creating a CountGenerator, which picks patterns, and its layouts"""
+    # CountGenerator picks patterns with NumPy's random numbers
+    np.random.seed(seed)
+    generator, runs = timed(repeat, CountGenerator, dl.big_component,
+            dl.pattern, dl.tdd, dl.table, dl.colorings[-1], palette_name)
+    record(results, input_name, 'count.init', runs)
+    attributes, runs = timed(repeat, generator.get_attributes)
+    record(results, input_name, 'count.attributes', runs)
+
+
+def bench_combine(results, input_name, dl, color_set, repeat):
+    """
+    Time generating the color sets of the Combine tab, starting from each
+    prefix of a color set
+    """
+    colors = dl.colorings.color_set(-1)
+    pattern_size = dl.pattern.number_of_nodes()
+    min_size = int(dl.counts_per_colorset.sizes().min())
+    color_list = sorted(color_set)
+    for size in xrange(len(color_list)):
+        prefix = set(color_list[:size])
+        generator = CombineSetGenerator(prefix, colors, pattern_size,
+                min_size)
+        sets, runs = timed(repeat, generator.get_color_sets)
+        record(results, input_name, 'combine.color_sets', runs,
+                color_set=sorted(prefix), sets=sum(len(s) for s in sets))
+
+
+def describe_input(dl, source):
+    """Summarize the size of an input"""
+    graph = dl.graph
+    return {
+        'source': path.basename(path.normpath(source)),
+        'vertices': graph.number_of_nodes(),
+        'edges': graph.number_of_edges(),
+        'colorings': len(dl.colorings),
+        'colors': len(dl.colorings.color_set(-1)),
+        'pattern_size': dl.pattern.number_of_nodes(),
+        'colorsets': len(dl.counts_per_colorset)
+    }
+
+
+def run_input(results, inputs, input_name, source, options):
+    """Run every benchmark on one input"""
+    dl = bench_loader(results, input_name, source, options.graph_backend)
+    try:
+        inputs[input_name] = describe_input(dl, source)
+        pattern_size = dl.pattern.number_of_nodes()
+        color_sets = sample_color_sets(dl.colorings.color_set(-1),
+                pattern_size, options.color_sets, options.seed)
+        bench_decompose(results, input_name, dl, color_sets, options.repeat)
+        bench_count(results, input_name, dl, options.repeat, options.seed)
+        bench_combine(results, input_name, dl, color_sets[0], options.repeat)
+    finally:
+        dl.close()
+
+
+def scale_archive(source, destination, copies):
+    """
+    Write a synthetic CONCUSS archive holding several disjoint copies of the
+    host graph and colorings of another, as a directory.  Copy i numbers its
+    vertices from i * n, so the count and combine data of the source, which
+    refer to copy 0, are copied as they are.  Isolated vertices are left
+    out.
+    :param source: CONCUSS archive whose vertex ids are 0 to n - 1
+    :param destination: name of the directory to create
+    :param copies: number of copies of the host graph
+    :raises ValueError: if the vertex ids of the source are not 0 to n - 1
+    """
+    dl = DataLoaderFactory(cache=False, graph_backend='csr').load_data(
+            source, lazy=True)
+    try:
+        if not dl.vertex_ids.identity:
+            raise ValueError('Only archives whose vertex ids are 0 to n - 1 '
+                    'can be scaled')
+        n = len(dl.vertex_ids)
+        edges = np.asarray(dl.graph.edges(), dtype=np.int64).reshape(-1, 2)
+        os.makedirs(destination)
+
+        source_graph_name = dl.parser.get('graphs', 'graph')
+        graph_name = 'scaled.leda'
+        dl.parser.set('graphs', 'graph', graph_name)
+        with open(path.join(destination, 'visinfo.cfg'), 'w') as visinfo:
+            dl.parser.write(visinfo)
+        with open(path.join(destination, graph_name), 'w') as graph_file:
+            graph_file.write('LEDA.GRAPH\nvoid\nvoid\n-2\n{0}\n'.format(
+                n * copies))
+            for _ in xrange(copies):
+                graph_file.write('|{}|\n' * n)
+            graph_file.write('{0}\n'.format(len(edges) * copies))
+            for i in xrange(copies):
+                # LEDA numbers vertices from 1
+                np.savetxt(graph_file, edges + (i * n + 1),
+                        fmt='%d %d 0 |{}|')
+
+        # The host graph only has the vertices on its edges, as when CONCUSS
+        # reads a LEDA file, so only those are colored
+        on_edges = np.zeros(n, dtype=bool)
+        on_edges[edges.ravel()] = True
+        vertices = np.flatnonzero(on_edges)
+        scaled_vertices = np.concatenate([vertices + i * n
+            for i in xrange(copies)])
+        colorings_directory = path.join(destination, 'color', 'colorings')
+        os.makedirs(colorings_directory)
+        for step, coloring in enumerate(dl.colorings):
+            with open(path.join(colorings_directory, str(step)), 'w') as out:
+                np.savetxt(out, np.column_stack([scaled_vertices,
+                    np.tile(coloring[vertices], copies)]), fmt='%d: %d')
+
+        # Everything else refers to copy 0, or to no vertices at all
+        for name in dl.archive.namelist():
+            if (name == 'visinfo.cfg' or name.startswith('color/') or
+                    name == source_graph_name or
+                    name.endswith('/')):
+                continue
+            member_path = path.join(destination, *name.split('/'))
+            if not path.isdir(path.dirname(member_path)):
+                os.makedirs(path.dirname(member_path))
+            with open(member_path, 'wb') as out:
+                out.write(dl.archive.read(name))
+    finally:
+        dl.close()
+
+
+def run_suite(archives, scales, options, log=None, synthetic=()):
+    """
+    Run the benchmarks on bundled, scaled and synthetic inputs
+    :param archives: names of CONCUSS archives or directories
+    :param scales: numbers of copies to make of options.scale_source
+    :param options: namespace of the command line options
+    :param log: function called with a message as each input starts
+    :param synthetic: numbers of vertices of synthetic archives to generate
+    :returns: dictionary of the results, as written as JSON
+    """
+    results = []
+    inputs = {}
+    errors = {}
+    scratch = tempfile.mkdtemp(prefix='beavr-bench-')
+    # Scaled and synthetic inputs are written to scratch files by a function
+    # just before they are used
+    runs = [(path.basename(path.normpath(archive)), archive, None)
+            for archive in archives]
+    scale_name = path.splitext(path.basename(options.scale_source))[0]
+    for copies in scales:
+        input_name = '{0}x{1}'.format(scale_name, copies)
+        runs.append((input_name, path.join(scratch, input_name),
+            partial(scale_archive, options.scale_source, copies=copies)))
+    for vertices in synthetic:
+        input_name = 'synthetic-{0}'.format(vertices)
+        runs.append((input_name, path.join(scratch, input_name + '.zip'),
+            partial(generate_synthetic, vertices=vertices,
+                seed=options.seed)))
+
+    try:
+        for input_name, source, make in runs:
+            if log is not None:
+                log(input_name)
+            try:
+                if make is not None:
+                    make(source)
+                run_input(results, inputs, input_name, source, options)
+            except (IOError, KeyError, ValueError, InvalidArchiveError,
+                    UnknownPipelineError) as e:
+                # Archives lacking some data, such as those of partial runs,
+                # or not valid at all are noted rather than stopping the
+                # suite
+                errors[input_name] = '{0}: {1}'.format(type(e).__name__, e)
+            finally:
+                if make is not None:
+                    if path.isdir(source):
+                        shutil.rmtree(source, True)
+                    elif path.exists(source):
+                        os.remove(source)
+    finally:
+        shutil.rmtree(scratch, True)
+
+    return {
+        'format': results_format,
+        'beavr': beavr.__version__,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'networkx': nx.__version__,
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'options': {'repeat': options.repeat, 'seed': options.seed,
+            'color_sets': options.color_sets,
+            'graph_backend': options.graph_backend},
+        'inputs': inputs,
+        'errors': errors,
+        'results': results
+    }
+
+
+def result_key(result):
+    """Identify a result, to match it with the same one in another run"""
+    return (result['input'], result['benchmark'],
+            json.dumps(result['params'].get('color_set')))
+
+
+def compare(old, new):
+    """
+    Compare the times of two runs of the suite
+    :param old: results of the earlier run, as read from its JSON
+    :param new: results of the later run
+    :returns: list of tuples of the input, benchmark, color set, and old and
+              new times in seconds, for the benchmarks in both runs
+    """
+    totals = {}
+    for run_index, run in enumerate((old, new)):
+        for result in run['results']:
+            times = totals.setdefault(result_key(result), [0.0, 0.0])
+            times[run_index] += result['seconds']
+    new_keys = set(result_key(result) for result in new['results'])
+    old_keys = set(result_key(result) for result in old['results'])
+    return [key + tuple(totals[key]) for key in sorted(new_keys & old_keys)]
+
+
+def format_comparison(rows):
+    """Lay out a comparison as a table, with the ratio of the times"""
+    lines = ['{0:<20} {1:<32} {2:>10} {3:>10} {4:>7}'.format('input',
+        'benchmark', 'old s', 'new s', 'ratio')]
+    for input_name, benchmark, color_set, old, new in rows:
+        if color_set != 'null':
+            benchmark += ' ' + color_set
+        ratio = '-' if old == 0 else '{0:.2f}'.format(new / old)
+        lines.append('{0:<20} {1:<32} {2:10.4f} {3:10.4f} {4:>7}'.format(
+            input_name, benchmark, old, new, ratio))
+    return '\n'.join(lines)
+
+
+def parse_options(argv=None):
+    """Parse the command line of beavr-bench"""
+    parser = argparse.ArgumentParser(prog='beavr-bench',
+            description='Benchmark the CONCUSS loader and visualizer '
+            'backends, without a display, and write the results as JSON')
+    parser.add_argument('archives', nargs='*',
+            help='CONCUSS archives or directories (default: the bundled '
+                    'archives in testing/concuss)')
+    parser.add_argument('--scale', type=int, nargs='*', default=[10, 100],
+            help='numbers of copies of the host graph in the synthetic '
+                    'inputs (default: 10 100)')
+    parser.add_argument('--scale-source', default=path.join(
+        bundled_directory, default_scale_source),
+            help='archive the synthetic inputs are scaled up from')
+    parser.add_argument('--synthetic', type=int, nargs='*',
+            default=[10 ** 4, 10 ** 5],
+            help='numbers of vertices of the synthetic inputs (default: '
+                    '10000 100000)')
+    parser.add_argument('--repeat', type=int, default=3,
+            help='runs of each visualizer benchmark, of which the fastest '
+                    'counts (default: 3)')
+    parser.add_argument('--color-sets', type=int, default=5,
+            help='color sets to decompose on per input (default: 5)')
+    parser.add_argument('--seed', type=int, default=0,
+            help='seed for synthetic inputs and for picking color sets and '
+                    'count patterns')
+    parser.add_argument('--graph-backend', choices=('networkx', 'csr'),
+            default='networkx', help='how the host graph is stored')
+    parser.add_argument('--output', '-o',
+            help='file to write the results to (default: standard output)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+            help='instead of running, compare two files of results')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_options(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as old_file:
+            old = json.load(old_file)
+        with open(args.compare[1]) as new_file:
+            new = json.load(new_file)
+        print format_comparison(compare(old, new))
+        return
+
+    archives = args.archives
+    if not archives:
+        archives = sorted(path.join(bundled_directory, name)
+                for name in os.listdir(bundled_directory)
+                if name.endswith('.zip'))
+
+    def log(input_name):
+        sys.stderr.write('Benchmarking {0}\n'.format(input_name))
+
+    suite = run_suite(archives, args.scale, args, log, args.synthetic)
+    output = json.dumps(suite, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as out:
+            out.write(output + '\n')
+    else:
+        print output
+
+
+if __name__ == '__main__':
+    main()
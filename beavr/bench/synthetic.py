@@ -0,0 +1,304 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+"""
+Synthetic CONCUSS archives of any size, for benchmarks
+
+The host graph is built on a random forest of bounded depth: every vertex is
+joined to its parent and to a few more of its ancestors.  Such a graph has
+treedepth at most the depth of the forest and few edges per vertex, so it is
+sparse with bounded expansion, like the graphs CONCUSS is meant for, and
+coloring each vertex by its depth is a centered coloring.  Vertex ids are
+shuffled so that they say nothing about the structure.
+
+The colorings start from a refinement of the depth coloring, with many more
+colors, whose extra colors are merged back step by step until the last step
+is the depth coloring itself, so each step changes fewer vertices than the
+one before, as CONCUSS's optimization does.  The big component is the
+largest component on the colors of the top pattern-size levels, its TDD is
+the forest restricted to it, and its DP table has a block for every vertex
+and every run of siblings, as CONCUSS writes.  counts_per_colorset.txt has a
+count for every color set of the pattern's size and one less, so its length
+grows combinatorially with the number of colors.
+
+Run with: python -m beavr.bench.synthetic DESTINATION --vertices N
+"""
+
+import argparse
+import os
+from cStringIO import StringIO
+from itertools import combinations
+from os import path
+from zipfile import ZipFile, ZIP_DEFLATED
+
+import numpy as np
+
+
+def forest(vertices, depth, rng):
+    """
+    Build a random forest with levels of equal size
+    :param vertices: number of vertices
+    :param depth: number of levels
+    :param rng: numpy RandomState
+    :returns: tuple of the array of the parent of each vertex, which is -1
+              for roots, and the array of the depth of each vertex.  Vertices
+              are numbered level by level.
+    """
+    depth = max(1, min(depth, vertices))
+    bounds = np.linspace(0, vertices, depth + 1).astype(np.int64)
+    parents = np.full(vertices, -1, dtype=np.int64)
+    depths = np.zeros(vertices, dtype=np.int64)
+    for level in xrange(1, depth):
+        start, stop = bounds[level], bounds[level + 1]
+        above_start = bounds[level - 1]
+        parents[start:stop] = rng.randint(above_start, start, stop - start)
+        depths[start:stop] = level
+    return parents, depths
+
+
+def ancestor_edges(parents, depths, degree, rng):
+    """
+    Join each vertex to its parent and to up to degree - 1 more ancestors
+    :returns: array of (vertex, ancestor) rows, without repeats
+    """
+    children = np.flatnonzero(parents >= 0)
+    edges = [np.column_stack([children, parents[children]])]
+    for _ in xrange(degree - 1):
+        # Climb a random number of levels, at least two, from each vertex
+        # deep enough to have a grandparent
+        deep = children[depths[children] >= 2]
+        steps = 2 + (rng.random_sample(len(deep)) *
+                (depths[deep] - 1)).astype(np.int64)
+        ancestors = deep.copy()
+        for step in xrange(1, steps.max() + 1 if len(steps) else 1):
+            climbing = steps >= step
+            ancestors[climbing] = parents[ancestors[climbing]]
+        edges.append(np.column_stack([deep, ancestors]))
+    edges = np.concatenate(edges)
+    n = len(parents)
+    keys = np.unique(edges[:, 0] * n + edges[:, 1])
+    return np.column_stack([keys // n, keys % n])
+
+
+def coloring_steps(depth_colors, colors, steps, rng):
+    """
+    Make colorings which are merged step by step into the depth coloring
+    :param depth_colors: array of the color of each vertex in the last step
+    :param colors: number of colors in the last step
+    :param steps: number of colorings
+    :returns: list of arrays of colors, one per step
+    """
+    # Vertex v keeps an extra color until step split[v]; about half of the
+    # vertices change in the first step after the initial one, and fewer in
+    # each step after
+    split = np.minimum(rng.geometric(0.5, len(depth_colors)) - 1, steps - 1)
+    return [depth_colors + colors * np.maximum(split - step, 0)
+            for step in xrange(steps)]
+
+
+def big_component(parents, depths, pattern_size):
+    """
+    Find the largest component on the top pattern_size levels of the forest
+    :returns: sorted array of its vertices
+    """
+    top = np.flatnonzero(depths < pattern_size)
+    roots = top.copy()
+    for _ in xrange(pattern_size):
+        climbing = parents[roots] >= 0
+        roots[climbing] = parents[roots[climbing]]
+    largest = np.bincount(roots).argmax()
+    return top[roots == largest]
+
+
+def dp_blocks(component, parents, depths, pattern_size, rows, rng):
+    """
+    Make a DP table for a component, with a block for each vertex and for
+    each run of two or more siblings from the first
+    :returns: list of (key vertices, rows) blocks, where each row is a tuple
+              of a count, a list of k-pattern vertices and a list of
+              (pattern vertex, root path index) pairs
+    """
+    component_set = set(component.tolist())
+    children = {}
+    for v in component.tolist():
+        if parents[v] in component_set:
+            children.setdefault(parents[v], []).append(v)
+
+    pattern_vertices = range(pattern_size)
+    blocks = []
+    keys = [(v,) for v in component.tolist()]
+    for siblings in children.itervalues():
+        keys.extend(tuple(siblings[:i]) for i in xrange(2, len(siblings) + 1))
+    for key in sorted(keys):
+        # Boundary vertices map to distinct vertices on the root path above
+        above = depths[key[0]]
+        block = [(1, [], [])]
+        if above == 0 and len(key) == 1:
+            block.append((int(rng.randint(1, 1000)), pattern_vertices, []))
+        seen = set()
+        for _ in xrange(rows):
+            size = rng.randint(1, pattern_size + 1)
+            k_pattern = sorted(rng.choice(pattern_size, size, replace=False))
+            boundary_size = min(rng.randint(0, size + 1), above)
+            boundary = zip(sorted(rng.choice(k_pattern, boundary_size,
+                replace=False)), rng.choice(above, boundary_size,
+                    replace=False)) if boundary_size else []
+            row = (tuple(k_pattern), tuple(boundary))
+            if row not in seen:
+                seen.add(row)
+                block.append((int(rng.randint(1, 30)), k_pattern, boundary))
+        blocks.append((key, block))
+    return blocks
+
+
+def format_dp_table(blocks, ids):
+    """Write DP table blocks as CONCUSS does, with vertices as ids"""
+    out = StringIO()
+    for key, block in blocks:
+        out.write('[{0}] {{\n'.format(', '.join(str(ids[v]) for v in key)))
+        for count, k_pattern, boundary in block:
+            out.write('\t{0}; [{1}]; [{2}]\n'.format(count,
+                ', '.join(str(v) for v in k_pattern),
+                ', '.join('{0}:{1}'.format(v, i) for v, i in boundary)))
+        out.write('}\n')
+    return out.getvalue()
+
+
+def format_colorset_counts(colors, pattern_size, rng):
+    """
+    Write counts for every color set with pattern_size or one fewer colors
+    """
+    lines = []
+    for size in xrange(pattern_size - 1, pattern_size + 1):
+        if size < 1:
+            continue
+        colorsets = [','.join(map(str, c))
+                for c in combinations(xrange(colors), size)]
+        # Most color sets have no occurrences, and counts are even, as in
+        # CONCUSS's output for undirected patterns
+        counts = 2 * rng.geometric(0.2, len(colorsets)) * \
+                (rng.random_sample(len(colorsets)) < 0.5)
+        lines.extend('{0} : {1}\n'.format(c, n)
+                for c, n in zip(colorsets, counts.tolist()))
+    return ''.join(lines)
+
+
+def format_rows(rows, fmt):
+    """Write the rows of an integer array as lines of text"""
+    # Several times faster than np.savetxt, which formats row by row
+    return ''.join(map((fmt + '\n').__mod__, map(tuple, rows.tolist())))
+
+
+def members(vertices, colors=20, pattern_size=4, steps=6, degree=3, rows=8,
+        seed=0):
+    """
+    Generate the members of a synthetic CONCUSS archive
+    :param vertices: number of vertices of the forest the host graph is
+                     built on; the few roots without children are left out
+    :param colors: number of colors in the last coloring, which is the depth
+                   of the forest the graph is built on
+    :param pattern_size: number of vertices of the pattern, a path
+    :param steps: number of colorings
+    :param degree: number of ancestors each vertex is joined to
+    :param rows: number of k-patterns tried for each block of the DP table
+    :param seed: seed of the random numbers, so archives can be made again
+    :returns: iterator of (member name, contents) tuples
+    """
+    rng = np.random.RandomState(seed)
+    colors = max(1, min(colors, vertices))
+    pattern_size = min(pattern_size, colors)
+    parents, depths = forest(vertices, colors, rng)
+    ids = rng.permutation(vertices)
+    depth_colors = rng.permutation(colors)[depths]
+
+    graph_name = 'synthetic.txt'
+    pattern_name = 'path{0}.txt'.format(pattern_size)
+    yield 'visinfo.cfg', ('[pipeline]\nname = concuss\ncommand = '
+            './concuss.py {0} {1} config/inex.cfg -e synthetic.zip\n\n'
+            '[graphs]\ngraph = {0}\nmotif = {1}\n\n').format(graph_name,
+                    pattern_name)
+
+    edges = ancestor_edges(parents, depths, degree, rng)
+    yield graph_name, format_rows(ids[edges], '%d %d')
+    yield pattern_name, ''.join('{0}\t{1}\n'.format(v, v + 1)
+            for v in xrange(pattern_size - 1))
+
+    # Roots without children are not in an edge list, so CONCUSS would
+    # never see them to color them
+    on_edges = np.zeros(vertices, dtype=bool)
+    on_edges[edges.ravel()] = True
+    for step, coloring in enumerate(coloring_steps(depth_colors, colors,
+            steps, rng)):
+        yield 'color/colorings/{0}'.format(step), format_rows(
+                np.column_stack([ids, coloring])[on_edges], '%d: %d')
+
+    component = big_component(parents, depths, pattern_size)
+    in_component = np.zeros(vertices, dtype=bool)
+    in_component[component] = True
+    component_edges = edges[in_component[edges[:, 0]] &
+            in_component[edges[:, 1]]]
+    yield 'count/big_component.txt', format_rows(ids[component_edges],
+            '%d\t%d')
+    children = component[parents[component] >= 0]
+    yield 'count/tdd.txt', format_rows(np.column_stack([ids[children],
+        ids[parents[children]]]), '%d %d')
+    yield 'count/dp_table.txt', format_dp_table(dp_blocks(component,
+        parents, depths, pattern_size, rows, rng), ids)
+
+    yield 'combine/counts_per_colorset.txt', format_colorset_counts(colors,
+            pattern_size, rng)
+
+
+def generate(destination, vertices, **options):
+    """
+    Write a synthetic CONCUSS archive
+    :param destination: name of the archive to write, which is a zip archive
+                        if it ends in .zip and a directory otherwise
+    :param vertices: number of vertices of the host graph
+    :param options: keyword arguments passed on to members
+    """
+    if destination.endswith('.zip'):
+        with ZipFile(destination, 'w', ZIP_DEFLATED, allowZip64=True) as out:
+            for name, contents in members(vertices, **options):
+                out.writestr(name, contents)
+        return
+
+    for name, contents in members(vertices, **options):
+        member_path = path.join(destination, *name.split('/'))
+        if not path.isdir(path.dirname(member_path)):
+            os.makedirs(path.dirname(member_path))
+        with open(member_path, 'wb') as out:
+            out.write(contents)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write a synthetic CONCUSS '
+            'archive for benchmarks')
+    parser.add_argument('destination',
+            help='zip archive, if it ends in .zip, or directory to write')
+    parser.add_argument('--vertices', type=int, default=10 ** 4,
+            help='vertices of the host graph (default: 10000)')
+    parser.add_argument('--colors', type=int, default=20,
+            help='colors in the last coloring (default: 20)')
+    parser.add_argument('--pattern-size', type=int, default=4,
+            help='vertices of the pattern, a path (default: 4)')
+    parser.add_argument('--steps', type=int, default=6,
+            help='coloring steps (default: 6)')
+    parser.add_argument('--degree', type=int, default=3,
+            help='ancestors each vertex is joined to (default: 3)')
+    parser.add_argument('--rows', type=int, default=8,
+            help='k-patterns tried per DP table block (default: 8)')
+    parser.add_argument('--seed', type=int, default=0,
+            help='seed of the random numbers (default: 0)')
+    args = parser.parse_args(argv)
+
+    generate(args.destination, args.vertices, colors=args.colors,
+            pattern_size=args.pattern_size, steps=args.steps,
+            degree=args.degree, rows=args.rows, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
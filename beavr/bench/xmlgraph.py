@@ -0,0 +1,126 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+"""
+Benchmark of the incremental GEXF and GraphML readers against the original
+BeautifulSoup readers, on large random graphs
+
+Run with: python -m beavr.bench.xmlgraph [--edges N...]
+
+The original readers need BeautifulSoup 3; they are skipped if it is not
+installed.
+"""
+
+import argparse
+import random
+from cStringIO import StringIO
+
+from networkx import Graph
+
+from beavr.bench import measure
+from beavr.concuss.graphreaders import read_gexf, read_graphml, \
+        read_xml_arrays
+
+
+# The following code is from CONCUSS, https://github.com/theoryinpractice/concuss/,
+# Copyright (C) North Carolina State University, 2015. It is licensed under
+# the three-clause BSD license; see LICENSE.  These are the readers BEAVr used
+# before beavr.concuss.graphreaders, kept as the baseline for this benchmark.
+def legacy_read_gexf(graph_file):
+    from BeautifulSoup import BeautifulSoup as Soup
+    soup = Soup(graph_file.read())
+    graph = Graph()
+
+    for edge in soup.findAll("edge"):
+        source = int(edge['source'])
+        target = int(edge['target'])
+        graph.add_edge(source, target)
+    return graph
+
+legacy_read_graphml = legacy_read_gexf
+# End of code from CONCUSS
+
+
+def write_gexf(out, edges):
+    """Write a graph in GEXF format, given a list of its edges"""
+    out.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<gexf xmlns="http://www.gexf.net/1.2draft" version="1.2">\n'
+            '  <graph mode="static" defaultedgetype="undirected">\n'
+            '    <nodes>\n')
+    for v in sorted(set(v for edge in edges for v in edge)):
+        out.write('      <node id="{0}" label="{0}" />\n'.format(v))
+    out.write('    </nodes>\n    <edges>\n')
+    for i, (s, t) in enumerate(edges):
+        out.write('      <edge id="{0}" source="{1}" target="{2}" />\n'.format(
+            i, s, t))
+    out.write('    </edges>\n  </graph>\n</gexf>\n')
+
+
+def write_graphml(out, edges):
+    """Write a graph in GraphML format, given a list of its edges"""
+    out.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+            '  <key id="d0" for="edge" attr.name="weight" attr.type="double"/>\n'
+            '  <graph id="G" edgedefault="undirected">\n')
+    for v in sorted(set(v for edge in edges for v in edge)):
+        out.write('    <node id="{0}"/>\n'.format(v))
+    for s, t in edges:
+        out.write('    <edge source="{0}" target="{1}">\n'
+                '      <data key="d0">1.0</data>\n'
+                '    </edge>\n'.format(s, t))
+    out.write('  </graph>\n</graphml>\n')
+
+
+def random_edges(n_edges, seed=0):
+    """Return a list of random edges among n_edges / 4 vertices"""
+    rand = random.Random(seed)
+    n = max(n_edges // 4, 2)
+    return [(rand.randrange(n), rand.randrange(n)) for _ in range(n_edges)]
+
+
+def parse(reader, data):
+    reader(StringIO(data))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the GEXF and '
+            'GraphML readers on random graphs')
+    parser.add_argument('--edges', type=int, nargs='*',
+            default=[10 ** 4, 10 ** 5, 10 ** 6],
+            help='numbers of edges in the graphs')
+    args = parser.parse_args(argv)
+
+    try:
+        import BeautifulSoup
+        have_soup = True
+    except ImportError:
+        print 'BeautifulSoup is not installed; skipping the original readers'
+        have_soup = False
+
+    formats = [('GEXF', write_gexf, legacy_read_gexf, read_gexf),
+            ('GraphML', write_graphml, legacy_read_graphml, read_graphml)]
+    for n_edges in args.edges:
+        edges = random_edges(n_edges)
+        for name, writer, legacy_reader, reader in formats:
+            out = StringIO()
+            writer(out, edges)
+            data = out.getvalue()
+            print '{0} with {1} edges ({2:.1f} MB)'.format(name, n_edges,
+                    len(data) / 1048576.0)
+            readers = [('incremental', reader),
+                    ('incremental arrays', read_xml_arrays)]
+            if have_soup:
+                readers.insert(0, ('legacy', legacy_reader))
+            for reader_name, reader_func in readers:
+                elapsed, memory = measure(parse, reader_func, data)
+                print '  {0:<20} {1:8.3f} s {2:8.1f} MB/s {3:9.1f} MB ' \
+                        'peak'.format(reader_name, elapsed,
+                                len(data) / 1048576.0 / elapsed,
+                                memory / 1048576.0)
+
+
+if __name__ == '__main__':
+    main()
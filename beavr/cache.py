@@ -0,0 +1,244 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+import hashlib
+import os
+import os.path as path
+import shutil
+import tempfile
+
+import numpy as np
+
+from beavr import __version__
+from beavr.archive import DirectoryArchive
+
+# Version of the way data is stored in cache entries, which is part of their
+# keys so that entries written in an older layout are never read
+cache_format = 5
+
+# Name of the file in a cache entry holding the digest of the archive's
+# contents, when entries are verified
+digest_name = 'digest'
+
+
+def default_cache_dir():
+    """Return the directory BEAVr caches parsed archives in by default"""
+    cache_home = os.environ.get('XDG_CACHE_HOME',
+            path.join(path.expanduser('~'), '.cache'))
+    return path.join(cache_home, 'beavr')
+
+
+class ArchiveCache(object):
+    """
+    On-disk cache of data parsed from archives
+
+    Each archive gets an entry, keyed by its real path, size and
+    modification time, the BEAVr version and cache_format, so entries are
+    not used for a changed archive or by a BEAVr which might parse it
+    differently.  Finding the key only takes a stat of the archive, or of
+    each file of a directory.  Changes which keep the size and modification
+    time are only noticed with verify, which hashes the archive's contents
+    on every open.  An entry holds a directory for each piece of data parsed
+    from the archive, containing the arrays that represent it as .npy files,
+    which are memory-mapped when loaded.
+
+    When the entries grow beyond max_size bytes in total, the least recently
+    used ones are removed.
+    """
+
+    def __init__(self, directory=None, max_size=1 << 30, verify=False):
+        """
+        :param directory: directory to keep the cache in
+        :param max_size: largest total size of the cache entries in bytes
+        :param verify: whether to check that an archive's contents are the
+                       same as when its entry was written, which reads the
+                       whole archive
+        """
+        self.directory = directory or default_cache_dir()
+        self.max_size = max_size
+        self.verify = verify
+
+    def key(self, filename):
+        """
+        Compute the key of the cache entry for an archive
+        :param filename: name of the archive file, or of a directory laid out
+                         like one
+        :returns: hex string identifying the archive
+        """
+        filename = path.realpath(filename)
+        digest = hashlib.sha1('{0}:{1}:{2}\0'.format(__version__,
+            cache_format, filename))
+        if path.isdir(filename):
+            archive = DirectoryArchive(filename)
+            for name in archive.namelist():
+                digest.update('{0}\0{1}\0'.format(name,
+                    file_signature(archive.member_path(name))))
+        else:
+            digest.update(file_signature(filename))
+        return digest.hexdigest()
+
+    def entry(self, filename):
+        """
+        Get the cache entry for an archive, creating it if needed
+        :param filename: name of the archive file
+        :returns: CacheEntry, or None if the cache directory is unusable
+        """
+        entry_dir = path.join(self.directory, self.key(filename))
+        try:
+            if self.verify:
+                self.verify_entry(entry_dir, content_digest(filename))
+            if not path.isdir(entry_dir):
+                os.makedirs(entry_dir)
+        except (IOError, OSError):
+            return None
+        return CacheEntry(self, entry_dir)
+
+    def verify_entry(self, entry_dir, digest):
+        """
+        Empty an entry written for different contents, and record the digest
+        of the contents it is now for
+        :param entry_dir: directory of the entry
+        :param digest: hex digest of the archive's contents
+        """
+        digest_path = path.join(entry_dir, digest_name)
+        try:
+            with open(digest_path) as digest_file:
+                if digest_file.read() == digest:
+                    return
+        except IOError:
+            pass
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.makedirs(entry_dir)
+        with open(digest_path, 'w') as digest_file:
+            digest_file.write(digest)
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used entries until the cache fits in
+        self.max_size bytes
+        :param keep: directory of an entry which must not be removed
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            entry_dir = path.join(self.directory, name)
+            if path.isdir(entry_dir):
+                entries.append((path.getmtime(entry_dir),
+                    directory_size(entry_dir), entry_dir))
+        total = sum(size for _, size, _ in entries)
+
+        # Oldest entries first
+        entries.sort()
+        for _, size, entry_dir in entries:
+            if total <= self.max_size:
+                break
+            if entry_dir == keep:
+                continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+
+
+def file_signature(filename):
+    """Describe a file by its size and modification time"""
+    stat = os.stat(filename)
+    return '{0}:{1!r}'.format(stat.st_size, stat.st_mtime)
+
+
+def content_digest(filename):
+    """
+    Hash the contents of an archive
+    :param filename: name of the archive file, or of a directory laid out
+                     like one
+    :returns: hex digest
+    """
+    digest = hashlib.sha1()
+    if path.isdir(filename):
+        archive = DirectoryArchive(filename)
+        # Names and sizes separate the members' contents
+        for name in archive.namelist():
+            member_path = archive.member_path(name)
+            digest.update('{0}\0{1}\0'.format(name,
+                path.getsize(member_path)))
+            hash_file(digest, member_path)
+    else:
+        hash_file(digest, filename)
+    return digest.hexdigest()
+
+
+def hash_file(digest, filename):
+    """Add the contents of a file to a hashlib digest"""
+    with open(filename, 'rb') as hashed_file:
+        while True:
+            data = hashed_file.read(1 << 20)
+            if not data:
+                break
+            digest.update(data)
+
+
+class CacheEntry(object):
+    """
+    The cached data for one archive
+
+    Errors reading or writing the cache are not fatal: data which cannot be
+    loaded from the cache is simply parsed from the archive again.
+    """
+
+    def __init__(self, cache, directory):
+        self.cache = cache
+        self.directory = directory
+
+    def load(self, name):
+        """
+        Load the arrays stored for a piece of data
+        :param name: name of the piece of data
+        :returns: dictionary of read-only, memory-mapped arrays by name, or
+                  None if the data is not in the cache
+        """
+        data_dir = path.join(self.directory, name)
+        try:
+            arrays = {}
+            for filename in os.listdir(data_dir):
+                if filename.endswith('.npy'):
+                    arrays[filename[:-4]] = np.load(
+                            path.join(data_dir, filename), mmap_mode='r')
+            # Mark the entry as recently used
+            os.utime(self.directory, None)
+        except (IOError, OSError, ValueError):
+            return None
+        return arrays
+
+    def save(self, name, arrays):
+        """
+        Store the arrays representing a piece of data
+        :param name: name of the piece of data
+        :param arrays: dictionary of arrays by name
+        """
+        try:
+            # Write to a temporary directory and rename it when done, so
+            # nobody ever sees a partially written piece of data
+            tmp_dir = tempfile.mkdtemp(prefix='.' + name,
+                    dir=self.directory)
+            try:
+                for array_name, array in arrays.iteritems():
+                    np.save(path.join(tmp_dir, array_name + '.npy'),
+                            np.asarray(array))
+                os.rename(tmp_dir, path.join(self.directory, name))
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            self.cache.evict(keep=self.directory)
+        except (IOError, OSError):
+            pass
+
+
+def directory_size(directory):
+    """Return the total size of the files in a directory tree in bytes"""
+    size = 0
+    for dirpath, _, filenames in os.walk(directory):
+        for filename in filenames:
+            try:
+                size += path.getsize(path.join(dirpath, filename))
+            except OSError:
+                pass
+    return size
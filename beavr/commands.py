@@ -0,0 +1,32 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+"""
+The beavr command, which runs the visualizer, or the subcommand named by its
+first argument
+"""
+
+import sys
+from importlib import import_module
+
+# Modules whose main(argv) function runs each subcommand.  They are imported
+# only when used, so subcommands work without wxPython.
+subcommands = {
+    'bench': 'beavr.bench.suite',
+    'decompose': 'beavr.concuss.batch',
+    'pack': 'beavr.pack'
+}
+
+
+def main(argv=None):
+    """Run BEAVr, or one of its subcommands"""
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] in subcommands:
+        return import_module(subcommands[argv[0]]).main(argv[1:])
+
+    from beavr.visapplication import run
+    run()
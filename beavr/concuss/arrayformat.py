@@ -0,0 +1,83 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+"""
+Representation of the data loaded from CONCUSS archives as arrays
+
+Each kind of data has a function turning it into a dictionary of numpy arrays
+and a function turning such a dictionary back into the data.  This is what
+ArchiveCache stores.
+"""
+
+import numpy as np
+import networkx as nx
+
+from beavr.csrgraph import CSRGraph
+from beavr.concuss.coloringhistory import ColoringHistory
+from beavr.concuss.colorsets import ColorsetCounts
+from beavr.concuss.dptable import DPTable
+from beavr.concuss.vertexids import VertexIds
+
+
+def colorings_to_arrays(colorings):
+    """
+    Represent the colorings by arrays, whether they are all loaded in a
+    ColoringHistory or read on demand by a LazyColoringHistory
+    """
+    return colorings.to_arrays()
+
+
+def graph_to_arrays(graph):
+    """Represent a graph by arrays of its nodes and edges"""
+    return {
+        'nodes': np.array(graph.nodes(), dtype=np.int64),
+        'edges': np.array(graph.edges(), dtype=np.int64).reshape(-1, 2)
+    }
+
+
+def graph_from_arrays(arrays, graph_class=nx.Graph):
+    """Create a graph from arrays of its nodes and edges"""
+    graph = graph_class()
+    graph.add_nodes_from(arrays['nodes'].tolist())
+    graph.add_edges_from(arrays['edges'].tolist())
+    return graph
+
+
+def digraph_from_arrays(arrays):
+    """Create a directed graph from arrays of its nodes and edges"""
+    return graph_from_arrays(arrays, nx.DiGraph)
+
+
+def host_graph_to_arrays(graph):
+    """
+    Represent the host graph by CSR arrays, whichever backend holds it, so
+    that a CSRGraph can be memory-mapped straight from them
+    """
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph.from_networkx(graph)
+    return graph.to_arrays()
+
+
+def host_graph_from_arrays(arrays):
+    """Create a NetworkX host graph from CSR arrays"""
+    return CSRGraph.from_arrays(arrays).to_networkx()
+
+
+# Functions converting each attribute of a ConcussDataLoader to and from arrays
+codecs = {
+    'graph': (host_graph_to_arrays, host_graph_from_arrays),
+    'pattern': (graph_to_arrays, graph_from_arrays),
+    'big_component': (graph_to_arrays, graph_from_arrays),
+    'tdd': (graph_to_arrays, digraph_from_arrays),
+    'colorings': (colorings_to_arrays, ColoringHistory.from_arrays),
+    'table': (DPTable.to_arrays, DPTable.from_arrays),
+    'counts_per_colorset': (ColorsetCounts.to_arrays,
+        ColorsetCounts.from_arrays),
+    'vertex_ids': (VertexIds.to_arrays, VertexIds.from_arrays)
+}
+
+# The same, for a ConcussDataLoader keeping the host graph in a CSRGraph
+csr_codecs = dict(codecs, graph=(host_graph_to_arrays, CSRGraph.from_arrays))
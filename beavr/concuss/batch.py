@@ -0,0 +1,365 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+"""
+Decompositions on every color set of up to p colors, found by a pool of
+worker processes
+
+CONCUSS's decompose stage goes through the subgraphs induced by every color
+set of at most p colors, where p is the size of the pattern.  batch_decompose
+finds the components of each of them, as the Decompose tab shows them, and
+sums each color set up in a row of a table: the vertices and edges of its
+subgraph, the number of components, the number of isomorphism classes among
+them, the size of the largest and how many components there are of each
+size.  Rows can be ranked by any column, to find the color sets worth
+looking at.
+
+There are as many as sum(C(k, i) for i <= p) color sets for k colors, so
+they are generated as they are needed and rows are handed on as they come
+in, to be written out or narrowed down to the highest ranked by top_rows,
+rather than all being held in memory.
+
+The host graph is handed to the workers as the arrays of a CSRGraph, which
+forked workers share with the parent, since they are only ever read; arrays
+memory-mapped from an ArchiveCache are shared through the page cache in any
+case.  NetworkX graphs are converted first, since their dictionaries would
+be copied into each worker as reference counts change.  Each worker goes
+through color sets in lexicographic order with one DecompositionGenerator,
+so consecutive color sets, which mostly share all but their last colors,
+only update the components of the colors which change.
+
+Run with: beavr decompose ARCHIVE [--size P] [--sort COLUMN]
+                          [--output FILE]
+"""
+
+import argparse
+import heapq
+import multiprocessing
+import sys
+from collections import Counter, OrderedDict
+from itertools import chain, combinations, islice
+
+from beavr.csrgraph import CSRGraph
+from beavr.dataloader import DataLoaderFactory, InvalidArchiveError, \
+        UnknownPipelineError
+from beavr.concuss.colorindex import ColorIndex
+from beavr.concuss.visualizerbackend import DecompositionGenerator
+
+# Columns of the results table, in order
+columns = ['colors', 'size', 'vertices', 'edges', 'components', 'classes',
+        'largest', 'sizes']
+
+# Columns color sets can be ranked by, with their descriptions
+rank_columns = OrderedDict([
+    ('largest', 'Largest component'),
+    ('components', 'Components'),
+    ('classes', 'Isomorphism classes'),
+    ('vertices', 'Vertices'),
+    ('edges', 'Edges')
+])
+
+# Most color sets handed to a worker at once
+max_chunk_size = 256
+
+# DecompositionGenerator of a worker process, set up by init_worker
+worker_generator = None
+
+
+class BatchCancelledError(Exception):
+    """
+    Exception raised by batch_decompose when it has been cancelled
+
+    Attributes:
+        msg -- Explanation of the error
+    """
+
+    def __init__(self):
+        self.msg = "Decomposition cancelled"
+
+    def __str__(self):
+        return self.msg
+
+
+def enumerate_color_sets(colors, max_size):
+    """
+    Generate the color sets of 1 to max_size colors
+    :param colors: iterable of colors
+    :param max_size: most colors in a color set
+    :returns: iterator of sorted tuples of colors, by size and then in
+              lexicographic order
+    """
+    colors = sorted(set(colors))
+    return chain.from_iterable(combinations(colors, size)
+            for size in xrange(1, max_size + 1))
+
+
+def binomial(n, k):
+    """Return the binomial coefficient C(n, k)"""
+    if k < 0 or k > n:
+        return 0
+    result = 1
+    for i in xrange(min(k, n - k)):
+        result = result * (n - i) // (i + 1)
+    return result
+
+
+def count_color_sets(colors, max_size):
+    """
+    Count the color sets enumerate_color_sets generates, without generating
+    them
+    :param colors: number of distinct colors
+    :param max_size: most colors in a color set
+    """
+    return sum(binomial(colors, size) for size in xrange(1, max_size + 1))
+
+
+def chunks_of(iterable, size):
+    """Split an iterable into lists of size items, the last maybe shorter"""
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def summarize(color_set, components):
+    """
+    Sum up the components on a color set in a row of the results table
+    :param color_set: tuple of colors
+    :param components: list of one component per isomorphism class, with the
+                       number of components in the class as its occ
+                       attribute, as DecompositionGenerator finds them
+    :returns: dictionary of values by column
+    """
+    sizes = Counter()
+    for cc in components:
+        sizes[len(cc)] += cc.occ
+    return {
+        'colors': tuple(color_set),
+        'size': len(color_set),
+        'vertices': sum(len(cc) * cc.occ for cc in components),
+        'edges': sum(cc.number_of_edges() * cc.occ for cc in components),
+        'components': sum(cc.occ for cc in components),
+        'classes': len(components),
+        'largest': max(sizes) if sizes else 0,
+        'sizes': tuple(sorted(sizes.items()))
+    }
+
+
+def init_worker(arrays, coloring):
+    """Set up a worker process to decompose a host graph"""
+    global worker_generator
+    worker_generator = DecompositionGenerator(CSRGraph.from_arrays(arrays),
+            coloring)
+
+
+def decompose_chunk(color_sets):
+    """Decompose some color sets in a worker process"""
+    return [summarize(color_set,
+        worker_generator.get_connected_components(color_set))
+        for color_set in color_sets]
+
+
+def batch_decompose(graph, coloring, max_size, processes=None,
+        progress=None, cancel_event=None):
+    """
+    Find and sum up the components on every color set of up to max_size
+    colors
+    :param graph: host graph, as a NetworkX graph or a CSRGraph
+    :param coloring: sequence of colors indexed by vertex
+    :param max_size: most colors in a color set, usually the pattern size
+    :param processes: number of worker processes, by default one per CPU;
+                      with 1, color sets are decomposed in this process
+    :param progress: function called as progress(color sets done, color
+                     sets in all) after each chunk of color sets
+    :param cancel_event: threading.Event which makes batch_decompose stop
+                         and raise BatchCancelledError when it is set
+    :returns: iterator of rows as returned by summarize, in the order of
+              enumerate_color_sets; color sets are only decomposed as rows
+              are taken from it
+    :raises BatchCancelledError: if cancel_event is set
+    """
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph.from_networkx(graph)
+    colors = ColorIndex(graph, coloring).colors.tolist()
+    total = count_color_sets(len(colors), max_size)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    # Several chunks per worker keep them all busy to the end, while long
+    # chunks keep the color sets of each worker close together
+    chunk_size = max(1, min(max_chunk_size, total // (4 * processes)))
+    chunks = chunks_of(enumerate_color_sets(colors, max_size), chunk_size)
+
+    pool = None
+    if processes == 1:
+        init_worker(graph.to_arrays(), coloring)
+        results = (decompose_chunk(chunk) for chunk in chunks)
+    else:
+        pool = multiprocessing.Pool(processes, init_worker,
+                (graph.to_arrays(), coloring))
+        results = pool.imap(decompose_chunk, chunks)
+
+    done = 0
+    try:
+        for chunk_rows in results:
+            if cancel_event is not None and cancel_event.is_set():
+                raise BatchCancelledError()
+            done += len(chunk_rows)
+            if progress is not None:
+                progress(done, total)
+            for row in chunk_rows:
+                yield row
+    except BaseException:
+        # Including GeneratorExit, when the rows are not all taken
+        if pool is not None:
+            pool.terminate()
+            pool = None
+        raise
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def rank(rows, column='largest', count=None):
+    """
+    Rank color sets by a column of the results table
+    :param rows: list of rows as returned by batch_decompose
+    :param column: column to rank by, from rank_columns; higher values rank
+                   first, and ties are broken by the color sets
+    :param count: number of rows to keep, or None to keep them all
+    :returns: list of rows
+    """
+    if column not in rank_columns:
+        raise ValueError('Cannot rank by {0!r}'.format(column))
+    key = lambda row: (-row[column], row['colors'])
+    if count is None:
+        return sorted(rows, key=key)
+    return heapq.nsmallest(count, rows, key=key)
+
+
+def top_rows(rows, count):
+    """
+    Keep the rows which rank among the first count by any column, as the
+    rows come in, so rank gives the same first count rows on them as on all
+    the rows
+    :param rows: iterable of rows as returned by batch_decompose
+    :param count: number of rows to keep by each column
+    :returns: list of rows, in the order they came in
+    """
+    limit = 2 * count * len(rank_columns)
+    kept = []
+    for row in rows:
+        kept.append(row)
+        if len(kept) >= limit:
+            kept = narrow(kept, count)
+    return narrow(kept, count)
+
+
+def narrow(rows, count):
+    """Keep the rows among the first count by any column, in order"""
+    keep = set()
+    for column in rank_columns:
+        keep.update(row['colors'] for row in rank(rows, column, count))
+    return [row for row in rows if row['colors'] in keep]
+
+
+def format_value(column, value):
+    """Write a value of the results table as text"""
+    if column == 'colors':
+        return ','.join(str(color) for color in value)
+    if column == 'sizes':
+        return ' '.join('{0}:{1}'.format(size, n) for size, n in value)
+    return str(value)
+
+
+def parse_value(column, text):
+    """Read a value of the results table from text"""
+    if column == 'colors':
+        return tuple(int(color) for color in text.split(',') if color)
+    if column == 'sizes':
+        return tuple(tuple(int(x) for x in pair.split(':'))
+                for pair in text.split())
+    return int(text)
+
+
+def write_table(rows, out):
+    """
+    Write the results table as tab-separated values, with a header line
+    :param rows: iterable of rows as returned by batch_decompose
+    :param out: file object to write to
+    """
+    out.write('\t'.join(columns) + '\n')
+    for row in rows:
+        out.write('\t'.join(format_value(column, row[column])
+            for column in columns) + '\n')
+
+
+def read_table(lines):
+    """
+    Read a results table written by write_table
+    :param lines: iterable of the lines of the table
+    :returns: list of rows
+    :raises ValueError: if the table is malformed
+    """
+    lines = iter(lines)
+    header = next(lines, '').rstrip('\n').split('\t')
+    if header != columns:
+        raise ValueError('Not a table of decompositions')
+    rows = []
+    for line in lines:
+        fields = line.rstrip('\n').split('\t')
+        if len(fields) != len(columns):
+            raise ValueError('Malformed row: {0!r}'.format(line))
+        rows.append(dict((column, parse_value(column, field))
+            for column, field in zip(columns, fields)))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='beavr decompose',
+            description='Decompose a CONCUSS archive on every color set of '
+            'up to p colors')
+    parser.add_argument('archive',
+            help='CONCUSS archive, or directory laid out like one')
+    parser.add_argument('--size', type=int,
+            help='most colors in a color set (default: pattern size)')
+    parser.add_argument('--processes', type=int,
+            help='worker processes (default: one per CPU)')
+    parser.add_argument('--sort', choices=list(rank_columns),
+            help='rank color sets by this column, highest first; this '
+            'holds every row in memory unless --top is given')
+    parser.add_argument('--top', type=int,
+            help='with --sort, only write the N highest ranked color sets')
+    parser.add_argument('--output', '-o',
+            help='file to write the table to (default: standard output)')
+    args = parser.parse_args(argv)
+
+    try:
+        dl = DataLoaderFactory(graph_backend='csr').load_data(args.archive,
+                lazy=True, validate=True)
+    except (InvalidArchiveError, UnknownPipelineError) as e:
+        parser.exit(1, '{0}: {1}\n'.format(parser.prog, e.msg))
+    try:
+        size = args.size if args.size is not None else \
+                dl.pattern.number_of_nodes()
+        rows = batch_decompose(dl.graph, dl.colorings[-1], size,
+                processes=args.processes)
+        if args.sort is not None:
+            rows = rank(rows, args.sort, args.top)
+
+        # Rows are written as they are found, unless they had to be ranked
+        if args.output is None:
+            write_table(rows, sys.stdout)
+        else:
+            with open(args.output, 'w') as out:
+                write_table(rows, out)
+    finally:
+        dl.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+"""
+Index of a host graph by the colors of a coloring
+
+The vertices are sorted by color and the edges by the unordered pair of
+their endpoints' colors, each group a slice of one array, so the vertices
+and edges of the subgraph induced by a color set are the slices for its
+colors and pairs of colors.  Building the index takes one pass over the
+graph; after that nothing about a color set needs the adjacency of the
+graph, or a pass over the whole coloring.
+"""
+
+import numpy as np
+
+from beavr.csrgraph import CSRGraph, edge_array
+
+
+class ColorIndex(object):
+    """Vertices grouped by color and edges grouped by pair of colors"""
+
+    def __init__(self, graph, coloring):
+        """
+        :param graph: host graph, as a NetworkX graph or a CSRGraph
+        :param coloring: sequence of colors indexed by vertex; vertices
+                         which are not in the graph are left out
+        """
+        coloring = np.asarray(coloring)
+        n = len(coloring)
+        nodes = np.asarray(list(graph), dtype=np.int64)
+        # Vertices up to the largest in the graph or the coloring get a
+        # position, so any vertex of the graph can be looked up
+        size = max(n, int(nodes.max()) + 1 if len(nodes) else 0)
+        nodes = nodes[(nodes >= 0) & (nodes < n)]
+
+        # Vertices sorted by color, those of colors[i] being
+        # vertices[vertex_offsets[i]:vertex_offsets[i + 1]]
+        order = np.argsort(coloring[nodes], kind='mergesort')
+        self.vertices = nodes[order]
+        self.colors, starts = np.unique(coloring[self.vertices],
+                return_index=True)
+        self.vertex_offsets = np.append(starts, len(self.vertices))
+
+        # Position in colors of the color of each vertex, or len(colors) for
+        # vertices which are not indexed
+        count = len(self.colors)
+        self.positions = np.full(size, count, dtype=np.int64)
+        self.positions[self.vertices] = np.repeat(np.arange(count),
+                np.diff(self.vertex_offsets))
+
+        # Edges with the lower color position first, sorted by their pair of
+        # color positions, those of pair_keys[i] being
+        # edges[edge_offsets[i]:edge_offsets[i + 1]]
+        edges = edge_array(graph)
+        edges = edges[(edges < n).all(axis=1)]
+        first = self.positions[edges[:, 0]]
+        second = self.positions[edges[:, 1]]
+        indexed = (first < count) & (second < count)
+        edges, first, second = edges[indexed], first[indexed], second[indexed]
+        swap = first > second
+        edges[swap] = edges[swap][:, ::-1]
+        keys = np.minimum(first, second) * count + np.maximum(first, second)
+        order = np.argsort(keys, kind='mergesort')
+        self.edges = edges[order]
+        self.pair_keys, starts = np.unique(keys[order], return_index=True)
+        self.edge_offsets = np.append(starts, len(self.edges))
+
+    def position(self, color):
+        """Return the position of a color in colors, or None"""
+        i = np.searchsorted(self.colors, color)
+        if i < len(self.colors) and self.colors[i] == color:
+            return int(i)
+        return None
+
+    def color_class(self, color):
+        """Return the array of the vertices of a color"""
+        i = self.position(color)
+        if i is None:
+            return self.vertices[:0]
+        return self.vertices[self.vertex_offsets[i]:self.vertex_offsets[i + 1]]
+
+    def pair_edges(self, color1, color2):
+        """
+        Get the edges between the vertices of two colors, or among those of
+        one color if they are the same
+        :returns: k by 2 array of edges, with the vertex of color1 first
+        """
+        i, j = self.position(color1), self.position(color2)
+        if i is None or j is None:
+            return self.edges[:0]
+        key = min(i, j) * len(self.colors) + max(i, j)
+        k = np.searchsorted(self.pair_keys, key)
+        if k == len(self.pair_keys) or self.pair_keys[k] != key:
+            return self.edges[:0]
+        edges = self.edges[self.edge_offsets[k]:self.edge_offsets[k + 1]]
+        return edges[:, ::-1] if i > j else edges
+
+    def induced_vertices(self, color_set):
+        """Return the array of the vertices with colors in a color set"""
+        return np.concatenate([self.vertices[:0]] +
+                [self.color_class(color) for color in sorted(color_set)])
+
+    def induced_edges(self, color_set):
+        """Return the k by 2 array of the edges induced by a color set"""
+        colors = sorted(color_set)
+        return np.concatenate([self.edges[:0]] +
+                [self.pair_edges(c1, c2) for i, c1 in enumerate(colors)
+                    for c2 in colors[i:]])
+
+    def subgraph(self, color_set):
+        """Return the subgraph induced by a color set, as a CSRGraph"""
+        return CSRGraph.from_edges(self.induced_vertices(color_set),
+                self.induced_edges(color_set))
+
+    def in_colors(self, vertices, color_set):
+        """
+        Find which of some vertices have colors in a color set
+        :param vertices: array of vertex labels
+        :returns: boolean array
+        """
+        selected = np.zeros(len(self.colors) + 1, dtype=bool)
+        for color in color_set:
+            i = self.position(color)
+            if i is not None:
+                selected[i] = True
+        return selected[self.positions[vertices]]
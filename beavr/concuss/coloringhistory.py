@@ -0,0 +1,299 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+from collections import OrderedDict
+
+import numpy as np
+
+
+class ColoringHistory(object):
+    """
+    The colorings from every step of the CONCUSS coloring stage
+
+    Only the first coloring is stored in full.  Each later step is stored as
+    the vertices whose colors changed in that step together with their new
+    colors.  A full copy of the coloring (a keyframe) is also kept every
+    keyframe_interval steps, so any step can be rebuilt by applying at most
+    keyframe_interval - 1 deltas to the keyframe before it.
+    """
+
+    def __init__(self, colorings=(), keyframe_interval=32):
+        """
+        Create a history, optionally from a sequence of colorings
+        :param colorings: colorings to append, in order of coloring step
+        :param keyframe_interval: number of steps between full copies
+        """
+        self.keyframe_interval = keyframe_interval
+        # Number of vertices in the coloring of each step
+        self.lengths = []
+        # Per-step arrays of changed vertices and their new colors
+        self.delta_vertices = []
+        self.delta_colors = []
+        # Full colorings, keyed by step
+        self.keyframes = {}
+        # Coloring of the last step, padded to the longest coloring so far
+        self.last = np.zeros(0, dtype=np.int32)
+        # Most recently rebuilt step, so that stepping forwards through the
+        # history only needs to apply one delta at a time
+        self.cursor_step = None
+        self.cursor = None
+
+        for coloring in colorings:
+            self.append(coloring)
+
+    def append(self, coloring):
+        """
+        Add the coloring of the next step
+        :param coloring: sequence of colors indexed by vertex
+        """
+        coloring = np.array(coloring, dtype=np.int32)
+        step = len(self.lengths)
+
+        # Colorings may cover different numbers of vertices; vertices beyond
+        # the end of a coloring are treated as having color 0
+        size = max(len(self.last), len(coloring))
+        current = self._padded(coloring, size)
+        if step == 0:
+            # The first step is a keyframe, so it needs no delta
+            changed = np.zeros(0, dtype=np.int32)
+        else:
+            changed = np.flatnonzero(current != self._padded(self.last, size))
+
+        self.lengths.append(len(coloring))
+        self.delta_vertices.append(changed.astype(np.int32))
+        self.delta_colors.append(current[changed])
+        if step % self.keyframe_interval == 0:
+            self.keyframes[step] = current
+        self.last = current
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, step):
+        """
+        Rebuild the coloring of a step
+        :param step: index of the step, which may be negative
+        :returns: array of colors indexed by vertex
+        """
+        if step < 0:
+            step += len(self)
+        if not 0 <= step < len(self):
+            raise IndexError('coloring step out of range')
+
+        if step == len(self) - 1:
+            coloring = self.last
+        else:
+            # Start from the closest earlier keyframe, or from the cursor if
+            # that is closer
+            start = step - step % self.keyframe_interval
+            if (self.cursor_step is not None and
+                    start <= self.cursor_step <= step):
+                start = self.cursor_step
+                coloring = self.cursor.copy()
+            else:
+                coloring = self.keyframes[start].copy()
+            coloring = self._padded(coloring, len(self.last))
+            for delta in range(start + 1, step + 1):
+                coloring[self.delta_vertices[delta]] = self.delta_colors[delta]
+            self.cursor_step = step
+            self.cursor = coloring
+
+        return coloring[:self.lengths[step]].copy()
+
+    def __iter__(self):
+        for step in range(len(self)):
+            yield self[step]
+
+    def changed_vertices(self, step):
+        """
+        Get the vertices whose colors changed in a step
+        :param step: index of the step, which may be negative
+        :returns: array of vertices
+        """
+        return self.delta_vertices[step]
+
+    def color_set(self, step):
+        """
+        Get the colors used in a step
+        :param step: index of the step, which may be negative
+        :returns: set of colors
+        """
+        return set(np.unique(self[step]).tolist())
+
+    def to_arrays(self):
+        """
+        Represent the history as a dictionary of arrays, for storage
+        :returns: dictionary of arrays by name
+        """
+        steps = sorted(self.keyframes)
+        keyframes = np.zeros((len(steps), len(self.last)), dtype=np.int32)
+        for i, step in enumerate(steps):
+            keyframes[i, :len(self.keyframes[step])] = self.keyframes[step]
+        return {
+            'keyframe_interval': np.array(self.keyframe_interval),
+            'lengths': np.array(self.lengths, dtype=np.int64),
+            'delta_offsets': offsets_of(self.delta_vertices),
+            'delta_vertices': concatenate(self.delta_vertices),
+            'delta_colors': concatenate(self.delta_colors),
+            'keyframe_steps': np.array(steps, dtype=np.int64),
+            'keyframes': keyframes,
+            'last': self.last
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Create a history from the arrays made by to_arrays.  The history
+        refers to the arrays rather than copying them.
+        :param arrays: dictionary of arrays by name
+        :returns: ColoringHistory
+        """
+        history = cls(keyframe_interval=int(arrays['keyframe_interval']))
+        history.lengths = arrays['lengths'].tolist()
+        offsets = arrays['delta_offsets'].tolist()
+        history.delta_vertices = [arrays['delta_vertices'][start:stop]
+                for start, stop in zip(offsets[:-1], offsets[1:])]
+        history.delta_colors = [arrays['delta_colors'][start:stop]
+                for start, stop in zip(offsets[:-1], offsets[1:])]
+        history.keyframes = dict((step, keyframe) for step, keyframe in
+                zip(arrays['keyframe_steps'].tolist(), arrays['keyframes']))
+        history.last = arrays['last']
+        return history
+
+    def nbytes(self):
+        """Number of bytes used by the arrays holding the history"""
+        return (sum(a.nbytes for a in self.delta_vertices) +
+                sum(a.nbytes for a in self.delta_colors) +
+                sum(a.nbytes for a in self.keyframes.itervalues()) +
+                self.last.nbytes)
+
+    @staticmethod
+    def _padded(coloring, size):
+        """Return coloring extended with color 0 up to the given size"""
+        if len(coloring) >= size:
+            return coloring
+        padded = np.zeros(size, dtype=np.int32)
+        padded[:len(coloring)] = coloring
+        return padded
+
+
+class LazyColoringHistory(object):
+    """
+    The colorings from every step of the CONCUSS coloring stage, read from
+    the archive only when a step is needed
+
+    Each coloring member of an archive holds the whole coloring of its step,
+    so the members are an index of keyframes: rebuilding any step reads just
+    its own member, and steps which are never looked at are never read.  The
+    few steps used most recently are kept, so that stepping through the
+    history and comparing neighbouring steps read each member once.
+    """
+
+    # Values which read the archive on demand are not saved to the cache,
+    # since saving them would read every step
+    reads_on_demand = True
+
+    def __init__(self, read_step, steps, cached_steps=4):
+        """
+        :param read_step: function returning the coloring of a step, as an
+                          array of colors indexed by vertex, given its index
+        :param steps: number of steps
+        :param cached_steps: number of recently used steps to keep
+        """
+        self.read_step = read_step
+        self.steps = steps
+        self.cached_steps = cached_steps
+        self.cache = OrderedDict()
+        self.color_sets = {}
+
+    def __len__(self):
+        return self.steps
+
+    def _step_index(self, step):
+        if step < 0:
+            step += len(self)
+        if not 0 <= step < len(self):
+            raise IndexError('coloring step out of range')
+        return step
+
+    def _coloring(self, step):
+        """Get the coloring of a step, reading it if it is not kept"""
+        step = self._step_index(step)
+        try:
+            coloring = self.cache.pop(step)
+        except KeyError:
+            coloring = np.asarray(self.read_step(step), dtype=np.int32)
+        self.cache[step] = coloring
+        while len(self.cache) > self.cached_steps:
+            self.cache.popitem(last=False)
+        return coloring
+
+    def __getitem__(self, step):
+        """
+        Rebuild the coloring of a step
+        :param step: index of the step, which may be negative
+        :returns: array of colors indexed by vertex
+        """
+        return self._coloring(step).copy()
+
+    def __iter__(self):
+        for step in range(len(self)):
+            yield self[step]
+
+    def changed_vertices(self, step):
+        """
+        Get the vertices whose colors changed in a step
+        :param step: index of the step, which may be negative
+        :returns: array of vertices
+        """
+        step = self._step_index(step)
+        if step == 0:
+            return np.zeros(0, dtype=np.int32)
+        previous = self._coloring(step - 1)
+        current = self._coloring(step)
+        size = max(len(previous), len(current))
+        return np.flatnonzero(ColoringHistory._padded(current, size) !=
+                ColoringHistory._padded(previous, size)).astype(np.int32)
+
+    def color_set(self, step):
+        """
+        Get the colors used in a step
+        :param step: index of the step, which may be negative
+        :returns: set of colors
+        """
+        step = self._step_index(step)
+        if step not in self.color_sets:
+            self.color_sets[step] = set(np.unique(
+                self._coloring(step)).tolist())
+        return set(self.color_sets[step])
+
+    def to_arrays(self):
+        """
+        Represent the history as a dictionary of arrays, as
+        ColoringHistory.to_arrays does.  This reads every step.
+        """
+        return ColoringHistory(self).to_arrays()
+
+    def nbytes(self):
+        """Number of bytes used by the steps kept"""
+        return sum(a.nbytes for a in self.cache.itervalues())
+
+
+def offsets_of(arrays):
+    """
+    Get the offsets at which arrays start when concatenated, followed by
+    their total length
+    """
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    np.cumsum([len(a) for a in arrays], out=offsets[1:])
+    return offsets
+
+
+def concatenate(arrays):
+    """Concatenate int32 arrays, which may be an empty list of them"""
+    if not arrays:
+        return np.zeros(0, dtype=np.int32)
+    return np.concatenate(arrays)
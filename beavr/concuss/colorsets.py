@@ -0,0 +1,358 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+"""
+Storage for the counts CONCUSS finds for each color set
+
+The combine stage writes combine/counts_per_colorset.txt, with one line per
+color set of the form "0,1,2 : 62".  These files grow combinatorially with the
+number of colors, so rather than a dictionary keyed by tuples they are stored
+as parallel arrays: one row of bitmasks per color set, with bit c of word
+c // 64 set if the set contains color c, and the count found for it.
+"""
+
+from string import maketrans
+
+import numpy as np
+from beavr.archive import check_samples
+
+# Token that ':' is replaced with before parsing; colors and counts are never
+# negative, so it cannot be mistaken for either
+SEPARATOR = -1
+
+_separators = maketrans('()[],', '     ')
+
+# Number of set bits in each possible byte
+_popcounts = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+
+
+class ColorsetCounts(object):
+    """
+    Counts per color set, with the color sets stored as bitmasks
+
+    The color sets are kept sorted by their bitmasks, so looking one up is a
+    binary search.  Color sets are returned as sorted tuples of colors.
+    """
+
+    # Number of color sets converted to tuples at once
+    block_size = 1 << 16
+
+    def __init__(self, masks, counts):
+        """
+        Create a store from arrays, which are used without copying
+        :param masks: 2D uint64 array with a row of bitmask words for each
+                      color set, sorted by their mask_keys
+        :param counts: int64 array of the count for each color set
+        """
+        self.masks = masks
+        self.counts = counts
+        self._keys = None
+
+    @classmethod
+    def from_unsorted(cls, masks, counts):
+        """
+        Create a store from arrays in any order.  If a color set appears more
+        than once, its last count is kept, as it would be in a dictionary.
+        """
+        masks = np.ascontiguousarray(masks, dtype=np.uint64)
+        counts = np.asarray(counts, dtype=np.int64)
+        if masks.ndim == 1:
+            masks = masks.reshape(-1, 1)
+        keys = mask_keys(masks)
+        # Reversing first makes np.unique pick the last of any duplicates
+        _, last = np.unique(keys[::-1], return_index=True)
+        order = len(keys) - 1 - last
+        return cls(masks[order], counts[order])
+
+    @classmethod
+    def from_dict(cls, counts_per_colorset):
+        """
+        Create a store from a dictionary of counts keyed by color sets
+        :param counts_per_colorset: dictionary mapping iterables of colors to
+                                    counts
+        """
+        colorsets = counts_per_colorset.keys()
+        rows = np.repeat(np.arange(len(colorsets)),
+                [len(colorset) for colorset in colorsets])
+        colors = np.fromiter((c for colorset in colorsets for c in colorset),
+                dtype=np.int64, count=len(rows))
+        return cls.from_unsorted(colorset_masks(rows, colors, len(colorsets)),
+                [counts_per_colorset[colorset] for colorset in colorsets])
+
+    def to_dict(self):
+        """Return a dictionary of counts keyed by tuples of colors"""
+        return dict(zip(self.keys(), self.counts.tolist()))
+
+    def to_arrays(self):
+        """
+        Represent the store as a dictionary of arrays, for storage
+        :returns: dictionary of arrays by name
+        """
+        return {'masks': self.masks, 'counts': self.counts}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Create a store from the arrays made by to_arrays, without copying them
+        :param arrays: dictionary of arrays by name
+        """
+        return cls(arrays['masks'], arrays['counts'])
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, colorset):
+        return self.index(colorset) is not None
+
+    def __getitem__(self, colorset):
+        """
+        Look up the count for a color set
+        :param colorset: iterable of colors
+        :raises KeyError: if the color set has no count
+        """
+        index = self.index(colorset)
+        if index is None:
+            raise KeyError(colorset)
+        return int(self.counts[index])
+
+    def get(self, colorset, default=None):
+        index = self.index(colorset)
+        return default if index is None else int(self.counts[index])
+
+    def index(self, colorset):
+        """
+        Find the row of a color set
+        :param colorset: iterable of colors
+        :returns: index into self.masks and self.counts, or None
+        """
+        query = self.query_mask(colorset)
+        if query is None:
+            return None
+        keys = mask_keys(self.masks)
+        query = mask_keys(query.reshape(1, -1))
+        position = np.searchsorted(keys, query)[0]
+        if position < len(keys) and keys[position] == query[0]:
+            return int(position)
+        return None
+
+    def keys(self):
+        """Return a list of the color sets as sorted tuples of colors"""
+        if self._keys is None:
+            self._keys = self.colorsets()
+        return self._keys
+
+    def iteritems(self):
+        return iter(zip(self.keys(), self.counts.tolist()))
+
+    def colorsets(self, stop=None):
+        """
+        Convert color sets to tuples of colors
+        :param stop: number of color sets to convert, or None for all
+        :returns: list of sorted tuples of colors
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        shifts = np.arange(64, dtype=np.uint64)
+        colorsets = []
+        for start in range(0, stop, self.block_size):
+            block = self.masks[start:min(start + self.block_size, stop)]
+            bits = ((block[:, :, np.newaxis] >> shifts) & np.uint64(1))
+            rows, colors = np.nonzero(bits.reshape(len(block), -1))
+            boundaries = np.searchsorted(rows, np.arange(1, len(block)))
+            colorsets.extend(tuple(colorset.tolist()) for colorset in
+                    np.split(colors, boundaries))
+        return colorsets
+
+    def sizes(self):
+        """Return an array of the number of colors in each color set"""
+        if len(self) == 0:
+            return np.zeros(0, dtype=np.int64)
+        as_bytes = np.ascontiguousarray(self.masks).view(np.uint8)
+        return _popcounts[as_bytes].reshape(len(self), -1).sum(axis=1)
+
+    def select(self, selected):
+        """
+        Get the color sets selected by a boolean array or array of indices
+        :returns: ColorsetCounts
+        """
+        return ColorsetCounts(self.masks[selected], self.counts[selected])
+
+    def of_size(self, size):
+        """Get the color sets with the given number of colors"""
+        return self.select(self.sizes() == size)
+
+    def group_by_size(self, sizes=()):
+        """
+        Group the color sets by their number of colors
+        :param sizes: numbers of colors to include even if no color set has
+                      them, with an empty ColorsetCounts
+        :returns: dictionary of ColorsetCounts by number of colors
+        """
+        set_sizes = self.sizes()
+        return dict((size, self.select(set_sizes == size))
+                for size in set(np.unique(set_sizes).tolist()) | set(sizes))
+
+    def totals_by_size(self):
+        """
+        Add up the counts of the color sets of each size
+        :returns: dictionary of total counts by number of colors
+        """
+        sizes = self.sizes()
+        if len(sizes) == 0:
+            return {}
+        order = np.argsort(sizes, kind='mergesort')
+        sizes = sizes[order]
+        starts = np.flatnonzero(np.r_[True, sizes[1:] != sizes[:-1]])
+        totals = np.add.reduceat(self.counts[order], starts)
+        return dict(zip(sizes[starts].tolist(), totals.tolist()))
+
+    def subsets(self, colorset):
+        """Get the color sets which are subsets of the given one"""
+        query = self.query_mask(colorset, clip=True)
+        return self.select(np.all(self.masks & ~query == 0, axis=1))
+
+    def supersets(self, colorset):
+        """Get the color sets which are supersets of the given one"""
+        query = self.query_mask(colorset)
+        if query is None:
+            return self.select(np.zeros(len(self), dtype=bool))
+        return self.select(np.all(self.masks & query == query, axis=1))
+
+    def query_mask(self, colorset, clip=False):
+        """
+        Get the bitmask of a color set, with as many words as self.masks
+        :param clip: if True, ignore colors too large to be in any color set;
+                     otherwise return None if there are any
+        """
+        colors = np.fromiter(colorset, dtype=np.int64)
+        words = self.masks.shape[1]
+        if len(colors) and colors.max() >= 64 * words:
+            if not clip:
+                return None
+            colors = colors[colors < 64 * words]
+        return colorset_masks(np.zeros(len(colors), dtype=np.int64), colors,
+                1, words)[0]
+
+    def nbytes(self):
+        """Number of bytes used by the arrays holding the counts"""
+        return self.masks.nbytes + self.counts.nbytes
+
+
+def mask_keys(masks):
+    """
+    View each row of bitmask words as a single value, so rows can be sorted
+    and searched as a whole
+    """
+    masks = np.ascontiguousarray(masks)
+    return masks.view(np.dtype((np.void, masks.dtype.itemsize *
+        masks.shape[1]))).ravel()
+
+
+def colorset_masks(rows, colors, n, words=None):
+    """
+    Build bitmasks of color sets from their colors
+    :param rows: array of the color set each color belongs to, in increasing
+                 order
+    :param colors: array of colors
+    :param n: number of color sets
+    :param words: number of 64-bit words per bitmask, or None for as many as
+                  the largest color needs
+    :returns: n by words uint64 array
+    """
+    if words is None:
+        words = int(colors.max()) // 64 + 1 if len(colors) else 1
+    masks = np.zeros((n, words), dtype=np.uint64)
+    if len(colors) == 0:
+        return masks
+    if colors.min() < 0:
+        raise ValueError('Negative color in color set')
+
+    # Colors of a set are listed together, so after sorting by word the bits
+    # going into each word are adjacent and can be combined in one pass
+    slots = rows * words + colors // 64
+    bits = np.left_shift(np.uint64(1), (colors % 64).astype(np.uint64))
+    if np.any(slots[1:] < slots[:-1]):
+        order = np.argsort(slots, kind='mergesort')
+        slots = slots[order]
+        bits = bits[order]
+    starts = np.flatnonzero(np.r_[True, slots[1:] != slots[:-1]])
+    masks.ravel()[slots[starts]] = np.bitwise_or.reduceat(bits, starts)
+    return masks
+
+
+def parse_colorset_counts(data):
+    """
+    Parse lines of the form "color, color, ...: count"
+    :param data: string of whole lines
+    :returns: tuple of the bitmasks and counts of the color sets, in the
+              order they appear
+    """
+    tokens = np.fromstring(data.translate(_separators).replace(':',
+        ' {0} '.format(SEPARATOR)), dtype=np.int64, sep=' ')
+    n = data.count(':')
+    separators = np.flatnonzero(tokens == SEPARATOR)
+    # np.fromstring stops quietly at anything it cannot parse, so make sure
+    # every line was read up to its count
+    if (len(separators) != n or (n == 0 and len(tokens) > 0) or
+            (n > 0 and separators[-1] != len(tokens) - 2) or
+            np.any(tokens[separators + 1] < 0) or np.any(tokens < SEPARATOR)):
+        raise ValueError('Malformed color set counts')
+
+    is_color = np.ones(len(tokens), dtype=bool)
+    is_color[separators] = False
+    is_color[separators + 1] = False
+    # Colors before the i-th separator belong to color set i
+    rows = np.cumsum(tokens == SEPARATOR)[is_color]
+    return colorset_masks(rows, tokens[is_color], n), tokens[separators + 1]
+
+
+def read_colorset_counts(counts_file, chunk_size=1 << 22):
+    """
+    Read the counts per color set written by CONCUSS
+    :param counts_file: file object for combine/counts_per_colorset.txt
+    :param chunk_size: number of bytes to read at once
+    :returns: ColorsetCounts
+    """
+    masks = []
+    counts = []
+    remainder = ''
+    while True:
+        data = counts_file.read(chunk_size)
+        if not data:
+            break
+        # Only parse whole lines, keeping the rest for the next chunk
+        data = remainder + data
+        end = data.rfind('\n') + 1
+        remainder = data[end:]
+        chunk_masks, chunk_counts = parse_colorset_counts(data[:end])
+        masks.append(chunk_masks)
+        counts.append(chunk_counts)
+    chunk_masks, chunk_counts = parse_colorset_counts(remainder)
+    masks.append(chunk_masks)
+    counts.append(chunk_counts)
+
+    # Chunks with larger colors have more words per bitmask
+    words = max(m.shape[1] for m in masks)
+    padded = np.zeros((sum(len(m) for m in masks), words), dtype=np.uint64)
+    start = 0
+    for m in masks:
+        padded[start:start + len(m), :m.shape[1]] = m
+        start += len(m)
+    return ColorsetCounts.from_unsorted(padded, np.concatenate(counts))
+
+
+def check_colorset_counts(head, tail, whole):
+    """
+    Check samples of the counts per color set, as taken by
+    beavr.archive.sample_member
+    :param head: first bytes of the file
+    :param tail: last bytes of the file, or None
+    :param whole: whether head is the whole file
+    :raises ValueError: if they are malformed
+    """
+    check_samples(parse_colorset_counts, head, tail, whole)
@@ -0,0 +1,184 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+"""
+Connected components of the subgraph induced by a color set, kept up to date
+as colors are added to and removed from the set
+
+The Decompose tab changes its color set one color at a time.  Adding a color
+joins the vertices of that color to the components around them with
+union-find, through the edges from that color to the colors of the set,
+which a ColorIndex keeps together.  Removing a color only
+recomputes the components which held vertices of that color; the others
+cannot have changed.  Either way the work grows with the color class and the
+components it touches, not with the host graph.
+"""
+
+import networkx as nx
+import numpy as np
+
+from beavr.concuss.colorindex import ColorIndex
+from beavr.csrgraph import incident_edges
+
+
+class IncrementalComponents(object):
+    """
+    Connected components of the subgraph of a host graph induced by the
+    vertices with colors in a color set
+    """
+
+    def __init__(self, graph, coloring, index=None):
+        """
+        :param graph: host graph, as a NetworkX graph or a CSRGraph
+        :param coloring: sequence of colors indexed by vertex
+        :param index: ColorIndex of the graph and coloring, which is built
+                      if it is not given
+        """
+        self.graph = graph
+        self.coloring = np.asarray(coloring)
+        self.index = ColorIndex(graph, coloring) if index is None else index
+        self.color_set = set()
+
+        # Union-find forest over the vertices with colors in the set, and the
+        # vertices of the component of each root
+        self.parent = {}
+        self.members = {}
+        # (smallest vertex, NetworkX graph) of each component by its root,
+        # for the components which have not changed since they were built
+        self.graphs = {}
+
+    def set_colors(self, color_set):
+        """
+        Change the color set, adding and removing colors one at a time
+        :param color_set: iterable of colors
+        """
+        color_set = set(color_set)
+        for color in self.color_set - color_set:
+            self.remove_color(color)
+        for color in color_set - self.color_set:
+            self.add_color(color)
+
+    def add_color(self, color):
+        """Add the vertices of a color, joining them to their neighbors"""
+        if color in self.color_set:
+            return
+        self.color_set.add(color)
+        for v in self.color_class(color).tolist():
+            self.parent[v] = v
+            self.members[v] = [v]
+        for other in self.color_set:
+            for u, v in self.index.pair_edges(color, other).tolist():
+                self.union(u, v)
+
+    def remove_color(self, color):
+        """
+        Remove the vertices of a color, splitting up the components which
+        held them
+        """
+        if color not in self.color_set:
+            return
+        self.color_set.discard(color)
+        removed = self.color_class(color).tolist()
+        roots = set(self.find(v) for v in removed)
+
+        affected = []
+        for root in roots:
+            affected.extend(self.members.pop(root))
+            self.graphs.pop(root, None)
+        for v in removed:
+            del self.parent[v]
+        remaining = [v for v in affected if v in self.parent]
+        for v in remaining:
+            self.parent[v] = v
+            self.members[v] = [v]
+        self.join(remaining)
+
+    def color_class(self, color):
+        """Return the array of the vertices of a color"""
+        return self.index.color_class(color)
+
+    def inner_edges(self, vertices):
+        """
+        Get the edges from some vertices to neighbors with colors in the set
+        :returns: k by 2 array of (vertex, neighbor) rows
+        """
+        edges = incident_edges(self.graph, vertices)
+        return edges[self.index.in_colors(edges[:, 1], self.color_set)]
+
+    def join(self, vertices):
+        """Join each of some vertices to its neighbors in the color set"""
+        for u, v in self.inner_edges(vertices).tolist():
+            self.union(u, v)
+
+    def find(self, v):
+        """Return the root of a vertex's component"""
+        parent = self.parent
+        while parent[v] != v:
+            # Path halving keeps the trees shallow
+            parent[v] = parent[parent[v]]
+            v = parent[v]
+        return v
+
+    def union(self, u, v):
+        """Join the components of two vertices"""
+        u = self.find(u)
+        v = self.find(v)
+        if u == v:
+            return
+        # Move the members of the smaller component into the larger one
+        if len(self.members[u]) < len(self.members[v]):
+            u, v = v, u
+        self.parent[v] = u
+        self.members[u].extend(self.members.pop(v))
+        self.graphs.pop(u, None)
+        self.graphs.pop(v, None)
+
+    def components(self):
+        """Return a list of the vertices of each component"""
+        return self.members.values()
+
+    def component_graphs(self):
+        """
+        Get the components as NetworkX graphs with a 'color' attribute on
+        every vertex.  Graphs of components which have not changed since the
+        last call are the same objects as before, so their vertices and
+        edges must not be changed.
+        :returns: list of graphs, in order of their smallest vertex
+        """
+        changed = [root for root in self.members if root not in self.graphs]
+        if changed:
+            self.build_graphs(changed)
+        return [graph for _, graph in sorted(self.graphs[root]
+            for root in self.members)]
+
+    def build_graphs(self, roots):
+        """Build the graphs of some components, all at once"""
+        sizes = [len(self.members[root]) for root in roots]
+        vertices = np.concatenate([self.members[root] for root in roots])
+        owners = np.repeat(np.arange(len(roots)), sizes)
+        colors = self.coloring[vertices].tolist()
+
+        # Neighbors in the color set are in the same component, so each
+        # edge belongs to the component of its first vertex
+        edges = self.inner_edges(vertices)
+        edges = edges[edges[:, 0] <= edges[:, 1]]
+        order = np.argsort(vertices)
+        edge_owners = owners[order[np.searchsorted(vertices[order],
+            edges[:, 0])]]
+        by_owner = np.argsort(edge_owners, kind='mergesort')
+        edge_counts = np.bincount(edge_owners, minlength=len(roots))
+        edges = edges[by_owner].tolist()
+
+        vertex_start = edge_start = 0
+        for root, size, edge_count in zip(roots, sizes, edge_counts.tolist()):
+            vertex_end = vertex_start + size
+            edge_end = edge_start + edge_count
+            graph = nx.Graph()
+            graph.add_nodes_from((v, {'color': color}) for v, color in zip(
+                self.members[root], colors[vertex_start:vertex_end]))
+            graph.add_edges_from(edges[edge_start:edge_end])
+            self.graphs[root] = (min(self.members[root]), graph)
+            vertex_start, edge_start = vertex_end, edge_end
@@ -4,40 +4,157 @@
 # the three-clause BSD license; see LICENSE.
 #
 
+from functools import partial
 from os.path import basename, splitext
-import collections
 
-from networkx import Graph
-import ast
+import numpy as np
+from beavr.archive import check_array, check_samples, open_archive, \
+        read_member
 from beavr.dataloader import DataLoader
+from beavr.util import parallel_imap
+from beavr.concuss.graphreaders import GraphArrays, check_edgelist, \
+        check_gml, check_leda, check_xml, read_edgelist_arrays, \
+        read_gml_arrays, read_leda_arrays, read_xml_arrays
+from beavr.concuss.coloringhistory import ColoringHistory, \
+        LazyColoringHistory
+from beavr.concuss.dptable import check_dp_table, read_dp_table
+from beavr.concuss.colorsets import check_colorset_counts, \
+        read_colorset_counts
+from beavr.concuss.vertexids import VertexIds
+from beavr.concuss import arrayformat
 
 class Factory(object):
     """ Wrapper allowing DataLoaderFactory to create a ConcussDataLoader """
 
-    def create(self, archive, parser):
+    def create(self, archive, parser, graph_backend='networkx'):
         """
         Creates ConcussDataLoader with given vis archive and parsed
         configuration
+        :param graph_backend: 'networkx' or 'csr'; see ConcussDataLoader
         """
-        return ConcussDataLoader(archive, parser)
+        return ConcussDataLoader(archive, parser, graph_backend)
 
 
 class ConcussDataLoader(DataLoader):
-    """ Loads data provided by the CONCUSS pipeline """
+    """
+    Loads data provided by the CONCUSS pipeline
+
+    Vertices of the host graph are numbered 0 to n - 1 in order of their ids
+    in the archive, and every attribute refers to them by these indices;
+    vertex_ids maps them back to the ids.
+    """
+
+    lazy_attributes = {
+        'graph': 'load_graph',
+        'pattern': 'load_pattern',
+        'colorings': 'load_colorings',
+        'big_component': 'load_big_component',
+        'table': 'load_dp_table',
+        'tdd': 'load_tdd',
+        'counts_per_colorset': 'load_counts',
+        'title_items': 'load_title_items',
+        'vertex_ids': 'load_vertex_ids'
+    }
+
+    cached_attributes = arrayformat.codecs
+
+    # The vertex ids and the host graph come from one parse of the graph's
+    # file, so neither is restored from the cache without the other
+    cache_groups = {
+        'graph': ('graph', 'vertex_ids'),
+        'vertex_ids': ('graph', 'vertex_ids')
+    }
+
+    # Ways the host graph can be stored
+    graph_backends = ('networkx', 'csr')
+
+    # Coloring members are parsed in parallel once their total uncompressed
+    # size reaches this many bytes, up to lazy_colorings_size
+    parallel_colorings_size = 1 << 22
+    # From this many bytes of coloring members, or None for never, each step
+    # is only read when it is needed rather than all being parsed up front
+    lazy_colorings_size = 1 << 26
+    # Edge lists and LEDA files are parsed in parallel from this many bytes
+    parallel_edges_size = 1 << 25
+    # Number of worker processes for parallel parsing, or None for one per CPU
+    processes = None
+
+    def __init__(self, archive, parser, graph_backend='networkx'):
+        """
+        :param graph_backend: 'networkx' to load the host graph as a NetworkX
+                              Graph, or 'csr' to load it as a CSRGraph, which
+                              takes far less memory for large graphs
+        """
+        super(ConcussDataLoader, self).__init__(archive, parser)
+        if graph_backend not in self.graph_backends:
+            raise ValueError('Unknown graph backend ' + repr(graph_backend))
+        self.graph_backend = graph_backend
+        # Densely numbered host graph read while finding the vertex ids, kept
+        # until load_graph takes it
+        self.host_graph_arrays = None
+        if graph_backend == 'csr':
+            self.cached_attributes = arrayformat.csr_codecs
 
     def load(self):
         """
         Load data from self.archive
         :returns: loads and stores graph and colorings
         """
-        self.graph = self.load_graph()
-        self.pattern = self.load_pattern()
-        self.colorings = self.load_colorings()
-        self.big_component = self.load_big_component()
-        self.table = self.load_dp_table()
-        self.tdd = self.load_tdd()
-        self.counts_per_colorset= self.load_counts()
-        self.title_items = self.load_title_items()
+        for name in self.lazy_attributes:
+            getattr(self, name)
+
+    def validate(self):
+        """
+        Look for structural problems with the archive before anything is
+        loaded; see DataLoader.validate.  The count and combine members are
+        only checked if they are there, since only their tabs need them.
+        :returns: list of descriptions of the problems found
+        """
+        problems = []
+        for section, option in (('pipeline', 'command'), ('graphs', 'graph'),
+                ('graphs', 'motif')):
+            if not self.parser.has_option(section, option):
+                problems.append('visinfo.cfg: no {0} option in '
+                        '[{1}]'.format(option, section))
+        if (self.parser.has_option('pipeline', 'command') and
+                'config' not in self.parser.get('pipeline', 'command')):
+            problems.append('visinfo.cfg: the pipeline command names no '
+                    'config file')
+
+        names = self.archive.namelist()
+        if self.archive_version >= 2:
+            # Everything but the titles is read from arrays
+            for attribute in sorted(self.cached_attributes):
+                prefix = attribute + '/'
+                arrays = [name for name in names
+                        if name.startswith(prefix) and name.endswith('.npy')]
+                if not arrays:
+                    problems.append('{0}: no arrays in the '
+                            'archive'.format(attribute))
+                for name in arrays:
+                    self.check_member(name, check_array, problems)
+            return problems
+
+        for option in ('graph', 'motif'):
+            if not self.parser.has_option('graphs', option):
+                continue
+            name = self.parser.get('graphs', option)
+            ext = splitext(name)[1]
+            if ext not in graph_checks:
+                problems.append('{0}: unsupported graph file format '
+                        '{1!r}'.format(name, ext))
+            else:
+                self.check_member(name, graph_checks[ext], problems)
+
+        prefix = 'color/colorings/'
+        colorings = [name for name in names
+                if name.startswith(prefix) and name != prefix]
+        for name in sorted(colorings, key=coloring_step_key):
+            self.check_member(name, check_coloring, problems)
+        for name, check in optional_member_checks:
+            if name in names:
+                self.check_member(name, check, problems)
+        return problems
 
     def load_title_items(self):
         """
@@ -52,23 +169,53 @@ class ConcussDataLoader(DataLoader):
 
         return graph_name, pattern_name, config
 
-    def load_graph(self):
+    def load_vertex_ids(self):
         """
-        Loads graph data from the data loader's archive
-        Graph filename must be specified in visinfo.cfg
-        :returns: graph
+        Number the vertices of the host graph, keeping the densely numbered
+        graph from the same parse for load_graph
+        :returns: VertexIds of the host graph
+        """
+        arrays = self.read_host_graph_arrays()
+        vertex_ids = VertexIds.from_vertices(np.concatenate([arrays.nodes(),
+            arrays.edges().ravel()]))
+        self.host_graph_arrays = dense_host_graph(arrays, vertex_ids)
+        return vertex_ids
+
+    def read_host_graph_arrays(self):
+        """
+        Reads the host graph from the data loader's archive, with the vertex
+        ids used there.  Graph filename must be specified in visinfo.cfg
+        :returns: GraphArrays
         """
         graph_name = self.parser.get('graphs', 'graph')
 
         # Get extension of graph file, which indicates storage format
         graph_ext = splitext( graph_name )[1]
         # Get correct reader for graph's format, based on file extension
-        graph_reader = self.get_graph_reader(graph_ext)
+        arrays_reader = self.get_graph_arrays_reader(graph_ext)
+        with self.open_member(graph_name) as graph_file:
+            return arrays_reader(graph_file)
 
-        # Open graph as file object
-        with self.archive.open(graph_name, 'r') as graph_file:
-            # Use correct reader to get and return NetworkX graph from graph file
-            return graph_reader(graph_file)
+    def load_graph(self):
+        """
+        Loads graph data from the data loader's archive, with its vertices
+        numbered densely
+        :returns: graph, as a NetworkX Graph or a CSRGraph depending on
+                  self.graph_backend
+        """
+        vertex_ids = self.vertex_ids
+        arrays, self.host_graph_arrays = self.host_graph_arrays, None
+        if arrays is None:
+            # The vertex ids came from the cache, with the graph, but the
+            # graph could not be restored after all
+            arrays = dense_host_graph(self.read_host_graph_arrays(),
+                    vertex_ids)
+
+        if self.graph_backend == 'csr':
+            # Go straight from the arrays to a CSRGraph, never building a
+            # NetworkX graph of the whole host graph
+            return arrays.to_csr()
+        return arrays.to_networkx()
 
     def load_pattern(self):
         """
@@ -84,27 +231,19 @@ class ConcussDataLoader(DataLoader):
         graph_reader = self.get_graph_reader(pattern_ext)
 
         # Open graph as file object
-        with self.archive.open(pattern_name, 'r') as pattern_file:
+        with self.open_member(pattern_name) as pattern_file:
             # Use correct reader to get and return NetworkX graph from graph file
             return graph_reader(pattern_file)
 
     def load_counts(self):
         """
         Load counts for the Combine tab
-        Returns:
+        Returns: ColorsetCounts holding the count for each color set
 
         """
         colorset_count_filename = 'combine/counts_per_colorset.txt'
-        counts_per_set = {}
-        with self.archive.open(colorset_count_filename, 'r') as colorset_count_file:
-            for line in colorset_count_file:
-                line = line.strip()
-                set_and_count = line.strip().split(":")
-                colorset = ast.literal_eval(set_and_count[0].strip())
-                count = int(set_and_count[1].strip())
-                counts_per_set[colorset] = count
-
-        return counts_per_set
+        with self.open_member(colorset_count_filename) as colorset_count_file:
+            return read_colorset_counts(colorset_count_file)
 
     def load_big_component(self):
         """
@@ -112,35 +251,36 @@ class ConcussDataLoader(DataLoader):
 
         This component is always in the file count/big_component.txt in
         edgelist format.
-        :returns: graph
+        :returns: graph, with the vertices numbered as in the host graph
         """
         comp_name = 'count/big_component.txt'
 
         # Get extension of graph file, which indicates storage format
         comp_ext = splitext(comp_name)[1]
         # Get correct reader for graph's format, based on file extension
-        graph_reader = self.get_graph_reader(comp_ext)
+        arrays_reader = self.get_graph_arrays_reader(comp_ext)
 
         # Open graph as file object
-        with self.archive.open(comp_name, 'r') as comp_file:
-            # Use correct reader to get and return NetworkX graph from graph file
-            return graph_reader(comp_file)
+        with self.open_member(comp_name) as comp_file:
+            arrays = arrays_reader(comp_file)
+        return arrays.relabel(self.vertex_ids).to_networkx()
 
     def load_tdd(self):
         """
         Reads the treedepth decompostion from the tdd.txt file
 
-        Returns: A graph containing the nodes from the tdd, with each
-                node having an attribute 'parent' that specifies its parent
+        Returns: A graph containing the nodes from the tdd, with an edge
+                from each node to its parent, and the vertices numbered as
+                in the host graph
 
         """
         import networkx as nx
         filename = 'count/tdd.txt'
         tdd = nx.DiGraph()
-        with self.archive.open(filename, 'r') as tdd_file:
-            for line in tdd_file:
-                node, parent = tuple(line.strip().split())
-                tdd.add_edge(int(node), int(parent))
+        with self.open_member(filename) as tdd_file:
+            # Each line is "node parent", as in an edge list
+            edges = read_edgelist_arrays(tdd_file).edges()
+        tdd.add_edges_from(self.vertex_ids.index(edges).tolist())
 
         return tdd
 
@@ -148,277 +288,212 @@ class ConcussDataLoader(DataLoader):
         """
         Loads node color data from the data loader's archive
         coloring files must be under color/colorings/
-        :returns: list of colorings, where each coloring is list of RBG tuples
-        """
-        colorings = []
-        files = self.archive.namelist()
-        files.sort()
-        nodes = 0
-        for f in files:
-            if 'color/colorings/' == f[:16] and 'color/colorings/' != f:
-                coloring = []
-                with self.archive.open(f) as coloring_file:
-                    for line in coloring_file:
-                        line = line.strip()
-                        if ':' not in line:
-                            continue
-                        node, color = line.split(':')
-                        node = int(node)
-                        color = int(color)
-                        while len(coloring) <= node:
-                            coloring.append(0)
-                        coloring[node] = color
+        :returns: ColoringHistory holding the coloring of every step, indexed
+                  by the vertices of the host graph, or for large runs a
+                  LazyColoringHistory which reads each step when needed
+        """
+        vertex_ids = self.vertex_ids
+        prefix = 'color/colorings/'
+        infos = [info for info in self.archive.infolist()
+                if info.filename.startswith(prefix) and
+                info.filename != prefix]
+        # Steps are numbered, so sort them numerically
+        infos.sort(key=lambda info: coloring_step_key(info.filename))
+
+        total_size = sum(info.file_size for info in infos)
+        if (len(infos) > 1 and self.lazy_colorings_size is not None and
+                total_size >= self.lazy_colorings_size):
+            names = [info.filename for info in infos]
+            return LazyColoringHistory(
+                    lambda step: self.read_coloring(names[step]), len(names))
+
+        colorings = ColoringHistory()
+        if (len(infos) > 1 and total_size >= self.parallel_colorings_size and
+                self.archive.filename is not None):
+            args = [(self.archive.filename, info.filename, vertex_ids)
+                    for info in infos]
+            results = parallel_imap(read_coloring_member, args,
+                    self.processes)
+            for info, (coloring, rows) in zip(infos, results):
+                self.report_progress(info.filename, info.file_size,
+                        info.file_size)
+                self.record_member(info.filename, info.compress_size,
+                        info.file_size, rows)
                 colorings.append(coloring)
+        else:
+            for info in infos:
+                with self.open_member(info.filename) as coloring_file:
+                    colorings.append(parse_coloring(coloring_file.read(),
+                        vertex_ids))
+
         if len(colorings) == 0:
-            colorings = [0]
+            colorings.append([0])
         return colorings
 
+    def read_coloring(self, name):
+        """
+        Read the coloring of one step, after loading, for a
+        LazyColoringHistory
+        :param name: name of the coloring member
+        :returns: array of colors indexed by the vertices of the host graph
+        """
+        vertex_ids = self.vertex_ids
+        if self.archive.filename is not None:
+            # Open the archive again, so reading does not get in the way of
+            # other threads reading self.archive
+            return read_coloring_member((self.archive.filename, name,
+                vertex_ids))[0]
+        with self.lock:
+            with self.archive.open(name) as coloring_file:
+                return parse_coloring(coloring_file.read(), vertex_ids)
+
     def load_dp_table(self):
         """
         Read the dynamic programming table provided by CONCUSS
 
-        Returns: $table$ - a dictionary which has the following format:
-        key: tuple of vertices
-        value: a list of lists each of which has the format:
+        Returns: $table$ - a DPTable, which maps each tuple of vertices to
+        a list of lists each of which has the format:
                [count, k_pat_vertices, k_pat_boundary]
                where $count$ is an integer,
                      $k_pat_vertices$ is a list of vertices
                      $k_pat_boundary$ is a dictionary representing pi
                      where pi maps vertices in $k_pat_vertices$ to labels
+        The tuples of vertices are numbered as in the host graph.
         """
-
         dp_table_filename = "count/dp_table.txt"
-        table = {}
-        with self.archive.open(dp_table_filename, 'r') as dp_table_file:
-            line = dp_table_file.readline().strip()
-            # Read until we reach eof
-            while line != "":
-                # Check if we have a new block
-                block = line[-1] == "{"
-                # If we have a block
-                if block:
-                    # Get the vertices
-                    vertex_list = [int(num) for num in line[1: line.find(']')].split(",")]
-                    # Read the first line in the block
-                    block_line = dp_table_file.readline().strip()
-                    # Make a list to store each entry in the block
-                    values = []
-                    # Loop until we reach end of block
-                    while block_line != "}":
-                        # For each line in the block make a list
-                        block_entry = []
-                        # Get the count, k_pat_vertices and boundary from that line
-                        count, k_pat_vertices, k_pat_boundary = tuple(block_line.split(";"))
-                        # Get terms in the boundary
-                        terms = []
-                        for term in k_pat_boundary.strip()[1:-1].split(","):
-                            if term != "":
-                                terms.append(term.strip())
-                        # Make a dictionary that represents pi
-                        pi = {}
-                        # Populate pi
-                        for term in terms:
-                            key_val = term.split(":")
-                            pi[int(key_val[0])] = int(key_val[1])
-                        # Add the count, k_pat_vertices and pi to our list
-                        block_entry.append(int(count))
-                        block_entry.append(ast.literal_eval(k_pat_vertices.strip()))
-                        block_entry.append(pi)
-                        # Add entry to values
-                        values.append(block_entry)
-                        # Go to the next line in the block
-                        block_line = dp_table_file.readline().strip()
-                    # Add $vertex_list$ as key and $values$ as value
-                    table[tuple(vertex_list)] = values
-                # Get the next line in the file
-                line = dp_table_file.readline().strip()
-        # return the DP table
-        return table
+        with self.open_member(dp_table_filename) as dp_table_file:
+            table = read_dp_table(dp_table_file)
+        if self.vertex_ids.identity:
+            return table
+        return table.relabel(self.vertex_ids)
 
     def get_graph_reader(self, ext):
         """
-        Identifies, imports, and returns NetworkX reader for graph file format
+        Identifies and returns NetworkX reader for graph file format
         :param ext: extension of graph file name, indicates data storage format
         :returns: NetworkX graph reader function for the given extension
         """
-        if ext == '.gexf':
-            return read_gexf
-        elif ext == '.graphml':
-            return read_graphml
+        arrays_reader = self.get_graph_arrays_reader(ext)
+        return lambda graph_file: arrays_reader(graph_file).to_networkx()
+
+    def get_graph_arrays_reader(self, ext):
+        """
+        Identifies and returns a reader which puts a graph straight into a
+        GraphArrays, for the graph file format
+        :param ext: extension of graph file name, indicates data storage format
+        :returns: reader function returning a GraphArrays
+        """
+        if ext in ('.gexf', '.graphml'):
+            return read_xml_arrays
         elif ext == '.gml':
-            return read_gml
+            return read_gml_arrays
         elif ext == '.leda':
-            return read_leda
+            return partial(read_leda_arrays,
+                    parallel_size=self.parallel_edges_size,
+                    processes=self.processes)
         elif ext == '.txt':
             # Assuming it's an edgelist
-            return read_edgelist
+            return partial(read_edgelist_arrays,
+                    parallel_size=self.parallel_edges_size,
+                    processes=self.processes)
         else:
             raise Exception('Unsupported graph file format: {0}'.format(ext))
 
-# The following code is from CONCUSS, https://github.com/theoryinpractice/concuss/,
-# Copyright (C) North Carolina State University, 2015. It is licensed under
-# the three-clause BSD license; see LICENSE.
-class multidict(object):
-
-    def __init__(self):
-        self.d = collections.defaultdict(list)
-
-    def __getitem__(self, key):
-        if len(self.d[key]) == 1:
-            return self.d[key][0]
-        return self.d[key]
-
-    def __setitem__(self, key, value):
-        if value is None:
-            self.d[key] = []
-        else:
-            self.d[key].append(value)
-
-    def __iter__(self):
-        return iter(self.d)
-
-    def __contains__(self, key):
-        return key in self.d
-
-    def __repr__(self):
-        return str(self)
-
-    def __len__(self):
-        return len(self.d)
-
-    def __str__(self):
-        res = "{"
-        for key in self:
-            if len(self.d[key]) == 1:
-                res += "{0}: {1}, ".format(key, self.d[key][0])
-            else:
-                res += "{0}: {1}, ".format(key, self.d[key])
-        if len(self) != 0:
-            res = res[:-2]
-        res += "}"
-        return res
-
-def read_gexf(graph_file):
-    from BeautifulSoup import BeautifulSoup as Soup
-    soup = Soup(graph_file.read())
-    graph = Graph()
-
-    for edge in soup.findAll("edge"):
-        source = int(edge['source'])
-        target = int(edge['target'])
-        graph.add_edge(source, target)
-    return graph
-
-def read_graphml(graph_file):
-    from BeautifulSoup import BeautifulSoup as Soup
-    soup = Soup(graph_file.read())
-    graph = Graph()
-
-    for edge in soup.findAll("edge"):
-        source = int(edge['source'])
-        target = int(edge['target'])
-        graph.add_edge(source, target)
+# Functions checking samples of graph files, by extension
+graph_checks = {
+    '.txt': check_edgelist,
+    '.leda': check_leda,
+    '.gml': check_gml,
+    '.gexf': check_xml,
+    '.graphml': check_xml
+}
+
+def dense_host_graph(arrays, vertex_ids):
+    """
+    Number the vertices of the host graph densely
+    :param arrays: GraphArrays of the host graph
+    :param vertex_ids: VertexIds of the host graph
+    :returns: GraphArrays holding every vertex in order, even those with no
+              edges, and the edges between their indices
+    """
+    graph = GraphArrays()
+    graph.add_nodes(np.arange(len(vertex_ids)))
+    graph.add_edges(vertex_ids.index(arrays.edges()))
     return graph
-    
-def read_gml(graph_file):
-    graph = Graph()
 
-    data = read_gml_data(graph_file)
-    for n in data['graph']['node']:
-        graph.add_node(int(n['id']))
-
-    for e in data['graph']['edge']:
-        graph.add_edge(int(e['source']), int(e['target']))
-
-    return graph
-    
-def read_leda(graph_file):
-    graph = Graph()
-
-    numVertices = 10**10
-    lines = graph_file
-
-    # Skip preable
-    skip_lines(lines, 4)
-    numVertices = int(next(lines))
-
-    # We do not need vertex labels
-    skip_lines(lines, numVertices)
-
-    numEdges = int(next(lines))
-
-    for line in lines:
-        line = line.strip()
-        if line == '' or line[0] == '#':
-            continue
-        s, t, r, l = line.split(' ')
-        graph.add_edge(int(s)-1, int(t)-1)  # LEDA is 1-based.
-
-    return graph
-    
-def read_edgelist(graph_file):
-    graph = Graph()
-    for line in graph_file:
-        line = line.strip()
-        if line[0] == '#':
-            continue
-        source, target = line.split()
-        s = int(source)
-        t = int(target)
-
-        graph.add_edge(s, t)
-
-    return graph
-
-def read_gml_data(graph_file):
-    stream = []
-    for l in graph_file:
-        l = l.strip()
-        if len(l) == 0:
-            continue
-        fields = l.split(" ")
-        token = lambda: None  # Inline object
-        token.name = None
-        if len(fields) == 1 or (len(fields) == 2 and fields[1] == '['):
-            v = fields[0]
-            if v == "[":
-                token.type = "BLOCK_START"
-            elif v == "]":
-                token.type = "BLOCK_END"
-            else:
-                token.type = "BLOCK_NAME"
-                token.name = v
-        else:
-            token.type = "FIELD"
-            token.name = fields[0]
-            token.value = "".join(fields[1:])
-        stream.append(token)
-
-    data = multidict()
-    data[0] = 0
-    stack = [data]
-    del data.d[0]
-    for token in stream:
-        current = stack[-1]
-        if token.type == "BLOCK_NAME":
-            # Start new data block
-            block = multidict()
-            block[0] = 0
-            label = token.name
-            current[label] = block
-            stack.append(block)
-            del block.d[0]
-        elif token.type == "BLOCK_START":
-            pass
-        elif token.type == "BLOCK_END":
-            stack.pop()
-        elif token.type == "FIELD":
-            current[token.name] = token.value
-    return data
-
-def skip_lines(fileit, num):
-    skipped = 0
-    while skipped < num:
-        line = next(fileit).strip()
-        if line != '' and line[0] != '#':
-            skipped += 1
+def coloring_step_key(name):
+    """
+    Sort key for coloring members, which are named after their step number
+    """
+    step = basename(name)
+    if step.isdigit():
+        return (0, int(step), step)
+    return (1, 0, step)
+
+def read_coloring_member(args):
+    """
+    Read and parse one coloring member of an archive, for use in a worker
+    process
+    :param args: tuple of the archive's filename, the member's name and the
+                 VertexIds of the host graph
+    :returns: tuple of the coloring array, as returned by parse_coloring,
+              and the number of lines parsed
+    """
+    filename, name, vertex_ids = args
+    with open_archive(filename) as archive:
+        data = read_member(archive, name)
+    return parse_coloring(data, vertex_ids), data.count('\n')
+
+def parse_coloring_pairs(data):
+    """
+    Parse the "node: color" lines of a coloring file
+    :param data: string of whole lines
+    :returns: n by 2 array of the nodes and their colors
+    """
+    pairs = np.fromstring(data.replace(':', ' '), dtype=np.int64, sep=' ')
+    if len(pairs) != 2 * data.count(':'):
+        # Some lines are not "node: color" lines, so drop those first
+        lines = [line for line in data.splitlines() if ':' in line]
+        pairs = np.fromstring(' '.join(lines).replace(':', ' '),
+                dtype=np.int64, sep=' ')
+        if len(pairs) != 2 * len(lines):
+            raise ValueError('Malformed coloring file')
+    return pairs.reshape(-1, 2)
+
+def parse_coloring(data, vertex_ids=None):
+    """
+    Parse the contents of a coloring file, made of "node: color" lines
+    :param data: string holding the whole file
+    :param vertex_ids: VertexIds of the host graph, or None to index the
+                       colors by the vertex ids in the file
+    :returns: array of colors indexed by node, where uncolored nodes get 0;
+              with vertex_ids, colors of vertices which are not in the host
+              graph are left out
+    """
+    pairs = parse_coloring_pairs(data)
+    if vertex_ids is not None:
+        pairs = pairs[vertex_ids.contains(pairs[:, 0])]
+        coloring = np.zeros(len(vertex_ids), dtype=np.int32)
+        coloring[vertex_ids.index(pairs[:, 0])] = pairs[:, 1]
+        return coloring
+    if len(pairs) == 0:
+        return np.zeros(0, dtype=np.int32)
+    coloring = np.zeros(pairs[:, 0].max() + 1, dtype=np.int32)
+    coloring[pairs[:, 0]] = pairs[:, 1]
+    return coloring
+
+def check_coloring(head, tail, whole):
+    """
+    Check samples of a coloring member, as taken by
+    beavr.archive.sample_member
+    :raises ValueError: if they are malformed
+    """
+    check_samples(parse_coloring_pairs, head, tail, whole)
+
+# Functions checking samples of the members of the count and combine stages
+optional_member_checks = [
+    ('count/big_component.txt', check_edgelist),
+    ('count/tdd.txt', check_edgelist),
+    ('count/dp_table.txt', check_dp_table),
+    ('combine/counts_per_colorset.txt', check_colorset_counts)
+]
@@ -0,0 +1,407 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+from io import BytesIO
+from string import maketrans
+
+import numpy as np
+from beavr.archive import check_samples
+
+# The DP table written by CONCUSS is made of blocks like
+#
+#   [30, 1550] {
+#       20; [0, 1, 2, 3]; []
+#       4; [0, 1]; [1:0]
+#   }
+#
+# The parser below turns whole chunks of the file into a single array of
+# integers by replacing its punctuation with these (negative) marker tokens,
+# then finds the blocks and rows with array operations instead of parsing the
+# file line by line.
+OPEN = -1
+CLOSE = -2
+BLOCK_START = -3
+BLOCK_END = -4
+
+# Separators within rows are only there for humans
+_separators = maketrans(';,:', '   ')
+
+
+class DPTableChunk(object):
+    """
+    Complete blocks of a DP table, parsed from one chunk of the file
+
+    Attributes:
+        keys -- list of vertex tuples heading each block
+        block_starts -- array giving the index of each block's first row,
+                        followed by the total number of rows
+        counts -- array of the count of each row
+        vertex_offsets -- array of offsets into pattern_vertices where the
+                          k-pattern vertices of each row start, followed by
+                          len(pattern_vertices)
+        pattern_vertices -- array of the k-pattern vertices of all rows
+        boundary_offsets -- array of offsets into boundary where the
+                            boundary of each row starts, followed by
+                            len(boundary)
+        boundary -- array of (pattern vertex, label) rows for all rows
+    """
+
+    def __init__(self, keys, block_starts, counts, vertex_offsets,
+            pattern_vertices, boundary_offsets, boundary):
+        self.keys = keys
+        self.block_starts = block_starts
+        self.counts = counts
+        self.vertex_offsets = vertex_offsets
+        self.pattern_vertices = pattern_vertices
+        self.boundary_offsets = boundary_offsets
+        self.boundary = boundary
+
+
+def iter_dp_table_chunks(table_file, chunk_size=1 << 22):
+    """
+    Parse a DP table file a chunk at a time
+    :param table_file: file object for the DP table
+    :param chunk_size: number of bytes to read at once
+    :returns: generator of DPTableChunks
+    """
+    pending = ''
+    while True:
+        data = table_file.read(chunk_size)
+        if not data:
+            break
+        pending += data
+        # Only parse up to the end of the last complete block
+        end = pending.rfind('}')
+        if end == -1:
+            continue
+        complete, pending = pending[:end + 1], pending[end + 1:]
+        yield parse_dp_table_chunk(complete)
+
+    if pending.strip():
+        raise ValueError('DP table ends in the middle of a block')
+
+
+def parse_dp_table_chunk(data):
+    """
+    Parse a string holding complete blocks of a DP table
+    :param data: the string to parse
+    :returns: DPTableChunk holding the parsed blocks
+    """
+    text = data.translate(_separators)
+    text = text.replace('[', ' -1 ').replace(']', ' -2 ')
+    text = text.replace('{', ' -3 ').replace('}', ' -4 ')
+    tokens = np.fromstring(text, dtype=np.int64, sep=' ')
+
+    # fromstring stops quietly at anything that is not a number, so make sure
+    # it got to the end
+    block_ends = np.flatnonzero(tokens == BLOCK_END)
+    if (len(block_ends) != data.count('}') or len(tokens) == 0 or
+            tokens[-1] != BLOCK_END):
+        raise ValueError('Malformed DP table')
+
+    # Find the bracketed lists, which must not be nested
+    opens = np.flatnonzero(tokens == OPEN)
+    closes = np.flatnonzero(tokens == CLOSE)
+    if (len(opens) != len(closes) or np.any(closes < opens) or
+            np.any(opens[1:] < closes[:-1])):
+        raise ValueError('Malformed DP table: unbalanced brackets')
+
+    # A list followed by a block start is the key of a block; the others
+    # come in pairs of k-pattern vertices and k-pattern boundary
+    is_key = tokens[closes + 1] == BLOCK_START
+    key_lists = np.flatnonzero(is_key)
+    row_lists = np.flatnonzero(~is_key)
+    vertex_lists = row_lists[0::2]
+    boundary_lists = row_lists[1::2]
+    if (len(vertex_lists) != len(boundary_lists) or
+            np.any(opens[boundary_lists] != closes[vertex_lists] + 1) or
+            len(key_lists) != len(block_ends)):
+        raise ValueError('Malformed DP table: bad row')
+
+    # Every row starts with its count
+    counts = tokens[opens[vertex_lists] - 1]
+    if np.any(counts < 0):
+        raise ValueError('Malformed DP table: missing count')
+
+    # Rows belong to the block whose key comes before them
+    key_positions = opens[key_lists]
+    block_starts = np.searchsorted(opens[vertex_lists], key_positions)
+    block_starts = np.append(block_starts, len(vertex_lists))
+    if len(block_starts) and block_starts[0] != 0:
+        raise ValueError('Malformed DP table: row outside of a block')
+
+    keys = [tuple(tokens[opens[l] + 1:closes[l]].tolist()) for l in key_lists]
+
+    vertex_offsets, pattern_vertices = _list_contents(tokens, opens, closes,
+            vertex_lists)
+    boundary_offsets, boundary = _list_contents(tokens, opens, closes,
+            boundary_lists)
+    if len(boundary) % 2 or np.any(boundary_offsets % 2):
+        raise ValueError('Malformed DP table: bad boundary')
+
+    return DPTableChunk(keys, block_starts, counts, vertex_offsets,
+            pattern_vertices, boundary_offsets // 2, boundary.reshape(-1, 2))
+
+
+def _list_contents(tokens, opens, closes, lists):
+    """
+    Get the contents of some of the bracketed lists in a token array
+    :returns: array of offsets where each list starts, followed by the total
+              length, and array of the concatenated contents of the lists
+    """
+    lengths = closes[lists] - opens[lists] - 1
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    # Mark the tokens inside the lists, then pick them out
+    inside = np.zeros(len(tokens), dtype=np.int8)
+    inside[opens[lists] + 1] += 1
+    inside[closes[lists]] -= 1
+    inside = np.cumsum(inside, dtype=np.int8) > 0
+    return offsets, tokens[inside]
+
+
+class DPTable(object):
+    """
+    The dynamic programming table written by CONCUSS, stored by column
+
+    Logically, the table maps each tuple of vertices from the treedepth
+    decomposition to a list of rows [count, k_pat_vertices, k_pat_boundary],
+    where count is an integer, k_pat_vertices is a list of pattern vertices
+    and k_pat_boundary is a dictionary representing pi, which maps vertices
+    in k_pat_vertices to labels.  table[vertices] builds these rows on demand.
+
+    Internally, each row is a count, a bitmask of its k-pattern vertices and
+    an offset into one packed array of (pattern vertex, label) boundary
+    pairs.  The rows of each block are contiguous, and the index maps each
+    vertex tuple to its block, whose rows are block_starts[block] up to
+    block_starts[block + 1].
+    """
+
+    def __init__(self, block_keys, block_starts, counts, vertex_masks,
+            boundary_offsets, boundary):
+        self.block_keys = block_keys
+        self.index = dict((key, block) for block, key in enumerate(block_keys))
+        self.block_starts = block_starts
+        self.counts = counts
+        self.vertex_masks = vertex_masks
+        self.boundary_offsets = boundary_offsets
+        self.boundary = boundary
+
+        # The same few k-patterns appear over and over, so only build the
+        # lists and dictionaries for each of them once
+        self._vertex_lists = {}
+        self._boundaries = {}
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """
+        Create a DPTable from parsed chunks of a DP table file
+        :param chunks: iterable of DPTableChunks
+        :returns: DPTable holding the rows of all the chunks
+        """
+        block_keys = []
+        block_starts = []
+        counts = []
+        vertex_masks = []
+        boundary_offsets = []
+        boundary = []
+        rows = 0
+        pairs = 0
+        for chunk in chunks:
+            block_keys.extend(chunk.keys)
+            block_starts.append(chunk.block_starts[:-1] + rows)
+            counts.append(chunk.counts)
+            vertex_masks.append(vertex_bitmasks(chunk.vertex_offsets,
+                chunk.pattern_vertices))
+            boundary_offsets.append(chunk.boundary_offsets[:-1] + pairs)
+            boundary.append(chunk.boundary)
+            rows += len(chunk.counts)
+            pairs += len(chunk.boundary)
+        block_starts.append([rows])
+        boundary_offsets.append([pairs])
+
+        offset_type = np.int32 if max(rows, pairs) < 2 ** 31 else np.int64
+        boundary = np.concatenate(boundary or [np.zeros((0, 2))])
+        if len(boundary) and boundary.max() >= 2 ** 15:
+            raise ValueError('DP table boundary too large')
+        return cls(block_keys,
+                np.concatenate(block_starts).astype(offset_type),
+                np.concatenate(counts or [[]]).astype(np.int64),
+                np.concatenate(vertex_masks or [[]]).astype(np.uint64),
+                np.concatenate(boundary_offsets).astype(offset_type),
+                boundary.astype(np.int16))
+
+    def to_arrays(self):
+        """
+        Represent the table as a dictionary of arrays, for storage
+        :returns: dictionary of arrays by name
+        """
+        key_offsets, key_vertices = self.key_arrays()
+        return {
+            'key_offsets': key_offsets,
+            'key_vertices': key_vertices,
+            'block_starts': self.block_starts,
+            'counts': self.counts,
+            'vertex_masks': self.vertex_masks,
+            'boundary_offsets': self.boundary_offsets,
+            'boundary': self.boundary
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Create a table from the arrays made by to_arrays.  The table refers
+        to the arrays rather than copying them.
+        :param arrays: dictionary of arrays by name
+        :returns: DPTable
+        """
+        block_keys = split_keys(arrays['key_offsets'].tolist(),
+                arrays['key_vertices'].tolist())
+        return cls(block_keys, arrays['block_starts'], arrays['counts'],
+                arrays['vertex_masks'], arrays['boundary_offsets'],
+                arrays['boundary'])
+
+    def key_arrays(self):
+        """
+        Pack the vertex tuples heading the blocks into arrays
+        :returns: tuple of an array of offsets where each tuple starts,
+                  followed by the total number of vertices, and an array of
+                  the concatenated tuples
+        """
+        key_offsets = np.zeros(len(self.block_keys) + 1, dtype=np.int64)
+        np.cumsum([len(key) for key in self.block_keys], out=key_offsets[1:])
+        key_vertices = np.fromiter((v for key in self.block_keys for v in key),
+                dtype=np.int64, count=key_offsets[-1])
+        return key_offsets, key_vertices
+
+    def relabel(self, vertex_ids):
+        """
+        Number the vertices of the block keys densely
+        :param vertex_ids: VertexIds holding every vertex of the keys
+        :returns: DPTable sharing this table's rows, with each vertex of the
+                  keys replaced by its index
+        """
+        key_offsets, key_vertices = self.key_arrays()
+        return DPTable(split_keys(key_offsets.tolist(),
+                    vertex_ids.index(key_vertices).tolist()),
+                self.block_starts, self.counts, self.vertex_masks,
+                self.boundary_offsets, self.boundary)
+
+    def keys(self):
+        """Get the vertex tuples heading the blocks of the table"""
+        return list(self.block_keys)
+
+    def __len__(self):
+        return len(self.block_keys)
+
+    def __iter__(self):
+        return iter(self.block_keys)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def row_range(self, key):
+        """
+        Get the rows of the block for a tuple of vertices
+        :returns: tuple of the first row and one past the last row
+        """
+        block = self.index[key]
+        return self.block_starts[block], self.block_starts[block + 1]
+
+    def __getitem__(self, key):
+        """
+        Build the rows of the block for a tuple of vertices
+        Rows with the same k-pattern share their vertex list and boundary
+        dictionary, so these must not be modified.
+        :returns: list of [count, k_pat_vertices, k_pat_boundary] rows
+        """
+        start, stop = self.row_range(key)
+        return [[count, self._vertex_list(mask), self._boundary(row)]
+                for row, count, mask in zip(range(start, stop),
+                    self.counts[start:stop].tolist(),
+                    self.vertex_masks[start:stop].tolist())]
+
+    def _vertex_list(self, mask):
+        """Get the list of pattern vertices in a bitmask"""
+        try:
+            return self._vertex_lists[mask]
+        except KeyError:
+            vertices = [v for v in range(64) if mask >> v & 1]
+            self._vertex_lists[mask] = vertices
+            return vertices
+
+    def _boundary(self, row):
+        """Get the boundary dictionary of a row"""
+        pairs = self.boundary[self.boundary_offsets[row]:
+                self.boundary_offsets[row + 1]]
+        pairs_key = pairs.tostring()
+        try:
+            return self._boundaries[pairs_key]
+        except KeyError:
+            pi = dict(pairs.tolist())
+            self._boundaries[pairs_key] = pi
+            return pi
+
+    def nbytes(self):
+        """Number of bytes used by the arrays holding the rows"""
+        return (self.block_starts.nbytes + self.counts.nbytes +
+                self.vertex_masks.nbytes + self.boundary_offsets.nbytes +
+                self.boundary.nbytes)
+
+
+def split_keys(key_offsets, key_vertices):
+    """Split a list of concatenated vertex tuples at the given offsets"""
+    return [tuple(key_vertices[start:stop])
+            for start, stop in zip(key_offsets[:-1], key_offsets[1:])]
+
+
+def vertex_bitmasks(offsets, vertices):
+    """
+    Turn lists of distinct pattern vertices into bitmasks
+    :param offsets: array of offsets where each list starts in vertices,
+                    followed by len(vertices)
+    :param vertices: array of the concatenated lists
+    :returns: array of one bitmask for each list
+    """
+    if len(vertices) and (vertices.min() < 0 or vertices.max() >= 64):
+        raise ValueError('Pattern vertices must be between 0 and 63')
+    bits = np.left_shift(np.uint64(1), vertices.astype(np.uint64))
+    # The vertices of a list are distinct, so the sum of their bits is the
+    # same as their bitwise or
+    sums = np.zeros(len(bits) + 1, dtype=np.uint64)
+    np.cumsum(bits, out=sums[1:])
+    return sums[offsets[1:]] - sums[offsets[:-1]]
+
+
+def read_dp_table(table_file, chunk_size=1 << 22):
+    """
+    Read the dynamic programming table written by CONCUSS
+    :param table_file: file object for the DP table
+    :param chunk_size: number of bytes to read at once
+    :returns: DPTable
+    """
+    return DPTable.from_chunks(iter_dp_table_chunks(table_file, chunk_size))
+
+
+def check_dp_table(head, tail, whole):
+    """
+    Check samples of a DP table, as taken by beavr.archive.sample_member
+    :param head: first bytes of the table
+    :param tail: last bytes of the table, or None
+    :param whole: whether head is the whole table
+    :raises ValueError: if they are malformed
+    """
+    if whole:
+        read_dp_table(BytesIO(head))
+        return
+    if tail is not None and not tail.rstrip().endswith('}'):
+        raise ValueError('DP table ends in the middle of a block')
+    # Only whole blocks are parsed: blocks end with "}", and only their keys
+    # start a line with "["
+    block_start = lambda tail: tail.find('\n[') + 1 or len(tail)
+    check_samples(parse_dp_table_chunk, head, tail, False,
+            head_end=lambda head: head.rfind('}') + 1, tail_start=block_start)
@@ -0,0 +1,474 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+"""
+Readers for the graph file formats CONCUSS accepts
+
+Each reader streams through its file once, putting vertices and edges
+straight into a GraphArrays as they are found, so reading takes little memory
+beyond the arrays themselves.  The GraphArrays then becomes either a NetworkX
+graph or a CSRGraph.
+
+Edge lists and the edge sections of LEDA files are parsed a chunk at a time
+into integer arrays, and large ones can be parsed in worker processes.
+
+The check functions look at samples of the start and end of a file instead,
+so that malformed files are found before any of them is read.
+"""
+
+import re
+from array import array
+from io import BytesIO
+from multiprocessing import cpu_count
+from xml.etree.cElementTree import XMLParser, ParseError
+
+import numpy as np
+import networkx as nx
+
+from beavr.archive import check_samples, line_end, line_start
+from beavr.csrgraph import CSRGraph
+from beavr.util import iter_line_chunks, parallel_imap
+
+
+class GraphArrays(object):
+    """
+    Vertices and edges of a graph, gathered into compact arrays as they are
+    read.  Vertices of edges do not need to be added separately.
+    """
+
+    def __init__(self):
+        # Vertices and edges added one at a time
+        self.node_buffer = array('l')
+        self.edge_buffer = array('l')
+        # Arrays of vertices and edges added in bulk
+        self.node_chunks = []
+        self.edge_chunks = []
+
+    @classmethod
+    def from_networkx(cls, graph):
+        """Gather the vertices and edges of a NetworkX graph"""
+        arrays = cls()
+        arrays.add_nodes(graph.nodes())
+        arrays.add_edges(graph.edges())
+        return arrays
+
+    def add_node(self, vertex):
+        self.node_buffer.append(vertex)
+
+    def add_edge(self, source, target):
+        self.edge_buffer.append(source)
+        self.edge_buffer.append(target)
+
+    def add_nodes(self, vertices):
+        """Add a sequence or array of vertices"""
+        self.node_chunks.append(np.asarray(vertices, dtype=np.int64).ravel())
+
+    def add_edges(self, edges):
+        """Add a sequence of pairs of vertices, or an n by 2 array"""
+        self.edge_chunks.append(
+                np.asarray(edges, dtype=np.int64).reshape(-1, 2))
+
+    def nodes(self):
+        """Return an array of the vertices added"""
+        return np.concatenate(self.node_chunks +
+                [np.array(self.node_buffer, dtype=np.int64)])
+
+    def edges(self):
+        """Return an n by 2 array of the edges added"""
+        return np.concatenate(self.edge_chunks +
+                [np.array(self.edge_buffer, dtype=np.int64).reshape(-1, 2)])
+
+    def relabel(self, vertex_ids):
+        """
+        Number the vertices densely
+        :param vertex_ids: VertexIds holding every vertex of the graph
+        :returns: GraphArrays with each vertex replaced by its index
+        """
+        graph = GraphArrays()
+        graph.add_nodes(vertex_ids.index(self.nodes()))
+        graph.add_edges(vertex_ids.index(self.edges()))
+        return graph
+
+    def to_networkx(self):
+        """Create a NetworkX graph with one bulk insert of each kind"""
+        graph = nx.Graph()
+        graph.add_nodes_from(self.nodes().tolist())
+        graph.add_edges_from(self.edges().tolist())
+        return graph
+
+    def to_csr(self):
+        """Create a CSRGraph, without ever building a NetworkX graph"""
+        return CSRGraph.from_edges(self.nodes(), self.edges())
+
+
+# A GML token: a bracket, a quoted string, or a key or number
+_gml_token = re.compile(r'\[|\]|"[^"]*"|[^\s\[\]"]+')
+
+
+def iter_gml_tokens(graph_file, chunk_size=1 << 20):
+    """
+    Split a GML file into tokens, a chunk at a time
+    :param graph_file: file object for the GML file
+    :param chunk_size: number of bytes to read at once
+    :returns: iterator over lists of tokens
+    """
+    remainder = ''
+    while True:
+        data = graph_file.read(chunk_size)
+        if not data:
+            break
+        data = remainder + data
+        # Only split up to the end of a line, and not in the middle of a
+        # string, so no token is cut in two
+        end = data.rfind('\n') + 1
+        while end > 0 and data.count('"', 0, end) % 2 == 1:
+            end = data.rfind('\n', 0, end - 1) + 1
+        remainder = data[end:]
+        yield _gml_token.findall(data, 0, end)
+
+    if remainder.count('"') % 2 == 1:
+        raise ValueError('Unterminated string in GML file')
+    yield _gml_token.findall(remainder)
+
+
+def read_gml_arrays(graph_file, chunk_size=1 << 20):
+    """
+    Read the vertices and edges of a GML graph in a single pass, keeping only
+    the current chunk of the file and the enclosing blocks in memory
+    :param graph_file: file object for the GML file
+    :param chunk_size: number of bytes to read at once
+    :returns: GraphArrays
+    """
+    graph = GraphArrays()
+    # Names of the blocks enclosing the current token
+    path = []
+    # Key whose value is the next token, if any
+    key = None
+    # Whether we are directly inside a graph's node or edge block, and the
+    # fields of that block we need
+    in_element = False
+    fields = {}
+
+    for tokens in iter_gml_tokens(graph_file, chunk_size):
+        for token in tokens:
+            if token == '[':
+                if key is None:
+                    raise ValueError('GML block without a name')
+                path.append(key)
+                key = None
+                in_element = is_element(path)
+                if in_element:
+                    fields = {}
+            elif token == ']':
+                if key is not None or not path:
+                    raise ValueError('Unexpected "]" in GML file')
+                if in_element:
+                    try:
+                        if path[1] == 'node':
+                            graph.add_node(int(fields['id']))
+                        else:
+                            graph.add_edge(int(fields['source']),
+                                    int(fields['target']))
+                    except KeyError as e:
+                        raise ValueError('GML {0} without {1}'.format(
+                            path[1], e.args[0]))
+                path.pop()
+                in_element = is_element(path)
+            elif key is None:
+                key = token
+            else:
+                if in_element:
+                    fields[key] = token
+                key = None
+
+    if path or key is not None:
+        raise ValueError('Unexpected end of GML file')
+    return graph
+
+
+def is_element(path):
+    """Whether a path of GML block names leads to a graph's node or edge"""
+    return len(path) == 2 and path[0] == 'graph' and path[1] in ('node', 'edge')
+
+
+def read_gml(graph_file):
+    """Read a GML graph into a NetworkX graph"""
+    return read_gml_arrays(graph_file).to_networkx()
+
+
+class XMLEdgeTarget(object):
+    """
+    Parser target which puts the edges of a GEXF or GraphML file into a
+    GraphArrays.  No element tree is built, so memory use does not grow with
+    the size of the file.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def start(self, tag, attrib):
+        # Tags include the namespace, as in "{namespace}edge"
+        if tag.rpartition('}')[2] == 'edge':
+            try:
+                self.graph.add_edge(int(attrib['source']),
+                        int(attrib['target']))
+            except KeyError as e:
+                raise ValueError('Edge without a {0}'.format(e.args[0]))
+
+    def end(self, tag):
+        pass
+
+    def data(self, data):
+        pass
+
+    def close(self):
+        return self.graph
+
+
+def read_xml_arrays(graph_file, chunk_size=1 << 16):
+    """
+    Read the edges of a GEXF or GraphML graph, a chunk at a time
+    :param graph_file: file object for the XML file
+    :param chunk_size: number of bytes to read at once
+    :returns: GraphArrays
+    """
+    parser = XMLParser(target=XMLEdgeTarget(GraphArrays()))
+    try:
+        while True:
+            data = graph_file.read(chunk_size)
+            if not data:
+                break
+            parser.feed(data)
+        return parser.close()
+    except ParseError as e:
+        raise ValueError('Malformed XML graph file: {0}'.format(e))
+
+
+def read_gexf(graph_file):
+    """Read a GEXF graph into a NetworkX graph"""
+    return read_xml_arrays(graph_file).to_networkx()
+
+
+def read_graphml(graph_file):
+    """Read a GraphML graph into a NetworkX graph"""
+    return read_xml_arrays(graph_file).to_networkx()
+
+
+# The label at the end of a LEDA edge line, as in "1 2 0 |{label}|"
+_leda_label = re.compile(r'\|[^\n]*')
+
+
+def parse_edge_chunk(data, columns=2):
+    """
+    Parse whole lines of an edge list, skipping blank lines and # comments
+    :param data: string of whole lines, each starting with the source and
+                 target of an edge
+    :param columns: number of integers on each line
+    :returns: n by 2 int64 array of the sources and targets
+    """
+    tokens = np.fromstring(data, dtype=np.int64, sep=' ')
+    lines = data.count('\n') + (not data.endswith('\n'))
+    # np.fromstring stops quietly at anything it cannot parse, so make sure
+    # every line was read
+    if len(tokens) != columns * lines:
+        # Some lines are blank or comments, so drop those first
+        lines = [line for line in data.splitlines()
+                if line.strip() and line.lstrip()[0] != '#']
+        tokens = np.fromstring(' '.join(lines), dtype=np.int64, sep=' ')
+        if len(tokens) != columns * len(lines):
+            raise ValueError('Malformed edge list')
+    return tokens.reshape(-1, columns)[:, :2]
+
+
+def parse_edge_chunk_args(args):
+    """parse_edge_chunk taking a tuple of its arguments, for worker processes"""
+    return parse_edge_chunk(*args)
+
+
+def read_edge_arrays(graph, graph_file, columns=2, offset=0,
+        parallel_size=None, processes=None, chunk_size=1 << 22):
+    """
+    Read the rest of a file of edges, one per line, into a GraphArrays
+    :param graph: GraphArrays to add the edges to
+    :param graph_file: file object, positioned at the first edge
+    :param columns: number of integers on each line, of which the first two
+                    are the source and target
+    :param offset: number subtracted from each vertex
+    :param parallel_size: size in bytes from which files are parsed by worker
+                          processes, or None to always parse them here.  The
+                          size is taken from graph_file.size, if it has one.
+    :param processes: number of worker processes, or None for one per CPU
+    :param chunk_size: number of bytes to read at once
+    :returns: graph
+    """
+    if columns == 2:
+        chunks = iter_line_chunks(graph_file, chunk_size)
+    else:
+        chunks = (_leda_label.sub('', chunk)
+                for chunk in iter_line_chunks(graph_file, chunk_size))
+
+    size = getattr(graph_file, 'size', None)
+    if parallel_size is not None and size is not None and size >= parallel_size:
+        # Chunks are read here and parsed by the workers, with only a few
+        # waiting at a time so the file is never all in memory at once
+        processes = processes or cpu_count()
+        edge_chunks = parallel_imap(parse_edge_chunk_args,
+                ((chunk, columns) for chunk in chunks), processes,
+                max_pending=2 * processes)
+    else:
+        edge_chunks = (parse_edge_chunk(chunk, columns) for chunk in chunks)
+
+    for edges in edge_chunks:
+        if offset:
+            edges -= offset
+        graph.add_edges(edges)
+    return graph
+
+
+def read_edgelist_arrays(graph_file, parallel_size=None, processes=None,
+        chunk_size=1 << 22):
+    """
+    Read an edge list, with a "source target" line for each edge
+    :param graph_file: file object for the edge list
+    :param parallel_size: see read_edge_arrays
+    :param processes: see read_edge_arrays
+    :param chunk_size: number of bytes to read at once
+    :returns: GraphArrays
+    """
+    return read_edge_arrays(GraphArrays(), graph_file,
+            parallel_size=parallel_size, processes=processes,
+            chunk_size=chunk_size)
+
+
+def read_edgelist(graph_file):
+    """Read an edge list into a NetworkX graph"""
+    return read_edgelist_arrays(graph_file).to_networkx()
+
+
+def read_leda_arrays(graph_file, parallel_size=None, processes=None,
+        chunk_size=1 << 22):
+    """
+    Read the edges of a graph in LEDA format.  Vertices are numbered from 1 in
+    the file and from 0 in the graph.
+    :param graph_file: file object for the LEDA file
+    :param parallel_size: see read_edge_arrays
+    :param processes: see read_edge_arrays
+    :param chunk_size: number of bytes to read at once
+    :returns: GraphArrays
+    """
+    # Skip the preamble, then the vertex labels, which we do not need
+    skip_leda_lines(graph_file, 4)
+    skip_leda_lines(graph_file, int(next_leda_line(graph_file)))
+    # The number of edges; the edges themselves take up the rest of the file
+    next_leda_line(graph_file)
+    return read_edge_arrays(GraphArrays(), graph_file, columns=3, offset=1,
+            parallel_size=parallel_size, processes=processes,
+            chunk_size=chunk_size)
+
+
+def read_leda(graph_file):
+    """Read a LEDA graph into a NetworkX graph"""
+    return read_leda_arrays(graph_file).to_networkx()
+
+
+def next_leda_line(graph_file):
+    """
+    Read the next line of a LEDA file which is not blank or a comment.  Lines
+    are read one by one so the rest of the file can still be read in chunks.
+    """
+    while True:
+        line = graph_file.readline()
+        if not line:
+            raise ValueError('Unexpected end of LEDA file')
+        line = line.strip()
+        if line != '' and line[0] != '#':
+            return line
+
+
+def skip_leda_lines(graph_file, num):
+    """Skip num lines of a LEDA file which are not blank or comments"""
+    for _ in xrange(num):
+        next_leda_line(graph_file)
+
+
+def check_edgelist(head, tail, whole):
+    """
+    Check samples of an edge list, as taken by beavr.archive.sample_member
+    :param head: first bytes of the file
+    :param tail: last bytes of the file, or None
+    :param whole: whether head is the whole file
+    :raises ValueError: if they are malformed
+    """
+    check_samples(parse_edge_chunk, head, tail, whole)
+
+
+def check_leda(head, tail, whole):
+    """
+    Check samples of a LEDA file: the preamble, and the edges if the sample
+    of the start of the file reaches them
+    :raises ValueError: if they are malformed
+    """
+    end = len(head) if whole else line_end(head)
+    lines = [line.strip() for line in head[:end].split('\n')]
+    lines = [line for line in lines if line != '' and line[0] != '#']
+    if not lines or lines[0] != 'LEDA.GRAPH':
+        raise ValueError('LEDA file does not start with LEDA.GRAPH')
+    if whole:
+        read_leda_arrays(BytesIO(head))
+        return
+    if len(lines) < 5:
+        return
+
+    # The preamble and the number of vertices are followed by a label for
+    # each vertex, then the number of edges and the edges
+    try:
+        edges_start = 6 + int(lines[4])
+    except ValueError:
+        raise ValueError('Malformed LEDA vertex count')
+    if len(lines) <= edges_start:
+        # The labels go on past the sample, so the end of the file may be
+        # labels too
+        return
+    check_samples(lambda data: parse_edge_chunk(_leda_label.sub('', data), 3),
+            '\n'.join(lines[edges_start:]) + '\n', tail, False)
+
+
+def check_gml(head, tail, whole):
+    """
+    Check samples of a GML file: its first block must be a graph, and it
+    must end by closing a block
+    :raises ValueError: if they are malformed
+    """
+    if whole:
+        read_gml_arrays(BytesIO(head))
+        return
+    # The first block, once the sample reaches it, must be the graph
+    tokens = _gml_token.findall(head[:line_end(head)])
+    first_block = tokens.index('[') if '[' in tokens else None
+    if first_block is not None and tokens[first_block - 1:first_block] != \
+            ['graph']:
+        raise ValueError('GML file does not start with a graph')
+    if tail is not None and \
+            _gml_token.findall(tail[line_start(tail):])[-1:] != [']']:
+        raise ValueError('GML file does not end with "]"')
+
+
+def check_xml(head, tail, whole):
+    """
+    Check samples of a GEXF or GraphML file: its start must parse, and it
+    must end with a tag
+    :raises ValueError: if they are malformed
+    """
+    if whole:
+        read_xml_arrays(BytesIO(head))
+        return
+    parser = XMLParser(target=XMLEdgeTarget(GraphArrays()))
+    try:
+        parser.feed(head)
+    except ParseError as e:
+        raise ValueError('Malformed XML graph file: {0}'.format(e))
+    if tail is not None and not tail.rstrip().endswith('>'):
+        raise ValueError('XML graph file does not end with a tag')
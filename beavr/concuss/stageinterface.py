@@ -7,6 +7,8 @@
 import math
 import os
 import os.path as path
+import threading
+import traceback
 
 import wx
 from wx.lib.scrolledpanel import ScrolledPanel
@@ -19,7 +21,10 @@ from matplotlib.figure import Figure
 
 from beavr.stageinterface import StageInterface, StageVisualizer, MatplotlibVisualizer
 from beavr.concuss.visualizerbackend import DecompositionGenerator, CombineSetGenerator, CountGenerator
-from beavr.util import load_palette, resource_filename, map_coloring, map_colorings, choose
+from beavr.concuss.batch import batch_decompose, count_color_sets, \
+        format_value, rank, rank_columns, top_rows, BatchCancelledError
+from beavr.util import load_palette, resource_filename, map_coloring, map_colorings, map_coloring_array, choose
+from beavr.csrgraph import spring_layout
 
 class ColorInterface(StageInterface):
     """GUI elements for CONCUSS coloring stage visualization"""
@@ -30,11 +35,11 @@ class ColorInterface(StageInterface):
         """Fill the empty GUI elements with coloring-specific widgets"""
         super(ColorInterface, self).__init__(parent)
 
-        # Forward button
-        fwd_bmp = wx.ArtProvider.GetBitmap(wx.ART_GO_FORWARD, wx.ART_TOOLBAR,
-                self.tb_size)
-        fwd = self.tb.AddLabelTool(wx.ID_FORWARD, "Forward", fwd_bmp)
-        self.Bind(wx.EVT_TOOL, self.on_forward, fwd)
+        # First step button
+        first_bmp = wx.ArtProvider.GetBitmap(wx.ART_GOTO_FIRST,
+                wx.ART_TOOLBAR, self.tb_size)
+        first = self.tb.AddLabelTool(wx.NewId(), "First Step", first_bmp)
+        self.Bind(wx.EVT_TOOL, self.on_first, first)
 
         # Backward button
         back_bmp = wx.ArtProvider.GetBitmap(wx.ART_GO_BACK, wx.ART_TOOLBAR,
@@ -42,6 +47,24 @@ class ColorInterface(StageInterface):
         back = self.tb.AddLabelTool(wx.ID_BACKWARD, "Backward", back_bmp)
         self.Bind(wx.EVT_TOOL, self.on_backward, back)
 
+        # Forward button
+        fwd_bmp = wx.ArtProvider.GetBitmap(wx.ART_GO_FORWARD, wx.ART_TOOLBAR,
+                self.tb_size)
+        fwd = self.tb.AddLabelTool(wx.ID_FORWARD, "Forward", fwd_bmp)
+        self.Bind(wx.EVT_TOOL, self.on_forward, fwd)
+
+        # Last step button
+        last_bmp = wx.ArtProvider.GetBitmap(wx.ART_GOTO_LAST,
+                wx.ART_TOOLBAR, self.tb_size)
+        last = self.tb.AddLabelTool(wx.NewId(), "Last Step", last_bmp)
+        self.Bind(wx.EVT_TOOL, self.on_last, last)
+
+        # Slider to scrub to any step; only the steps shown are read
+        self.step_slider = wx.Slider(self.tb, wx.NewId(), 0, 0, 1,
+                size=(200, -1))
+        self.tb.AddControl(self.step_slider)
+        self.step_slider.Bind(wx.EVT_SLIDER, self.on_slider)
+
         self.tb.AddSeparator()
 
         # Random Layout buton
@@ -55,17 +78,43 @@ class ColorInterface(StageInterface):
         vis = ColorVisualizer(self)
         self.set_visualization(vis)
 
-    def on_forward(self, e):
-        """Generate a new random graph layout"""
-        if self.vis.coloring_index < len(self.vis.colorings) - 1:
-            self.vis.coloring_index += 1
+    def set_graph(self, graph, colorings, step=0):
+        """
+        Set the graph to display, and the step to show first
+        :param colorings: ColoringHistory or LazyColoringHistory
+        :param step: index of the step, which may be negative
+        """
+        self.vis.set_graph(graph, colorings, step=step)
+        self.step_slider.SetRange(0, max(len(colorings) - 1, 1))
+        self.step_slider.SetValue(self.vis.coloring_index)
+
+    def go_to_step(self, step):
+        """Show the coloring of a step, if there is such a step"""
+        if (0 <= step < len(self.vis.colorings) and
+                step != self.vis.coloring_index):
+            self.vis.coloring_index = step
             self.vis.update_graph_display()
-            
+        self.step_slider.SetValue(self.vis.coloring_index)
+
+    def on_first(self, e):
+        """Show the first step"""
+        self.go_to_step(0)
+
+    def on_last(self, e):
+        """Show the last step"""
+        self.go_to_step(len(self.vis.colorings) - 1)
+
+    def on_slider(self, e):
+        """Show the step chosen with the slider"""
+        self.go_to_step(self.step_slider.GetValue())
+
+    def on_forward(self, e):
+        """Show the next step"""
+        self.go_to_step(self.vis.coloring_index + 1)
+
     def on_backward(self, e):
-        """Generate a new random graph layout"""
-        if self.vis.coloring_index > 0:
-            self.vis.coloring_index -= 1
-            self.vis.update_graph_display()
+        """Show the previous step"""
+        self.go_to_step(self.vis.coloring_index - 1)
 
     def on_random(self, e):
         """Generate a new random graph layout"""
@@ -78,11 +127,19 @@ class DecomposeInterface(StageInterface):
 
     name = "Decompose"
 
-    def __init__(self, parent, graph, pattern, coloring):
+    def __init__(self, parent, graph, pattern, colorings):
         """Fill the empty GUI elements with decomposition-specific widgets"""
         super(DecomposeInterface, self).__init__(parent)
 
         self.pattern = pattern
+        # Decompositions on every color set which rank high enough to be
+        # shown, once they have been found
+        self.batch_rows = None
+        # Progress dialog of the decompositions being found
+        self.progress_dlg = None
+
+        # Decompose using the final coloring
+        coloring = colorings[-1]
 
         vis = DecomposeVisualizer(self, len(pattern.nodes()))
         self.set_visualization(vis)
@@ -93,7 +150,7 @@ class DecomposeInterface(StageInterface):
         # The current color set
         self.color_set = set()
         # Add buttons for all our colors
-        for color in set(coloring):
+        for color in sorted(colorings.color_set(-1)):
             new_id = wx.NewId()
             self.id_color_mapping[new_id] = color
             bmp = self.color_icon(color)
@@ -101,6 +158,15 @@ class DecomposeInterface(StageInterface):
                     bmp)
             self.Bind(wx.EVT_TOOL, self.on_color_tool, btn)
 
+        self.tb.AddSeparator()
+
+        # Rank Color Sets button
+        rank_bmp = wx.ArtProvider.GetBitmap(wx.ART_REPORT_VIEW,
+                wx.ART_TOOLBAR, self.tb_size)
+        rank_tool = self.tb.AddLabelTool(wx.NewId(), "Rank Color Sets",
+                rank_bmp)
+        self.Bind(wx.EVT_TOOL, self.on_rank, rank_tool)
+
         self.tb.Realize()
 
     def color_icon(self, color):
@@ -135,6 +201,139 @@ class DecomposeInterface(StageInterface):
         # Update the graph display
         self.vis.update_graph_display(self.color_set)
 
+    def show_color_set(self, color_set):
+        """Select a color set, toggling the color buttons to match"""
+        for tool_id, color in self.id_color_mapping.iteritems():
+            self.tb.ToggleTool(tool_id, color in color_set)
+        self.color_set = set(color_set)
+        self.vis.update_graph_display(self.color_set)
+
+    def on_rank(self, e):
+        """Rank every color set of up to p colors, and show the one picked"""
+        if self.batch_rows is None:
+            self.decompose_all()
+        else:
+            self.show_ranking()
+
+    def show_ranking(self):
+        """Show the ranked color sets, and select the one picked"""
+        dlg = ColorSetRankingDialog(self, self.batch_rows)
+        if dlg.ShowModal() == wx.ID_OK and dlg.color_set is not None:
+            self.show_color_set(dlg.color_set)
+        dlg.Destroy()
+
+    def decompose_all(self):
+        """
+        Start decomposing on every color set of up to p colors in a
+        background thread, showing progress, and show the ranking once done
+        """
+        total = count_color_sets(len(self.id_color_mapping), self.vis.p)
+        self.progress_dlg = wx.ProgressDialog("Rank Color Sets",
+                "Decomposing on every color set...", maximum=max(total, 1),
+                parent=self, style=wx.PD_APP_MODAL | wx.PD_CAN_ABORT |
+                wx.PD_ELAPSED_TIME | wx.PD_REMAINING_TIME)
+        cancel_event = threading.Event()
+        thread = threading.Thread(target=self._decompose_worker,
+                args=(cancel_event,))
+        thread.daemon = True
+        thread.start()
+
+    def _decompose_worker(self, cancel_event):
+        """
+        Decompose on every color set, keeping the rows the ranking shows.
+        This runs in its own thread, so it must only touch the GUI through
+        wx.CallAfter.
+        """
+        def progress(done, count):
+            wx.CallAfter(self.show_decompose_progress, cancel_event, done)
+
+        rows = None
+        try:
+            rows = top_rows(batch_decompose(self.vis.graph, self.vis.coloring,
+                self.vis.p, progress=progress, cancel_event=cancel_event),
+                ColorSetRankingDialog.shown_rows)
+        except BatchCancelledError:
+            pass
+        except Exception:
+            traceback.print_exc()
+        wx.CallAfter(self.finish_decompose, rows)
+
+    def show_decompose_progress(self, cancel_event, done):
+        """Show how many color sets are done, noticing if Abort was pressed"""
+        if not self.progress_dlg.Update(done)[0]:
+            cancel_event.set()
+
+    def finish_decompose(self, rows):
+        """Show the ranking once every color set has been decomposed"""
+        self.progress_dlg.Destroy()
+        self.progress_dlg = None
+        if rows is not None:
+            self.batch_rows = rows
+            self.show_ranking()
+
+
+class ColorSetRankingDialog(wx.Dialog):
+    """Table of the decompositions on every color set, ranked by a column"""
+
+    # Most color sets listed
+    shown_rows = 500
+
+    def __init__(self, parent, rows):
+        """
+        :param rows: list of rows as returned by batch_decompose, or those
+                     of them kept by top_rows
+        """
+        super(ColorSetRankingDialog, self).__init__(parent,
+                title="Rank Color Sets", size=(640, 480),
+                style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
+        self.rows = rows
+        # The color set picked, if any
+        self.color_set = None
+
+        # Clicking a column's header ranks the color sets by it
+        self.list = wx.ListCtrl(self, style=wx.LC_REPORT | wx.LC_SINGLE_SEL)
+        self.list.InsertColumn(0, "Color set")
+        for i, description in enumerate(rank_columns.itervalues()):
+            self.list.InsertColumn(i + 1, description)
+        self.list.Bind(wx.EVT_LIST_COL_CLICK, self.on_column)
+        self.list.Bind(wx.EVT_LIST_ITEM_ACTIVATED, self.on_activated)
+        self.Bind(wx.EVT_BUTTON, self.on_ok, id=wx.ID_OK)
+
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        sizer.Add(self.list, 1, wx.EXPAND | wx.ALL, 5)
+        sizer.Add(self.CreateButtonSizer(wx.OK | wx.CANCEL), 0,
+                wx.EXPAND | wx.ALL, 5)
+        self.SetSizer(sizer)
+
+        self.show_ranking(next(iter(rank_columns)))
+
+    def show_ranking(self, column):
+        """List the highest ranked color sets by a column"""
+        self.ranked = rank(self.rows, column, self.shown_rows)
+        self.list.DeleteAllItems()
+        for i, row in enumerate(self.ranked):
+            self.list.InsertStringItem(i, format_value('colors',
+                row['colors']))
+            for j, name in enumerate(rank_columns):
+                self.list.SetStringItem(i, j + 1, str(row[name]))
+
+    def on_column(self, e):
+        """Rank by the column whose header was clicked"""
+        if e.GetColumn() > 0:
+            self.show_ranking(list(rank_columns)[e.GetColumn() - 1])
+
+    def on_activated(self, e):
+        """Pick the color set which was double-clicked"""
+        self.color_set = set(self.ranked[e.GetIndex()]['colors'])
+        self.EndModal(wx.ID_OK)
+
+    def on_ok(self, e):
+        """Pick the selected color set, if any"""
+        index = self.list.GetFirstSelected()
+        if index != -1:
+            self.color_set = set(self.ranked[index]['colors'])
+        e.Skip()
+
 
 class CountInterface(StageInterface):
     """GUI elements for CONCUSS counting stage visualization"""
@@ -280,11 +479,8 @@ class ColorVisualizer(MatplotlibVisualizer):
         separator_x = legend_width
         legend_width += margin
         # Add enough width for the colors
-        color_set = set(self.colorings[self.coloring_index])
-        if self.coloring_index > 0:
-            previous_color_set = set(self.colorings[self.coloring_index - 1])
-        else:
-            previous_color_set = set()
+        color_set = self.color_set
+        previous_color_set = self.previous_color_set
         color_delta = len(color_set ^ previous_color_set)
         if len(color_set) < len(previous_color_set):
             color_delta *= -1
@@ -336,14 +532,19 @@ class ColorVisualizer(MatplotlibVisualizer):
                 color_box_x = margin
                 color_box_y += color_box_size + margin
 
-    def set_graph(self, graph, colorings, palette_name='brewer'):
-        """Set the graph to display"""
-        self.coloring_index = 0
+    def set_graph(self, graph, colorings, palette_name='brewer', step=0):
+        """
+        Set the graph to display
+        :param graph: NetworkX graph or CSRGraph
+        :param colorings: ColoringHistory or LazyColoringHistory of the
+                          coloring stage
+        :param step: index of the step to show, which may be negative
+        """
+        self.coloring_index = step % len(colorings) if step < 0 else step
 
         self.graph = graph
         self.palette = load_palette(palette_name)
         self.colorings = colorings
-        self.mapped_colorings = map_colorings(self.palette, self.colorings)
         self.graph_layout(0)
 
         self.update_graph_display(reset_zoom=True)
@@ -352,10 +553,20 @@ class ColorVisualizer(MatplotlibVisualizer):
         """Compute a layout of the graph, with an optional seed"""
         if seed is not None:
             random.seed(seed)
-        self.layout = nx.spring_layout(self.graph)
+        self.layout = spring_layout(self.graph)
 
     def update_graph_display(self, reset_zoom=False):
         """Compute a layout of the graph, with an optional seed"""
+        # Only the current step is kept in full, and mapped to RGB colors
+        coloring = self.colorings[self.coloring_index]
+        self.mapped_coloring = map_coloring_array(self.palette, coloring)
+        self.color_set = self.colorings.color_set(self.coloring_index)
+        if self.coloring_index > 0:
+            self.previous_color_set = self.colorings.color_set(
+                    self.coloring_index - 1)
+        else:
+            self.previous_color_set = set()
+
         # Save zoom level, etc.
         if not reset_zoom:
             cur_xlim = self.axes.get_xlim()
@@ -367,7 +578,7 @@ class ColorVisualizer(MatplotlibVisualizer):
             self.axes.set_ylim(cur_ylim)
         self.axes.set_axis_bgcolor((.8,.8,.8))
         nx.draw_networkx(self.graph, self.layout, ax=self.axes,
-                         node_color=self.mapped_colorings[self.coloring_index],
+                         node_color=self.mapped_coloring,
                          with_labels=False)
         # Redraw
         self.canvas.Refresh()
@@ -458,10 +669,9 @@ class DecomposeVisualizer(MatplotlibVisualizer):
 
     def update_graph_display(self, color_set):
         """Update the displayed graph"""
-        # Compute what we need for the current color set
-        cc_list = self.DG.get_connected_components(color_set)
-        layouts = self.DG.get_tree_layouts(cc_list
-            , self.coloring)
+        # Compute what we need for the current color set, or reuse it if the
+        # color set was shown recently
+        cc_list, layouts = self.DG.decompose(color_set)
         # Draw the graph
         self.axes.clear()
         self.axes.set_axis_bgcolor((.8,.8,.8))
@@ -577,6 +787,10 @@ class CombinePage(wx.Panel):
 
     def __init__(self, parent, id, color_set, colors, pattern_size, min_size, counts_per_colorset=None,
                  is_totals_page=False):
+        """
+        :param counts_per_colorset: ColorsetCounts from CONCUSS, needed for the
+                                    totals page
+        """
         super(CombinePage, self).__init__(parent, id)
 
         outersizer = wx.BoxSizer(wx.VERTICAL)
@@ -605,15 +819,16 @@ class CombinePage(wx.Panel):
         if is_totals_page:
             c_sets_by_size = []
             # Add up counts for each size of color sets
-            for c_set, count in counts_per_colorset.iteritems():
-                len_c_set = len(c_set)
-                if len_c_set in count_by_size:
-                    count_by_size[len_c_set] += count
-                else:
-                    count_by_size[len_c_set] = count
-            # Add color sets from CONCUSS's output instead of generating them again
+            count_by_size = counts_per_colorset.totals_by_size()
+            # Add color sets from CONCUSS's output instead of generating them
+            # again.  Only the ones that get displayed are converted from
+            # bitmasks, plus one more so the widget knows to add an ellipsis.
+            by_size = counts_per_colorset.group_by_size(range(min_size,
+                pattern_size + 1))
             for i in range(pattern_size, min_size - 1, -1):
-                c_sets_by_size.append([set(colorset) for colorset in counts_per_colorset.keys() if len(colorset) == i])
+                shown = int(max_sets_coef*math.log(i)) + 1
+                c_sets_by_size.append([set(colorset) for colorset in
+                    by_size[i].colorsets(shown)])
 
         else:
             self.CSG = CombineSetGenerator(color_set, colors, pattern_size, min_size)
@@ -622,6 +837,10 @@ class CombinePage(wx.Panel):
         total = 0
         add = len(c_sets_by_size) % 2 == 1
         for c_sets in c_sets_by_size:
+            if not c_sets:
+                # No color sets of this size, so the term adds nothing
+                add = not add
+                continue
             max_sets = int(max_sets_coef*math.log(len(c_sets[0])))
             inexterm = InExTermWidget(self.scrolledpanel, c_sets, in_ex,
                                       colors, pattern_size, add, max_sets, count_by_size, totals_term=is_totals_page)
@@ -0,0 +1,97 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+"""
+Dense numbering of the vertices of a CONCUSS host graph
+
+Vertex ids in CONCUSS's files can be any integers, but colorings and other
+per-vertex arrays are indexed by vertex.  The loader therefore numbers the
+vertices of the host graph 0 to n - 1 in order of their ids, and uses those
+indices everywhere, so per-vertex arrays have one entry per vertex however
+large or sparse the ids are.
+"""
+
+import numpy as np
+
+
+class VertexIds(object):
+    """
+    The vertex ids of a host graph, in increasing order, so the index of a
+    vertex is the position of its id
+    """
+
+    def __init__(self, ids):
+        """
+        :param ids: sorted int64 array of distinct vertex ids
+        """
+        self.ids = ids
+        # When the ids are already 0 to n - 1, indices and ids are the same
+        self.identity = len(ids) == 0 or (ids[0] == 0 and
+                ids[-1] == len(ids) - 1)
+
+    @classmethod
+    def from_vertices(cls, vertices):
+        """
+        Number the distinct vertices of an array, which may repeat them
+        """
+        return cls(np.unique(np.asarray(vertices, dtype=np.int64)))
+
+    def to_arrays(self):
+        """
+        Represent the ids as a dictionary of arrays, for storage
+        :returns: dictionary of arrays by name
+        """
+        return {'ids': self.ids}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Create the ids from the arrays made by to_arrays, without copying
+        :param arrays: dictionary of arrays by name
+        """
+        return cls(arrays['ids'])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def contains(self, vertices):
+        """
+        Find which vertex ids are in the host graph
+        :param vertices: array of vertex ids, of any shape
+        :returns: boolean array, of the same shape
+        """
+        vertices = np.asarray(vertices, dtype=np.int64)
+        if len(self.ids) == 0:
+            return np.zeros(vertices.shape, dtype=bool)
+        if self.identity:
+            return (vertices >= 0) & (vertices < len(self))
+        positions = np.searchsorted(self.ids, vertices)
+        np.minimum(positions, len(self.ids) - 1, out=positions)
+        return self.ids[positions] == vertices
+
+    def index(self, vertices):
+        """
+        Look up the indices of vertex ids
+        :param vertices: array of vertex ids, of any shape
+        :returns: int64 array of indices, of the same shape
+        :raises ValueError: if any vertex is not in the host graph
+        """
+        vertices = np.asarray(vertices, dtype=np.int64)
+        missing = vertices[~self.contains(vertices)]
+        if len(missing):
+            raise ValueError('Vertex {0} is not in the host graph'.format(
+                missing[0]))
+        if self.identity:
+            return vertices
+        return np.searchsorted(self.ids, vertices)
+
+    def external(self, indices):
+        """
+        Look up the ids of vertices by index
+        :param indices: array of indices, of any shape
+        :returns: int64 array of vertex ids, of the same shape
+        """
+        return self.ids[indices]
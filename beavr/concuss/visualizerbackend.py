@@ -6,51 +6,123 @@
 
 import math
 import random
+from collections import OrderedDict
 from itertools import combinations
 import networkx as nx
 from networkx.algorithms import isomorphism
 from numpy import random
+import numpy as np
 from beavr.util import load_palette, map_coloring, map_colorings
+from beavr.concuss.colorindex import ColorIndex
+from beavr.concuss.components import IncrementalComponents
+
+
+# Rough memory taken by a small NetworkX graph and by each of its vertices,
+# with their attributes and layout positions, and edges, in bytes
+graph_bytes = 2048
+vertex_bytes = 800
+edge_bytes = 600
+
+# Connected graphs of up to this many vertices have equal fingerprints only
+# if they are isomorphic
+exact_fingerprint_size = 2
 
 
 class DecompositionGenerator(object):
     layout_margin = 0.15
+    # Most bytes of decompositions kept by decompose, as estimated by
+    # decomposition_size; the latest one is kept whatever its size
+    cache_size = 1 << 27
 
     def __init__(self, graph, coloring):
+        """
+        :param graph: host graph, as a NetworkX graph or a CSRGraph
+        :param coloring: sequence of colors indexed by vertex
+        """
         self.graph = graph
         self.coloring = coloring
+        # ColorIndex of the graph and coloring, built when first needed
+        self.index = None
+        # IncrementalComponents on the latest color set, once there is one
+        self.components = None
+        # (components, layouts, size) by frozenset of colors, least recently
+        # used first
+        self.cache = OrderedDict()
+        self.cached_bytes = 0
+
+    def color_index(self):
+        """Get the ColorIndex of the graph and coloring, building it once"""
+        if self.index is None:
+            self.index = ColorIndex(self.graph, self.coloring)
+        return self.index
+
+    def decompose(self, color_set):
+        """
+        Find the components on a color set and lay them out, or reuse them
+        if the color set has been decomposed recently
+        :param color_set: The color set
+        :return: tuple of the components, as returned by
+                 get_connected_components, and their layouts, as returned by
+                 get_tree_layouts
+        """
+        key = frozenset(color_set)
+        try:
+            entry = self.cache.pop(key)
+        except KeyError:
+            components = self.get_connected_components(key)
+            layouts = self.get_tree_layouts(components, self.coloring)
+            entry = (components, layouts, decomposition_size(components))
+            self.cached_bytes += entry[2]
+        self.cache[key] = entry
+
+        while self.cached_bytes > self.cache_size and len(self.cache) > 1:
+            self.cached_bytes -= self.cache.popitem(last=False)[1][2]
+        return entry[0], entry[1]
 
     def get_connected_components(self, color_set):
         """
         A generator for connected components given a specific color set
 
+        Components are kept from one color set to the next, so after the
+        first call the work grows with the colors added or removed rather
+        than with the host graph.
+
         :param color_set: The color set
-        :return: A generator for connected components (subgraphs) induced by
-                 color_set
+        :return: A list of one component (subgraph) induced by color_set for
+                 each isomorphism class, with the number of components in
+                 the class as its occ attribute
         """
-
-        # Make an empty set to store vertices
-        v_set = set()
-
-        # Find vertices that are colored with colors in color_set
-        for index, color in enumerate(self.coloring):
-            if color in color_set:
-                v_set.add(index)
+        if self.components is None:
+            self.components = IncrementalComponents(self.graph,
+                    self.coloring, self.color_index())
+        self.components.set_colors(color_set)
 
         cc_list = []
-        for new_cc in nx.connected_component_subgraphs(self.graph.subgraph(v_set)):
-            found = False
-            for n in new_cc.node:
-                new_cc.node[n]['color'] = self.coloring[n]
-            for i, cc in enumerate(cc_list):
-                if nx.is_isomorphic(new_cc, cc,
-                        node_match=lambda n1, n2: n1['color'] == n2['color']):
-                    cc_list[i].occ += 1
-                    found = True
+        # Classes found so far, by fingerprint; only components with the
+        # same fingerprint can be isomorphic, so only those are compared.
+        # Each component remembers a graph it is isomorphic to, so while it
+        # stays unchanged it needs no comparing again.
+        buckets = {}
+        for new_cc in self.components.component_graphs():
+            if not hasattr(new_cc, 'fingerprint'):
+                new_cc.fingerprint = component_fingerprint(new_cc)
+                new_cc.representative = new_cc
+            bucket = buckets.setdefault(new_cc.fingerprint, [])
+            for cc in bucket:
+                if (new_cc.representative is cc.representative or
+                        len(new_cc) <= exact_fingerprint_size or
+                        nx.is_isomorphic(new_cc, cc, node_match=same_color)):
+                    new_cc.representative = cc.representative
+                    cc.occ += 1
                     break
-            if not found:
-                new_cc.occ = 1
-                cc_list.append(new_cc)
+            else:
+                # Copy the component, since it is shared with other color
+                # sets which may count it differently
+                cc = nx.Graph(new_cc)
+                cc.occ = 1
+                cc.representative = new_cc.representative
+                bucket.append(cc)
+                cc_list.append(cc)
         return cc_list
 
     def get_tree_layouts(self, connected_components, coloring):
@@ -142,6 +214,55 @@ class DecompositionGenerator(object):
         return tree
 
 
+def decomposition_size(components):
+    """
+    Estimate the memory taken by components and their layouts
+    :param components: list of NetworkX graphs
+    :returns: number of bytes
+    """
+    return sum(graph_bytes + vertex_bytes * cc.number_of_nodes() +
+            edge_bytes * cc.number_of_edges() for cc in components)
+
+
+def same_color(attributes1, attributes2):
+    """Whether two vertices match in a colored isomorphism"""
+    return attributes1['color'] == attributes2['color']
+
+
+def component_fingerprint(component):
+    """
+    Summarize a colored graph so that isomorphic graphs, with colors kept,
+    get the same fingerprint.  Graphs which are not isomorphic mostly get
+    different ones, but not always, so equal fingerprints still need checking,
+    except for connected graphs of up to exact_fingerprint_size vertices.
+
+    Vertices are labelled by color-refinement (the Weisfeiler-Lehman hash):
+    each starts with its color, then is relabelled with its label and the
+    labels of its neighbors, until that splits no more vertices apart.
+    :param component: NetworkX graph with a 'color' attribute on every vertex
+    :returns: hashable fingerprint
+    """
+    adj = component.adj
+    labels = dict((v, data['color'])
+            for v, data in component.node.iteritems())
+    # Twice the number of edges, but quicker than number_of_edges
+    degrees = sum(len(neighbors) for neighbors in adj.itervalues())
+    if len(labels) <= exact_fingerprint_size:
+        # A connected graph this small is a vertex or an edge, so its colors
+        # say all there is to say about it
+        return (len(labels), degrees, tuple(sorted(labels.itervalues())))
+    classes = len(set(labels.itervalues()))
+    for _ in xrange(len(labels)):
+        labels = dict((v, hash((label,
+            tuple(sorted(labels[u] for u in adj[v])))))
+            for v, label in labels.iteritems())
+        new_classes = len(set(labels.itervalues()))
+        if new_classes == classes:
+            break
+        classes = new_classes
+    return (len(labels), degrees, tuple(sorted(labels.itervalues())))
+
+
 class CountGenerator(object):
     layout_margin = 0.15
     k_pat_count = 3
@@ -168,9 +289,11 @@ class CountGenerator(object):
         self.motifs = []
         self.vertices_list = []
 
+        # Listing the keys of a large table takes a while, so only do it once
+        keys = self.dptable.keys()
         while len(self.k_patterns) < self.k_pat_count:
             # Get a random set of vertices from the DP table
-            vertices = random.choice(self.dptable.keys())
+            vertices = keys[random.randint(len(keys))]
             # Get the root path
             root_path = self.get_root_path(vertices[0])
 
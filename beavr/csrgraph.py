@@ -0,0 +1,442 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+"""
+Compact graph storage for host graphs too large for NetworkX
+
+A CSRGraph holds an undirected graph in compressed sparse row form: vertex i's
+neighbors are neighbors[offsets[i]:offsets[i+1]].  These arrays take a few
+bytes per edge, where NetworkX takes around a kilobyte, and they can be
+memory-mapped straight from an ArchiveCache entry.
+
+Vertices are stored by index, 0 to n - 1, in order of their labels, which are
+the integer vertex names used in the archive.  Methods taking or returning
+vertices use labels, like NetworkX does, unless their names say otherwise.
+
+The functions at the end of this module accept either a CSRGraph or a
+NetworkX graph, so that code using them works with both.
+"""
+
+import math
+
+import numpy as np
+import networkx as nx
+
+
+class CSRGraph(object):
+    """Undirected graph stored as compressed sparse row arrays"""
+
+    # Number of vertices whose repulsive forces spring_layout computes at once
+    layout_block_size = 4096
+    # Most vertex pairs whose repulsion spring_layout computes per iteration
+    layout_pairs = 1 << 22
+
+    def __init__(self, offsets, neighbors, nodes):
+        """
+        Create a graph from its arrays, which are used without copying
+        :param offsets: array of n + 1 offsets into neighbors
+        :param neighbors: array of the indices of each vertex's neighbors, in
+                          increasing order
+        :param nodes: sorted array of the n vertex labels
+        """
+        self.offsets = offsets
+        self.neighbors_array = neighbors
+        self.nodes_array = nodes
+        self._sources = None
+
+    @classmethod
+    def from_edges(cls, nodes, edges):
+        """
+        Create a graph from its vertices and edges
+        :param nodes: sequence of integer vertex labels; vertices of edges are
+                      added even if they are not listed here
+        :param edges: sequence of pairs of vertex labels, or an n by 2 array
+        :returns: CSRGraph
+        """
+        nodes = np.asarray(nodes, dtype=np.int64).ravel()
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        labels = np.unique(np.concatenate((nodes, edges.ravel())))
+        n = len(labels)
+
+        u = np.searchsorted(labels, edges[:, 0])
+        v = np.searchsorted(labels, edges[:, 1])
+        # Store each edge in both directions, but self-loops only once
+        loop = u == v
+        sources = np.concatenate((u, v[~loop]))
+        targets = np.concatenate((v, u[~loop]))
+        # Sorting by (source, target) also drops parallel edges
+        pairs = np.unique(sources * n + targets)
+        sources = pairs // n
+        targets = pairs % n
+
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n), out=offsets[1:])
+        return cls(offsets, targets.astype(index_dtype(n)), labels)
+
+    @classmethod
+    def from_networkx(cls, graph):
+        """Create a graph with the same vertices and edges as a NetworkX graph"""
+        return cls.from_edges(graph.nodes(), graph.edges())
+
+    def to_networkx(self):
+        """Create a NetworkX graph with the same vertices and edges"""
+        graph = nx.Graph()
+        graph.add_nodes_from(self.nodes())
+        graph.add_edges_from(self.edges())
+        return graph
+
+    def to_arrays(self):
+        """
+        Represent the graph as a dictionary of arrays, for storage
+        :returns: dictionary of arrays by name
+        """
+        return {
+            'offsets': self.offsets,
+            'neighbors': self.neighbors_array,
+            'nodes': self.nodes_array
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Create a graph from the arrays made by to_arrays, without copying them
+        :param arrays: dictionary of arrays by name
+        :returns: CSRGraph
+        """
+        return cls(arrays['offsets'], arrays['neighbors'], arrays['nodes'])
+
+    def __len__(self):
+        return len(self.nodes_array)
+
+    def __iter__(self):
+        return iter(self.nodes_array.tolist())
+
+    def __contains__(self, vertex):
+        try:
+            self.index_of(vertex)
+        except (KeyError, TypeError, ValueError):
+            return False
+        return True
+
+    def number_of_nodes(self):
+        return len(self)
+
+    def number_of_edges(self):
+        sources = self.sources()
+        return int(np.count_nonzero(sources <= self.neighbors_array))
+
+    def is_directed(self):
+        return False
+
+    def nodes(self):
+        """Return a list of the vertex labels"""
+        return self.nodes_array.tolist()
+
+    def edges(self):
+        """Return a list of the edges as pairs of vertex labels"""
+        sources = self.sources()
+        once = sources <= self.neighbors_array
+        return zip(self.nodes_array[sources[once]].tolist(),
+                self.nodes_array[self.neighbors_array[once]].tolist())
+
+    def edge_array(self):
+        """
+        Get the edges as an array
+        :returns: k by 2 array with a row of vertex labels for each edge
+        """
+        sources = self.sources()
+        once = sources <= self.neighbors_array
+        return np.column_stack((self.nodes_array[sources[once]],
+            self.nodes_array[self.neighbors_array[once]]))
+
+    def index_of(self, vertices):
+        """
+        Get the indices of vertices from their labels
+        :param vertices: a vertex label or array of labels
+        :returns: index or array of indices
+        :raises KeyError: if a vertex is not in the graph
+        """
+        scalar = np.ndim(vertices) == 0
+        vertices = np.atleast_1d(np.asarray(vertices, dtype=np.int64))
+        indices = np.searchsorted(self.nodes_array, vertices)
+        found = indices < len(self)
+        found[found] = self.nodes_array[indices[found]] == vertices[found]
+        if not np.all(found):
+            raise KeyError(vertices[~found].tolist())
+        return int(indices[0]) if scalar else indices
+
+    def degree(self, vertex=None):
+        """
+        Get the degree of one vertex, or of every vertex
+        :param vertex: vertex label, or None for all vertices
+        :returns: degree, or array of degrees in order of index
+        """
+        degrees = np.diff(self.offsets)
+        if vertex is None:
+            return degrees
+        return int(degrees[self.index_of(vertex)])
+
+    def neighbors(self, vertex):
+        """Return a list of the labels of a vertex's neighbors"""
+        index = self.index_of(vertex)
+        start, stop = self.offsets[index], self.offsets[index + 1]
+        return self.nodes_array[self.neighbors_array[start:stop]].tolist()
+
+    def incident_edges(self, vertices):
+        """
+        Get the edges at some vertices
+        :param vertices: sequence or array of vertex labels
+        :returns: k by 2 array with a row (vertex, neighbor) of labels for
+                  each neighbor of each of the vertices
+        :raises KeyError: if a vertex is not in the graph
+        """
+        indices = self.index_of(np.asarray(vertices, dtype=np.int64))
+        starts = self.offsets[indices]
+        counts = self.offsets[indices + 1] - starts
+        # The j-th neighbor of the i-th vertex is at starts[i] + j, and comes
+        # after the neighbors of the vertices before it
+        before = np.cumsum(counts) - counts
+        positions = np.repeat(starts - before, counts) + \
+                np.arange(counts.sum())
+        return np.column_stack((np.repeat(self.nodes_array[indices], counts),
+            self.nodes_array[self.neighbors_array[positions]]))
+
+    def has_edge(self, u, v):
+        try:
+            u, v = self.index_of([u, v])
+        except KeyError:
+            return False
+        adjacent = self.neighbors_array[self.offsets[u]:self.offsets[u + 1]]
+        position = np.searchsorted(adjacent, v)
+        return position < len(adjacent) and adjacent[position] == v
+
+    def sources(self):
+        """
+        Get the index of the vertex each entry of the neighbors array belongs
+        to, so (sources[i], neighbors_array[i]) are the graph's edges
+        """
+        if self._sources is None:
+            n = len(self)
+            self._sources = np.repeat(np.arange(n, dtype=index_dtype(n)),
+                    np.diff(self.offsets))
+        return self._sources
+
+    def subgraph(self, vertices):
+        """
+        Get the subgraph induced by some vertices
+        :param vertices: iterable of vertex labels; those not in the graph are
+                         ignored, as NetworkX does
+        :returns: CSRGraph
+        """
+        vertices = np.fromiter(vertices, dtype=np.int64)
+        indices = np.searchsorted(self.nodes_array, vertices)
+        found = indices < len(self)
+        found[found] = self.nodes_array[indices[found]] == vertices[found]
+        mask = np.zeros(len(self), dtype=bool)
+        mask[indices[found]] = True
+        return self.subgraph_mask(mask)
+
+    def subgraph_mask(self, mask):
+        """
+        Get the subgraph induced by the vertices selected by a mask
+        :param mask: boolean array with an entry for each vertex index
+        :returns: CSRGraph
+        """
+        mask = np.asarray(mask, dtype=bool)
+        sources = self.sources()
+        kept = mask[sources] & mask[self.neighbors_array]
+        new_index = np.cumsum(mask) - 1
+        n = int(np.count_nonzero(mask))
+
+        # Edges stay sorted by source and target, since renumbering keeps the
+        # order of the vertices
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(new_index[sources[kept]], minlength=n),
+                out=offsets[1:])
+        neighbors = new_index[self.neighbors_array[kept]]
+        return CSRGraph(offsets, neighbors.astype(index_dtype(n)),
+                self.nodes_array[mask])
+
+    def component_labels(self):
+        """
+        Find the connected components
+        :returns: array giving, for each vertex index, the smallest vertex
+                  index in its component
+        """
+        n = len(self)
+        labels = np.arange(n, dtype=np.int64)
+        has_neighbors = np.diff(self.offsets) > 0
+        starts = self.offsets[:-1][has_neighbors]
+        if len(starts) == 0:
+            return labels
+
+        while True:
+            # Each vertex takes the smallest label among its neighbors...
+            new_labels = labels.copy()
+            new_labels[has_neighbors] = np.minimum(labels[has_neighbors],
+                    np.minimum.reduceat(labels[self.neighbors_array], starts))
+            # ...and then follows labels to labels until they stop changing,
+            # which spreads small labels over long paths quickly
+            while True:
+                jumped = new_labels[new_labels]
+                if np.array_equal(jumped, new_labels):
+                    break
+                new_labels = jumped
+            if np.array_equal(new_labels, labels):
+                return labels
+            labels = new_labels
+
+    def connected_components(self):
+        """
+        Find the connected components
+        :returns: list of arrays of the vertex labels of each component
+        """
+        labels = self.component_labels()
+        order = np.argsort(labels, kind='mergesort')
+        boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+        return np.split(self.nodes_array[order], boundaries)
+
+    def component_subgraphs(self):
+        """
+        Get each connected component as a NetworkX graph.  Only use this when
+        the components are small.
+        :returns: list of NetworkX graphs
+        """
+        labels = self.component_labels()
+        roots, component_of = np.unique(labels, return_inverse=True)
+        components = [nx.Graph() for _ in range(len(roots))]
+        for component, vertex in zip(component_of.tolist(), self.nodes()):
+            components[component].add_node(vertex)
+
+        sources = self.sources()
+        once = sources <= self.neighbors_array
+        sources = sources[once]
+        targets = self.neighbors_array[once]
+        for component, u, v in zip(component_of[sources].tolist(),
+                self.nodes_array[sources].tolist(),
+                self.nodes_array[targets].tolist()):
+            components[component].add_edge(u, v)
+        return components
+
+    def spring_layout(self, iterations=50, sample_size=512):
+        """
+        Compute a force-directed layout like networkx.spring_layout, with
+        repulsion estimated from a random sample of vertices on large graphs.
+        numpy.random is used, so seed it for a repeatable layout.
+        :param iterations: number of iterations of the simulation
+        :param sample_size: largest number of vertices repelling the others in
+                            each iteration; fewer are used on graphs so
+                            large that this would be slow
+        :returns: dictionary of positions by vertex label
+        """
+        n = len(self)
+        sample_size = max(16, min(sample_size, self.layout_pairs // max(n, 1)))
+        position = np.random.rand(n, 2)
+        if n < 2:
+            return dict(zip(self.nodes(), position))
+
+        # Optimal distance between vertices and the initial "temperature",
+        # which limits how far vertices can move and cools each iteration
+        k = math.sqrt(1.0 / n)
+        temperature = 0.1
+        cooling = temperature / (iterations + 1)
+        sources = self.sources()
+        targets = self.neighbors_array
+
+        for _ in range(iterations):
+            if n <= sample_size:
+                sample = np.arange(n)
+            else:
+                sample = np.random.randint(n, size=sample_size)
+            scale = float(n) / len(sample)
+
+            displacement = np.zeros((n, 2))
+            for start in range(0, n, self.layout_block_size):
+                block = position[start:start + self.layout_block_size]
+                delta = block[:, np.newaxis, :] - position[sample]
+                distance = np.maximum(np.sqrt((delta ** 2).sum(axis=2)), 0.01)
+                displacement[start:start + len(block)] += scale * (delta *
+                        (k * k / distance ** 2)[:, :, np.newaxis]).sum(axis=1)
+
+            # Attraction along edges; each is stored in both directions, so
+            # both endpoints get pulled
+            delta = position[sources] - position[targets]
+            distance = np.maximum(np.sqrt((delta ** 2).sum(axis=1)), 0.01)
+            pull = delta * (distance / k)[:, np.newaxis]
+            for axis in range(2):
+                displacement[:, axis] -= np.bincount(sources,
+                        weights=pull[:, axis], minlength=n)
+
+            length = np.maximum(np.sqrt((displacement ** 2).sum(axis=1)), 0.01)
+            position += displacement * (np.minimum(length, temperature) /
+                    length)[:, np.newaxis]
+            temperature -= cooling
+
+        # Fit the layout into the unit square, like NetworkX does
+        position -= position.min(axis=0)
+        position /= max(position.max(), 1e-9)
+        return dict(zip(self.nodes(), position))
+
+
+def index_dtype(n):
+    """Return the smallest integer type that can index n vertices"""
+    return np.int32 if n < 1 << 31 else np.int64
+
+
+def connected_component_subgraphs(graph, vertices):
+    """
+    Get the connected components of the subgraph induced by some vertices
+    :param graph: CSRGraph or NetworkX graph
+    :param vertices: iterable of vertex labels
+    :returns: iterable of the components as NetworkX graphs
+    """
+    if isinstance(graph, CSRGraph):
+        return graph.subgraph(vertices).component_subgraphs()
+    return nx.connected_component_subgraphs(graph.subgraph(vertices))
+
+
+def incident_edges(graph, vertices):
+    """
+    Get the edges at some vertices
+    :param graph: CSRGraph or NetworkX graph
+    :param vertices: sequence or array of vertex labels
+    :returns: k by 2 int64 array with a row (vertex, neighbor) for each
+              neighbor of each of the vertices
+    """
+    if isinstance(graph, CSRGraph):
+        return graph.incident_edges(vertices)
+    adj = graph.adj
+    return np.array([(v, u) for v in np.asarray(vertices).tolist()
+        for u in adj[v]], dtype=np.int64).reshape(-1, 2)
+
+
+def edge_array(graph):
+    """
+    Get the edges of a graph as an array
+    :param graph: CSRGraph or NetworkX graph
+    :returns: k by 2 int64 array with a row of vertex labels for each edge
+    """
+    if isinstance(graph, CSRGraph):
+        return graph.edge_array()
+    return np.array(graph.edges(), dtype=np.int64).reshape(-1, 2)
+
+
+def spring_layout(graph):
+    """
+    Compute a force-directed layout of a graph
+    :param graph: CSRGraph or NetworkX graph
+    :returns: dictionary of positions by vertex label
+    """
+    if isinstance(graph, CSRGraph):
+        return graph.spring_layout()
+    return nx.spring_layout(graph)
+
+
+def as_networkx(graph):
+    """Return a graph as a NetworkX graph, converting it if it is a CSRGraph"""
+    if isinstance(graph, CSRGraph):
+        return graph.to_networkx()
+    return graph
@@ -5,16 +5,46 @@
 #
 
 from abc import ABCMeta, abstractmethod
-from zipfile import ZipFile
+import threading
 import ConfigParser
 from os.path import basename, exists
 from importlib import import_module
 
+from beavr.archive import archive_version, map_member, open_archive, \
+        read_array, sample_member
+from beavr.cache import ArchiveCache
+from beavr.loadstats import LoadStats
+
 
 class DataLoader(object):
     """ Abstract Data Loader """
     __metaclass__ = ABCMeta
 
+    # Mapping from attribute names to the names of the methods that load them.
+    # Attributes listed here are loaded from the archive the first time they
+    # are accessed, then stored on the DataLoader like any other attribute.
+    lazy_attributes = {}
+
+    # Mapping from names of lazy attributes to (to_arrays, from_arrays)
+    # functions converting their values to and from dictionaries of numpy
+    # arrays.  These attributes are stored in self.cache once parsed, and
+    # restored from it instead of being parsed again.  Packed archives hold
+    # them as these arrays in the first place.
+    cached_attributes = {}
+
+    # Mapping from names of cached attributes to the names of all the
+    # attributes that must be restored from the cache with them.  An
+    # attribute is only restored if every attribute of its group is in the
+    # cache, so attributes parsed together are never half restored.
+    cache_groups = {}
+
+    # Members stored without compression are memory-mapped rather than read
+    # once they are this many bytes long
+    map_size = 1 << 16
+
+    # Bytes read from each end of a member when validating it
+    sample_size = 1 << 16
+
     def __init__(self, archive, parser):
         """
         Get the json configuration loaded by the DataLoaderFactory
@@ -22,6 +52,212 @@ class DataLoader(object):
         """
         self.archive = archive
         self.parser = parser
+        # Layout version of the archive; see beavr.archive
+        self.archive_version = archive_version(parser)
+
+        # Called as progress(member name, bytes read, member size) while
+        # archive members are read
+        self.progress = None
+        # Called as loaded(attribute name) after each lazy attribute is
+        # loaded, from the thread which loaded it
+        self.loaded = None
+        # Set this event to make loading raise LoadCancelledError
+        self.cancel_event = threading.Event()
+        # Lazy attributes may be loaded from several threads, but the archive
+        # can only be read by one of them at a time
+        self.lock = threading.RLock()
+        # ArchiveCache holding parsed data, or None to always parse the archive
+        self.cache = None
+        # LoadStats of each lazy attribute loaded, in the order they finished
+        self.load_stats = []
+        # Whether load_stats measure peak memory use, which resets the
+        # process's peak for every attribute
+        self.measure_memory = False
+        # LoadStats of the attributes being loaded, innermost last
+        self.loading = []
+
+    def __getattr__(self, name):
+        """
+        Load a lazy attribute from self.archive on first access
+        :param name: name of the attribute being accessed
+        :returns: the loaded value, which is memoized for later accesses
+        """
+        try:
+            method = self.lazy_attributes[name]
+        except KeyError:
+            raise AttributeError(name)
+        with self.lock:
+            # Another thread may have loaded it while we were waiting
+            if name in self.__dict__:
+                return self.__dict__[name]
+            value = self.load_attribute(name, method)
+            setattr(self, name, value)
+        if self.loaded is not None:
+            self.loaded(name)
+        return value
+
+    def is_loaded(self, name):
+        """
+        Whether a lazy attribute has been loaded, so that accessing it will
+        not wait for the archive
+        """
+        return name in self.__dict__
+
+    def load_attribute(self, name, method):
+        """
+        Load a lazy attribute from self.cache if it is there, or else by
+        calling its loading method and storing the result in self.cache.
+        How the load went is added to self.load_stats.
+        :param name: name of the attribute
+        :param method: name of the method that loads the attribute
+        :returns: the loaded value
+        """
+        stats = LoadStats(name, nested=bool(self.loading),
+                measure_memory=self.measure_memory)
+        self.loading.append(stats)
+        try:
+            value = self._load_attribute(name, method, stats)
+        finally:
+            self.loading.pop()
+        stats.finish(self.loading[-1] if self.loading else None)
+        self.load_stats.append(stats)
+        return value
+
+    def _load_attribute(self, name, method, stats):
+        """Load a lazy attribute for load_attribute, recording into stats"""
+        codec = self.cached_attributes.get(name)
+        if codec is not None and self.archive_version >= 2:
+            stats.source = 'packed'
+            return codec[1](self.load_packed_arrays(name))
+        entry = self.cache_entry() if codec is not None else None
+        if entry is not None:
+            arrays = entry.load(name)
+            group = [entry.load(member)
+                    for member in self.cache_groups.get(name, ())
+                    if member != name]
+            if arrays is not None and None not in group:
+                stats.source = 'cache'
+                stats.add_arrays(arrays)
+                return codec[1](arrays)
+
+        value = getattr(self, method)()
+        # Values reading the archive on demand are not all loaded yet, and
+        # saving them would read the rest
+        if entry is not None and not getattr(value, 'reads_on_demand', False):
+            # The cache is only an extra, so a value it cannot take is
+            # simply not cached, as with errors writing the cache
+            try:
+                entry.save(name, codec[0](value))
+            except Exception:
+                pass
+        return value
+
+    def load_packed_arrays(self, name):
+        """
+        Load the arrays representing an attribute from a packed archive, where
+        they are stored as name/array.npy members
+        :param name: name of the attribute
+        :returns: dictionary of read-only arrays by name
+        :raises KeyError: if the archive has no arrays for the attribute
+        """
+        prefix = name + '/'
+        members = [member for member in self.archive.namelist()
+                if member.startswith(prefix) and member.endswith('.npy')]
+        if not members:
+            raise KeyError('There are no arrays for {0} in the '
+                    'archive'.format(name))
+        arrays = {}
+        for member in members:
+            info = self.archive.getinfo(member)
+            self.report_progress(member, 0, info.file_size)
+            array = read_array(self.archive, member)
+            arrays[member[len(prefix):-4]] = array
+            self.report_progress(member, info.file_size, info.file_size)
+            self.record_member(member, info.compress_size, info.file_size,
+                    len(array) if array.ndim else 1)
+        return arrays
+
+    def cache_entry(self):
+        """
+        Get the entry of self.cache for self.archive
+        :returns: CacheEntry, or None if there is no cache
+        """
+        if '_cache_entry' not in self.__dict__:
+            filename = getattr(self.archive, 'filename', None)
+            if self.cache is None or filename is None:
+                self._cache_entry = None
+            else:
+                self._cache_entry = self.cache.entry(filename)
+        return self._cache_entry
+
+    def open_member(self, name):
+        """
+        Open a member of self.archive for reading, reporting progress
+        :param name: name of the member in the archive
+        :returns: file object for the member
+        """
+        info = self.archive.getinfo(name)
+        member_file = None
+        if info.file_size >= self.map_size:
+            member_file = map_member(self.archive, name)
+        if member_file is None:
+            member_file = self.archive.open(name, 'r')
+        return MemberFile(member_file, name, info.file_size, self,
+                info.compress_size)
+
+    def record_member(self, name, compressed_bytes, uncompressed_bytes, rows):
+        """
+        Count an archive member read for the attribute being loaded
+        :param name: name of the member
+        :param compressed_bytes: size of the member as stored in the archive
+        :param uncompressed_bytes: number of bytes read from the member
+        :param rows: number of lines or array rows read
+        """
+        if self.loading:
+            self.loading[-1].add_member(name, compressed_bytes,
+                    uncompressed_bytes, rows)
+
+    def report_progress(self, name, bytes_read, size):
+        """
+        Pass progress on to self.progress, checking for cancellation
+        :param name: name of the archive member being read
+        :param bytes_read: number of uncompressed bytes read so far
+        :param size: uncompressed size of the member
+        """
+        if self.cancel_event.is_set():
+            raise LoadCancelledError()
+        if self.progress is not None:
+            self.progress(name, bytes_read, size)
+
+    def validate(self):
+        """
+        Look for structural problems with self.archive before anything is
+        loaded: missing configuration and members, and members whose first
+        and last lines cannot be parsed.  Only samples of the members are
+        read, so this takes milliseconds however large the archive is.
+        :returns: list of descriptions of the problems found, which is empty
+                  if there are none
+        """
+        return []
+
+    def check_member(self, name, check, problems):
+        """
+        Check samples of a member for validate
+        :param name: name of the member
+        :param check: function called as check(head, tail, whole), where
+                      head and tail are as returned by sample_member and
+                      whole says whether head is the whole member, which
+                      raises ValueError describing what is wrong with it
+        :param problems: list to add a description of any problem to
+        """
+        try:
+            head, tail = sample_member(self.archive, name, self.sample_size)
+            whole = len(head) == self.archive.getinfo(name).file_size
+            check(head, tail, whole)
+        except KeyError:
+            problems.append('{0}: missing'.format(name))
+        except ValueError as e:
+            problems.append('{0}: {1}'.format(name, e))
 
     @abstractmethod
     def load(self):
@@ -29,26 +265,113 @@ class DataLoader(object):
         Load data from self.archive
         """
 
+    def close(self):
+        """
+        Close self.archive.  Lazy attributes which have not been loaded yet
+        can no longer be accessed afterwards.
+        """
+        with self.lock:
+            self.archive.close()
+
 
 class DataLoaderFactory(object):
     """ Class that instantiates DataLoader objects """
 
-    def load_data(self, filename):
+    def __init__(self, cache=False, stats=False, **options):
+        """
+        :param cache: ArchiveCache to keep parsed data in, True for the
+                      default ArchiveCache, or False or None, the default,
+                      for no cache
+        :param stats: whether the load_stats of DataLoaders measure peak
+                      memory use, as for reports on loading
+        :param options: keyword arguments passed on to the pipeline's
+                        DataLoader, such as graph_backend for CONCUSS
+        """
+        if cache is True:
+            cache = ArchiveCache()
+        self.cache = cache or None
+        self.stats = stats
+        self.options = options
+
+    def load_data(self, filename, lazy=False, progress=None,
+            cancel_event=None, validate=False):
         """
         Load data from the appropriate DataLoader for given archive filename
-        :param filename: name of zip archive file containing execution data
+        :param filename: name of zip archive file containing execution data,
+                         or of a directory laid out like one
+        :param lazy: if True, leave the archive open and only load each piece
+                     of data when it is first accessed; the caller must then
+                     call close() on the returned DataLoader when done with it
+        :param progress: function called as progress(member name, bytes read,
+                         member size) while archive members are read
+        :param cancel_event: threading.Event which cancels loading when set
+        :param validate: whether to check the archive with
+                         DataLoader.validate before loading anything, as
+                         the visualizer and command line tools do; by
+                         default archives are loaded as they are
         :returns: data returned by pipeline.DataLoader.load_data()
+        :raises InvalidArchiveError: if validate finds problems
         """
-        # Open zip archive as ZipFile object
-        with ZipFile(filename, 'r') as archive:
+        if lazy:
+            archive = open_archive(filename)
+            try:
+                dl = self.data_loader(archive)
+                if validate:
+                    self._validate(dl)
+            except:
+                archive.close()
+                raise
+            self._set_callbacks(dl, progress, cancel_event)
+            return dl
+
+        # Open zip archive as ZipFile object, or directory as DirectoryArchive
+        with open_archive(filename) as archive:
             dl = self.data_loader(archive)
+            if validate:
+                self._validate(dl)
+            self._set_callbacks(dl, progress, cancel_event)
             dl.load()
             return dl
 
+    def validate(self, filename):
+        """
+        Look for structural problems with an archive without loading it
+        :param filename: name of zip archive file containing execution data,
+                         or of a directory laid out like one
+        :returns: list of descriptions of the problems found, which is empty
+                  if there are none
+        """
+        with open_archive(filename) as archive:
+            try:
+                dl = self.data_loader(archive)
+            except KeyError:
+                return ['visinfo.cfg: missing']
+            except (ConfigParser.Error, ValueError) as e:
+                return ['visinfo.cfg: {0}'.format(e)]
+            except UnknownPipelineError as e:
+                return [e.msg]
+            return dl.validate()
+
+    def _validate(self, dl):
+        """Raise InvalidArchiveError if dl.validate finds problems"""
+        problems = dl.validate()
+        if problems:
+            raise InvalidArchiveError(problems)
+
+    def _set_callbacks(self, dl, progress, cancel_event):
+        """
+        Give a DataLoader the cache, progress function and cancel event to use
+        """
+        dl.progress = progress
+        dl.cache = self.cache
+        dl.measure_memory = self.stats
+        if cancel_event is not None:
+            dl.cancel_event = cancel_event
+
     def data_loader(self, archive):
         """
         Create the appropriate DataLoader for the given ZipFile archive
-        :param archive: ZipFile object for archive containing execution data
+        :param archive: ZipFile or DirectoryArchive containing execution data
         :returns: DataLoader for the pipeline that the execution data came from
         """
         # Create config parser.
@@ -66,7 +389,73 @@ class DataLoaderFactory(object):
             
         # Create and return DataLoader object for the given pipeline
         pipe_factory = pipe_loader.Factory()
-        return pipe_factory.create(archive, parser)
+        return pipe_factory.create(archive, parser, **self.options)
+
+
+class MemberFile(object):
+    """
+    File object for an archive member which reports its progress to the
+    DataLoader reading it, so that loading can be followed and cancelled
+    """
+
+    # Number of bytes to read between progress reports
+    report_interval = 1 << 18
+
+    def __init__(self, member_file, name, size, loader, compress_size=None):
+        """
+        :param member_file: file object for the member
+        :param name: name of the member in the archive
+        :param size: uncompressed size of the member
+        :param loader: DataLoader reading the member
+        :param compress_size: size of the member as stored in the archive, or
+                              None if it is the same as size
+        """
+        self.member_file = member_file
+        self.name = name
+        self.size = size
+        self.compress_size = size if compress_size is None else compress_size
+        self.loader = loader
+        self.bytes_read = 0
+        self.bytes_reported = 0
+        self.rows = 0
+        loader.report_progress(name, 0, size)
+
+    def _count(self, data):
+        """Count bytes read, reporting progress every so often and at EOF"""
+        self.bytes_read += len(data)
+        self.rows += data.count('\n')
+        unreported = self.bytes_read - self.bytes_reported
+        if (unreported >= self.report_interval or
+                (unreported > 0 and self.bytes_read >= self.size)):
+            self.bytes_reported = self.bytes_read
+            self.loader.report_progress(self.name, self.bytes_read, self.size)
+        return data
+
+    def read(self, n=-1):
+        return self._count(self.member_file.read(n))
+
+    def readline(self, limit=-1):
+        return self._count(self.member_file.readline(limit))
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def close(self):
+        self.member_file.close()
+        self.loader.record_member(self.name, self.compress_size,
+                self.bytes_read, self.rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
 
 class UnknownPipelineError(Exception):
@@ -84,3 +473,35 @@ class UnknownPipelineError(Exception):
 
     def __str__(self):
         return self.msg
+
+
+class InvalidArchiveError(Exception):
+    """
+    Exception for archives found to be malformed before loading them
+
+    Attributes:
+        problems -- Descriptions of every problem found
+        msg -- Explanation of the error
+    """
+
+    def __init__(self, problems):
+        self.problems = problems
+        self.msg = "Invalid archive:\n" + "\n".join(problems)
+
+    def __str__(self):
+        return self.msg
+
+
+class LoadCancelledError(Exception):
+    """
+    Exception raised inside a DataLoader when loading has been cancelled
+
+    Attributes:
+        msg -- Explanation of the error
+    """
+
+    def __init__(self):
+        self.msg = "Loading cancelled"
+
+    def __str__(self):
+        return self.msg
@@ -0,0 +1,182 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+"""
+Measurements of how loading each piece of data from an archive went
+
+DataLoaders record a LoadStats for every lazy attribute they load, saying
+where it came from, how long it took, how much of the archive was read and,
+when asked to, how far memory use rose meanwhile.  Peak memory is measured
+with the peak resident set size Linux reports, which has to be reset for
+each attribute; elsewhere it is not measured.  It covers this process only,
+not the worker processes which parse large members in parallel.
+"""
+
+import resource
+import time
+
+
+class LoadStats(object):
+    """
+    Measurements of loading one attribute of a DataLoader
+
+    Attributes:
+        name -- name of the attribute
+        source -- 'archive' if it was parsed from the archive, 'cache' if it
+                  was restored from the cache or 'packed' if it was read from
+                  the arrays of a packed archive
+        seconds -- wall time taken, including any attributes loaded on the
+                   way, which get their own LoadStats
+        members -- names of the archive members read
+        compressed_bytes -- bytes of the members as stored in the archive
+        uncompressed_bytes -- bytes of the members once uncompressed, or of
+                              the arrays restored from the cache
+        rows -- lines of text parsed, or rows of arrays restored
+        peak_memory -- largest growth of this process's memory use in bytes
+                       while loading, or None if it was not measured
+        nested -- whether it was loaded while loading another attribute
+    """
+
+    def __init__(self, name, nested=False, measure_memory=False):
+        """
+        :param measure_memory: whether to measure peak_memory, which resets
+                               the process's peak memory use
+        """
+        self.name = name
+        self.source = 'archive'
+        self.nested = nested
+        self.seconds = None
+        self.members = []
+        self.compressed_bytes = 0
+        self.uncompressed_bytes = 0
+        self.rows = 0
+        self.peak_memory = None
+
+        self.start_rss = reset_peak_memory() if measure_memory else None
+        # Largest peak memory use of attributes loaded on the way, which
+        # reset the process's peak
+        self.inner_peak_rss = 0
+        self.start_time = time.time()
+
+    def add_member(self, name, compressed_bytes, uncompressed_bytes, rows):
+        """Count an archive member which was read"""
+        self.members.append(name)
+        self.compressed_bytes += compressed_bytes
+        self.uncompressed_bytes += uncompressed_bytes
+        self.rows += rows
+
+    def add_arrays(self, arrays):
+        """Count the arrays an attribute was restored from"""
+        for array in arrays.itervalues():
+            self.uncompressed_bytes += array.nbytes
+            self.rows += len(array) if array.ndim else 1
+
+    def finish(self, outer=None):
+        """
+        Finish measuring
+        :param outer: LoadStats of the attribute being loaded when this one
+                      was needed, if any
+        """
+        self.seconds = time.time() - self.start_time
+        if self.start_rss is None:
+            return
+        peak_rss = max(peak_memory(), self.inner_peak_rss)
+        self.peak_memory = max(peak_rss - self.start_rss, 0)
+        if outer is not None:
+            outer.inner_peak_rss = max(outer.inner_peak_rss, peak_rss)
+
+    def to_dict(self):
+        """Represent the measurements as a dictionary, as for JSON"""
+        return {
+            'name': self.name,
+            'source': self.source,
+            'nested': self.nested,
+            'seconds': self.seconds,
+            'members': self.members,
+            'compressed_bytes': self.compressed_bytes,
+            'uncompressed_bytes': self.uncompressed_bytes,
+            'rows': self.rows,
+            'peak_memory': self.peak_memory
+        }
+
+
+def summarize(stats):
+    """
+    Total the measurements of loading several attributes
+    :param stats: list of LoadStats
+    :returns: tuple of the total seconds, compressed bytes, uncompressed
+              bytes, rows and the largest peak memory growth (or None)
+    """
+    # Nested loads are already included in the time of the outer ones
+    seconds = sum(s.seconds for s in stats if not s.nested)
+    peaks = [s.peak_memory for s in stats if s.peak_memory is not None]
+    return (seconds, sum(s.compressed_bytes for s in stats),
+            sum(s.uncompressed_bytes for s in stats),
+            sum(s.rows for s in stats), max(peaks) if peaks else None)
+
+
+def format_summary(stats):
+    """Describe the totals of several LoadStats in one line"""
+    seconds, compressed, uncompressed, rows, peak = summarize(stats)
+    summary = '{0:.2f} s, {1:.1f} MB read, {2:,} rows'.format(seconds,
+            uncompressed / 1048576.0, rows)
+    if peak is not None:
+        summary += ', peak +{0:.1f} MB'.format(peak / 1048576.0)
+    return summary
+
+
+def format_report(stats):
+    """Lay out LoadStats as a table, one attribute per line"""
+    def megabytes(n):
+        return '-' if n is None else '{0:.1f}'.format(n / 1048576.0)
+
+    lines = ['{0:<22} {1:<8} {2:>9} {3:>10} {4:>10} {5:>12} {6:>9}'.format(
+        'attribute', 'source', 'seconds', 'stored MB', 'MB', 'rows',
+        'peak MB')]
+    for s in stats:
+        name = ('  ' if s.nested else '') + s.name
+        lines.append('{0:<22} {1:<8} {2:9.3f} {3:>10} {4:>10} {5:12,} '
+                '{6:>9}'.format(name, s.source, s.seconds,
+                    megabytes(s.compressed_bytes),
+                    megabytes(s.uncompressed_bytes), s.rows,
+                    megabytes(s.peak_memory)))
+    seconds, compressed, uncompressed, rows, peak = summarize(stats)
+    lines.append('{0:<22} {1:<8} {2:9.3f} {3:>10} {4:>10} {5:12,} '
+            '{6:>9}'.format('total', '', seconds, megabytes(compressed),
+                megabytes(uncompressed), rows, megabytes(peak)))
+    return '\n'.join(lines)
+
+
+def reset_peak_memory():
+    """
+    Reset the peak memory use Linux reports for this process to its current
+    memory use
+    :returns: the current memory use in bytes, or None if the peak cannot be
+              reset here
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return proc_status('VmHWM')
+    except (IOError, KeyError):
+        return None
+
+
+def peak_memory():
+    """Return the peak memory use of this process in bytes"""
+    try:
+        return proc_status('VmHWM')
+    except (IOError, KeyError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def proc_status(field):
+    """Return a memory size from /proc/self/status in bytes"""
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) * 1024
+    raise KeyError(field)
@@ -7,6 +7,9 @@
 import os
 import webbrowser
 import gc
+import threading
+import traceback
+from functools import partial
 from zipfile import BadZipfile
 
 import wx
@@ -18,8 +21,14 @@ from beavr.concuss.stageinterface import (
     CountInterface,
     CombineInterface
 )
-from beavr.stageinterface import DummyStageInterface
-from beavr.dataloader import DataLoaderFactory, UnknownPipelineError
+from beavr.stageinterface import DummyStageInterface, DeferredStageInterface
+from beavr.loadstats import format_report, format_summary
+from beavr.dataloader import (
+    DataLoaderFactory,
+    InvalidArchiveError,
+    UnknownPipelineError,
+    LoadCancelledError
+)
 
 class MainInterface(wx.Frame):
     """
@@ -32,16 +41,41 @@ class MainInterface(wx.Frame):
 
     doc_url = 'https://github.ncsu.edu/engr-csc-sdc/2016springTeam09/wiki'
 
-    def __init__(self, parent, filename=None):
-        """Create the main window and all its GUI elements"""
+    # DataLoader attributes each tab needs, by tab name
+    stage_attributes = {
+        ColorInterface.name: ('graph', 'colorings'),
+        DecomposeInterface.name: ('graph', 'pattern', 'colorings'),
+        CountInterface.name: ('big_component', 'pattern', 'tdd', 'table',
+            'colorings'),
+        CombineInterface.name: ('pattern', 'colorings',
+            'counts_per_colorset')
+    }
+
+    def __init__(self, parent, filename=None, graph_backend='networkx',
+            load_report=False, cache=True):
+        """
+        Create the main window and all its GUI elements
+        :param load_report: whether to print how loading each archive went
+        :param cache: whether to keep parsed archives in the default
+                      ArchiveCache, so they open faster the next time
+        """
         super(MainInterface, self).__init__(parent, title="BEAVr")
 
+        self.graph_backend = graph_backend
+        self.load_report = load_report
+        self.cache = cache
+
         self.Bind(wx.EVT_CLOSE, self.OnClose)
 
         self._make_menubar()
         self.CreateStatusBar()
 
         self.notebook = wx.Notebook(self, wx.NewId(), style=wx.BK_DEFAULT)
+        self.notebook.Bind(wx.EVT_NOTEBOOK_PAGE_CHANGED, self.OnPageChanged)
+
+        self.dl = None
+        # Event used to cancel the archive load in progress, if any
+        self.load_cancel_event = None
 
         dummy = DummyStageInterface(self.notebook)
         self.add_tab(dummy)
@@ -60,6 +94,13 @@ class MainInterface(wx.Frame):
         fileMenu = wx.Menu()
         fitem = fileMenu.Append(wx.ID_OPEN, help='Open execution data')
         self.Bind(wx.EVT_MENU, self.OnOpen, fitem)
+        fitem = fileMenu.Append(wx.NewId(), 'Open &Directory...',
+                'Open execution data unpacked into a directory')
+        self.Bind(wx.EVT_MENU, self.OnOpenDirectory, fitem)
+        self.cancel_item = fileMenu.Append(wx.NewId(),
+                'Cancel &Loading\tEsc', 'Stop loading execution data')
+        self.cancel_item.Enable(False)
+        self.Bind(wx.EVT_MENU, self.OnCancelLoad, self.cancel_item)
         fileMenu.Append(wx.NewId(), '&Config', 'Configure Pipeline Data')
         fitem = fileMenu.Append(wx.ID_EXIT, help='Quit application')
         self.Bind(wx.EVT_MENU, self.OnQuit, fitem)
@@ -123,8 +164,18 @@ class MainInterface(wx.Frame):
     def OnClose(self, e):
         """Close the main window"""
         self._save_geometry()
+        if self.load_cancel_event is not None:
+            self.load_cancel_event.set()
+        if self.dl is not None:
+            self.dl.close()
         self.Destroy()
 
+    def OnPageChanged(self, e):
+        """Create the interface of a tab the first time it is shown"""
+        if e.GetSelection() != wx.NOT_FOUND:
+            self.realize_tab(self.notebook.GetPage(e.GetSelection()))
+        e.Skip()
+
     def OnOpen(self, e):
         """Open a new set of visualization data"""
         # Create the dialog
@@ -144,48 +195,202 @@ class MainInterface(wx.Frame):
         # run garbage collection to clean up unused objects.
         gc.collect()
 
+    def OnOpenDirectory(self, e):
+        """Open visualization data unpacked into a directory"""
+        dlg = wx.DirDialog(self, defaultPath=os.getcwd(),
+                           style=wx.DD_DEFAULT_STYLE | wx.DD_DIR_MUST_EXIST)
+        if dlg.ShowModal() == wx.ID_OK:
+            self.load_file(dlg.GetPath())
+        dlg.Destroy()
+        gc.collect()
+
+    def OnCancelLoad(self, e):
+        """Cancel the archive load in progress"""
+        if self.load_cancel_event is not None:
+            self.load_cancel_event.set()
+            self.SetStatusText('Cancelling...')
+
     def load_file(self, filename):
-        dlf = DataLoaderFactory()
+        """Start loading an archive in a background thread"""
+        # Only one archive is loaded at a time
+        if self.load_cancel_event is not None:
+            self.load_cancel_event.set()
+        cancel_event = threading.Event()
+        self.load_cancel_event = cancel_event
+        self.cancel_item.Enable(True)
+        self.SetStatusText('Opening ' + os.path.basename(filename))
+
+        thread = threading.Thread(target=self._load_worker,
+                args=(filename, cancel_event))
+        thread.daemon = True
+        thread.start()
+
+    def _load_worker(self, filename, cancel_event):
+        """
+        Load an archive, handing the results to the GUI thread.  This runs in
+        its own thread, so it must only touch the GUI through wx.CallAfter.
+        """
+        def progress(name, bytes_read, size):
+            wx.CallAfter(self.show_load_progress, cancel_event, name,
+                    bytes_read, size)
+
+        def loaded(name):
+            wx.CallAfter(self.realize_loaded_tab, cancel_event)
+
+        dlf = DataLoaderFactory(cache=self.cache, stats=self.load_report,
+                graph_backend=self.graph_backend)
+        dl = None
         try:
-            self.dl = dlf.load_data(filename)
+            dl = dlf.load_data(filename, lazy=True, progress=progress,
+                    cancel_event=cancel_event, validate=True)
+            dl.loaded = loaded
+            # Load what the Color tab needs, then show it right away
+            dl.title_items
+            dl.graph
+            dl.colorings
+            wx.CallAfter(self.show_data, cancel_event, dl)
+            # Keep loading the other stages' data in the background
+            dl.load()
+        except LoadCancelledError:
+            wx.CallAfter(self.finish_load, cancel_event, dl, 'Loading cancelled')
         except (KeyError, BadZipfile) as e:
             print e
-            e_dlg = wx.MessageDialog(None, 'File does not contain valid ' +
-                                     'visualization data', 'Error',
-                                     wx.ICON_ERROR)
-            e_dlg.ShowModal()
-        except UnknownPipelineError as e:
-            e_dlg = wx.MessageDialog(None, e.msg, 'Error', wx.ICON_ERROR)
-            e_dlg.ShowModal()
+            wx.CallAfter(self.finish_load, cancel_event, dl, 'Loading failed',
+                    'File does not contain valid visualization data')
+        except (UnknownPipelineError, InvalidArchiveError) as e:
+            wx.CallAfter(self.finish_load, cancel_event, dl, 'Loading failed',
+                    e.msg)
+        except Exception:
+            traceback.print_exc()
+            wx.CallAfter(self.finish_load, cancel_event, dl, 'Loading failed',
+                    'File does not contain valid visualization data')
         else:
-            # Set the title bar
-            graph_name, pattern_name, config_name = self.dl.title_items
-            title_text = u"BEAVr \u2014 " + graph_name + ", " + pattern_name + " (" + config_name + ")"
-            self.SetTitle(title_text)
-
-            colorStage = ColorInterface(self.notebook)
-            self.remove_all_tabs()
-            self.add_tab(colorStage)
-            colorStage.vis.set_graph(self.dl.graph, self.dl.colorings)
-
-            decomposeStage = DecomposeInterface(self.notebook, self.dl.graph,
-                    self.dl.pattern, self.dl.colorings[-1])
-            self.add_tab(decomposeStage)
-
-            countStage = CountInterface(self.notebook, self.dl.big_component,
-                    self.dl.pattern, self.dl.tdd, self.dl.table, self.dl.colorings[-1])
-            self.add_tab(countStage)
-
-            #TODO: change colorings
-            if self.dl.pattern.number_of_nodes() == 3:
-                colorings = [[0,1,0], [2,3,2],[0,1,2], [3, 4, 5]]
-            elif self.dl.pattern.number_of_nodes() == 4:
-                colorings = [[0, 1, 2, 3], [0, 1, 2, 5], [0, 1, 0, 2], [3, 4, 1, 3]]
-            colors = set(self.dl.colorings[-1])
-            combineStage = CombineInterface(self.notebook, self.dl.pattern,
-                                            colorings, colors, len(min(self.dl.counts_per_colorset.keys(), key=len)),
-                                            self.dl.counts_per_colorset)
-            self.add_tab(combineStage)
+            if self.load_report:
+                print format_report(dl.load_stats)
+            wx.CallAfter(self.finish_load, cancel_event, dl, 'Loaded ' +
+                    os.path.basename(filename) + ' (' +
+                    format_summary(dl.load_stats) + ')')
+
+    def show_load_progress(self, cancel_event, name, bytes_read, size):
+        """Show which archive member is being read in the status bar"""
+        if cancel_event is not self.load_cancel_event:
+            return
+        self.SetStatusText('Loading {0}: {1:.1f} of {2:.1f} MB'.format(name,
+            bytes_read / 1048576.0, size / 1048576.0))
+
+    def show_data(self, cancel_event, dl):
+        """Replace the current tabs with tabs for newly loaded data"""
+        # Ignore loads which were cancelled or superseded
+        if cancel_event is not self.load_cancel_event:
+            return
+
+        # Data for the old archive is no longer needed
+        if self.dl is not None:
+            self.dl.close()
+        self.dl = dl
+
+        # Set the title bar
+        graph_name, pattern_name, config_name = self.dl.title_items
+        title_text = u"BEAVr \u2014 " + graph_name + ", " + pattern_name + " (" + config_name + ")"
+        self.SetTitle(title_text)
+
+        # Each stage is only built when its tab is first shown, so tabs whose
+        # data is still being loaded in the background do not hold us up
+        self.remove_all_tabs()
+        for interface, factory in [(ColorInterface, self.make_color_stage),
+                (DecomposeInterface, self.make_decompose_stage),
+                (CountInterface, self.make_count_stage),
+                (CombineInterface, self.make_combine_stage)]:
+            ready = partial(self.stage_ready, cancel_event,
+                    self.stage_attributes[interface.name])
+            self.add_tab(DeferredStageInterface(self.notebook,
+                interface.name, factory, ready))
+        self.realize_tab(self.notebook.GetPage(0))
+
+    def stage_ready(self, cancel_event, attributes):
+        """
+        Whether a tab can be built without waiting on the background load,
+        which holds the DataLoader's lock while it parses
+        :param cancel_event: cancel event of the load the tab belongs to
+        :param attributes: names of the DataLoader attributes the tab needs
+        """
+        # Once the background load is over, anything it did not get to is
+        # loaded on demand
+        if cancel_event is not self.load_cancel_event:
+            return True
+        return all(self.dl.is_loaded(name) for name in attributes)
+
+    def realize_loaded_tab(self, cancel_event):
+        """Build the shown tab if it was waiting for the data just loaded"""
+        if cancel_event is self.load_cancel_event:
+            self.realize_tab(self.notebook.GetCurrentPage())
+
+    def finish_load(self, cancel_event, dl, status, error=None):
+        """Clean up after the background load of an archive has ended"""
+        if dl is not None and dl is not self.dl:
+            # The data never made it to the screen
+            dl.close()
+        if cancel_event is not self.load_cancel_event:
+            return
+
+        self.load_cancel_event = None
+        self.cancel_item.Enable(False)
+        self.SetStatusText(status)
+        if dl is not None and dl is self.dl:
+            # Whatever was not loaded in the background is loaded on demand
+            cancel_event.clear()
+            self.realize_tab(self.notebook.GetCurrentPage())
+        if error is not None:
+            e_dlg = wx.MessageDialog(None, error, 'Error', wx.ICON_ERROR)
+            e_dlg.ShowModal()
+
+    def realize_tab(self, page):
+        """Create the interface for a deferred tab, reporting load errors"""
+        if not isinstance(page, DeferredStageInterface):
+            return
+        try:
+            page.realize()
+        except LoadCancelledError as e:
+            # The tab will be built next time it is shown
+            self.SetStatusText(e.msg)
+        except (KeyError, BadZipfile) as e:
+            print e
+            self.show_invalid_data_error()
+
+    def show_invalid_data_error(self):
+        """Tell the user that the archive could not be loaded"""
+        e_dlg = wx.MessageDialog(None, 'File does not contain valid ' +
+                                 'visualization data', 'Error',
+                                 wx.ICON_ERROR)
+        e_dlg.ShowModal()
+
+    def make_color_stage(self, parent):
+        """Create the Color tab"""
+        colorStage = ColorInterface(parent)
+        colorStage.set_graph(self.dl.graph, self.dl.colorings)
+        return colorStage
+
+    def make_decompose_stage(self, parent):
+        """Create the Decompose tab"""
+        return DecomposeInterface(parent, self.dl.graph, self.dl.pattern,
+                self.dl.colorings)
+
+    def make_count_stage(self, parent):
+        """Create the Count tab"""
+        return CountInterface(parent, self.dl.big_component, self.dl.pattern,
+                self.dl.tdd, self.dl.table, self.dl.colorings[-1])
+
+    def make_combine_stage(self, parent):
+        """Create the Combine tab"""
+        #TODO: change colorings
+        if self.dl.pattern.number_of_nodes() == 3:
+            colorings = [[0,1,0], [2,3,2],[0,1,2], [3, 4, 5]]
+        elif self.dl.pattern.number_of_nodes() == 4:
+            colorings = [[0, 1, 2, 3], [0, 1, 2, 5], [0, 1, 0, 2], [3, 4, 1, 3]]
+        colors = self.dl.colorings.color_set(-1)
+        return CombineInterface(parent, self.dl.pattern, colorings, colors,
+                int(self.dl.counts_per_colorset.sizes().min()),
+                self.dl.counts_per_colorset)
 
     def OnQuit(self, e):
         """Quit the application"""
@@ -0,0 +1,102 @@
+#
+# This file is part of BEAVr, https://github.com/theoryinpractice/beavr/, and is
+# Copyright (C) North Carolina State University, 2016. It is licensed under
+# the three-clause BSD license; see LICENSE.
+#
+
+"""
+Conversion of pipeline execution data into packed archives
+
+A packed archive is a zip archive announcing version 2 in the [archive]
+section of its visinfo.cfg.  Instead of the text files the pipeline wrote, it
+holds each piece of data a DataLoader caches as the arrays representing it,
+one .npy member per array, named like
+
+    colorings/delta_vertices.npy
+
+For CONCUSS these are the host graph in CSR form, the coloring deltas and
+keyframes, the TDD's edges to parents, the DP table by column and the color
+set bitmasks with their counts.  Members are stored uncompressed and aligned,
+so opening a packed archive memory-maps the arrays instead of parsing
+anything.  The configuration files of the run are copied as they are.
+
+Run with: beavr pack SOURCE DESTINATION [--compress]
+"""
+
+import argparse
+import sys
+from cStringIO import StringIO
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from beavr.archive import open_archive, packed_version, write_array
+from beavr.dataloader import DataLoaderFactory, InvalidArchiveError, \
+        UnknownPipelineError
+
+
+def pack(source, destination, compress=False, progress=None,
+        validate=False, **options):
+    """
+    Write a packed archive of pipeline execution data
+    :param source: name of a zip archive or directory holding the data
+    :param destination: name of the packed archive to write
+    :param compress: whether to deflate the arrays, which makes the archive
+                     smaller but means they are read rather than mapped
+    :param progress: function called as progress(member name, size) after
+                     each member is written
+    :param validate: whether to check the source with DataLoader.validate
+                     first
+    :param options: keyword arguments passed on to the pipeline's DataLoader
+    :raises InvalidArchiveError: if validate finds problems
+    """
+    dl = DataLoaderFactory(cache=False, **options).load_data(source,
+            lazy=True, validate=validate)
+    try:
+        with ZipFile(destination, 'w', allowZip64=True) as out:
+            # The configuration, announcing the new layout
+            dl.parser.remove_section('archive')
+            dl.parser.add_section('archive')
+            dl.parser.set('archive', 'version', str(packed_version))
+            visinfo = StringIO()
+            dl.parser.write(visinfo)
+            out.writestr('visinfo.cfg', visinfo.getvalue(), ZIP_DEFLATED)
+            for name in dl.archive.namelist():
+                if name.endswith('.cfg') and name != 'visinfo.cfg':
+                    out.writestr(name, dl.archive.read(name), ZIP_DEFLATED)
+
+            for name in sorted(dl.cached_attributes):
+                to_arrays = dl.cached_attributes[name][0]
+                arrays = to_arrays(getattr(dl, name))
+                for array_name in sorted(arrays):
+                    member = '{0}/{1}.npy'.format(name, array_name)
+                    write_array(out, member, arrays[array_name], compress)
+                    if progress is not None:
+                        progress(member, out.getinfo(member).compress_size)
+    finally:
+        dl.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='beavr pack',
+            description='Convert pipeline execution data into a packed '
+            'archive, which opens without parsing')
+    parser.add_argument('source',
+            help='zip archive or directory holding the execution data')
+    parser.add_argument('destination', help='packed archive to write')
+    parser.add_argument('--compress', action='store_true',
+            help='deflate the arrays; smaller, but slower to open')
+    args = parser.parse_args(argv)
+
+    def report(member, size):
+        print '{0:<40} {1:10.1f} MB'.format(member, size / 1048576.0)
+        sys.stdout.flush()
+
+    # Keep a large host graph in CSR form while packing it
+    try:
+        pack(args.source, args.destination, args.compress, report,
+                validate=True, graph_backend='csr')
+    except (InvalidArchiveError, UnknownPipelineError) as e:
+        parser.exit(1, '{0}: {1}\n'.format(parser.prog, e.msg))
+
+
+if __name__ == '__main__':
+    main()
@@ -79,6 +79,64 @@ class DummyStageInterface(StageInterface):
 
         self.tb.Realize()
 
+class DeferredStageInterface(wx.Panel):
+    """
+    Placeholder for a stage interface that is created when first shown.
+
+    The real interface is built by calling factory(parent) with this panel as
+    the parent, so the data it visualizes is only needed once the user looks
+    at its tab.  While that data is still being loaded in the background, the
+    panel says so instead, and realize has to be called again once it is
+    loaded.
+    """
+
+    def __init__(self, parent, name, factory, ready=None):
+        """
+        Create an empty panel which will hold the real interface
+        :param ready: function returning whether the interface can be built
+                      without waiting for data, or None if it always can
+        """
+        super(DeferredStageInterface, self).__init__(parent)
+
+        self.name = name
+        self.factory = factory
+        self.ready = ready
+        self.interface = None
+        self.placeholder = None
+
+        self.sizer = wx.BoxSizer(wx.HORIZONTAL)
+        self.SetSizer(self.sizer)
+
+    def realize(self):
+        """
+        Create the real interface, unless that was already done or its data
+        is still being loaded
+        :returns: the interface, or None if its data is still being loaded
+        """
+        if self.interface is None:
+            if self.ready is not None and not self.ready():
+                self.show_placeholder()
+                return None
+            if self.placeholder is not None:
+                # Remove the placeholder and the spacers around it
+                self.sizer.Clear(True)
+                self.placeholder = None
+            busy = wx.BusyCursor()
+            self.interface = self.factory(self)
+            self.sizer.Add(self.interface, 1, wx.EXPAND)
+            self.Layout()
+        return self.interface
+
+    def show_placeholder(self):
+        """Say that the data of this tab is still being loaded"""
+        if self.placeholder is None:
+            self.placeholder = wx.StaticText(self,
+                    label="Loading {0} data...".format(self.name))
+            self.sizer.AddStretchSpacer()
+            self.sizer.Add(self.placeholder, 0, wx.ALIGN_CENTER)
+            self.sizer.AddStretchSpacer()
+            self.Layout()
+
 class StageVisualizer(wx.Panel):
     """Base class for visualizing a particular stage of a pipeline"""
 
@@ -4,7 +4,11 @@
 # the three-clause BSD license; see LICENSE.
 #
 
+from collections import deque
+from multiprocessing import Pool, cpu_count
+
 import pkg_resources
+import numpy
 
 def load_palette(palette_filename):
     """Load colors from palette, map colorings to palette colors"""
@@ -39,6 +43,12 @@ def map_coloring(palette, coloring):
     return mapped_coloring
 
 
+def map_coloring_array(palette, coloring):
+    """Map array of colors to an array of palette RGB colors, one per row"""
+    palette = numpy.asarray(palette)
+    return palette[numpy.asarray(coloring) % len(palette)]
+
+
 def choose(n, m):
     """ Choose m elements from n elements """
     assert n >= m, "Cannot choose {0} elements from {1}".format(m, n)
@@ -47,3 +57,55 @@ def choose(n, m):
         result *= n_i
         result /= m_i
     return result
+
+
+def parallel_imap(func, args, processes=None, max_pending=None):
+    """
+    Map func over args in a pool of worker processes
+
+    func must be a module-level function so it can be sent to the workers.
+    Results are yielded in the same order as args.  The pool is shut down
+    when the results run out or the caller stops iterating over them.
+
+    If max_pending is given, at most that many args are handed to the workers
+    before their results are taken, so args can be a generator of large items
+    without all of them being read into memory at once.
+    """
+    pool = Pool(processes or cpu_count())
+    try:
+        if max_pending is None:
+            for result in pool.imap(func, args):
+                yield result
+        else:
+            pending = deque()
+            for arg in args:
+                if len(pending) >= max_pending:
+                    yield pending.popleft().get()
+                pending.append(pool.apply_async(func, (arg,)))
+            while pending:
+                yield pending.popleft().get()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def iter_line_chunks(input_file, chunk_size=1 << 22):
+    """
+    Read a file in chunks of whole lines
+    :param input_file: file object to read
+    :param chunk_size: number of bytes to read at once
+    :returns: iterator over strings, each ending at the end of a line except
+              perhaps the last
+    """
+    remainder = ''
+    while True:
+        data = input_file.read(chunk_size)
+        if not data:
+            break
+        data = remainder + data
+        end = data.rfind('\n') + 1
+        remainder = data[end:]
+        if end > 0:
+            yield data[:end]
+    if remainder:
+        yield remainder
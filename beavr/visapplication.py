@@ -19,8 +19,20 @@ class VisApplication(wx.App):
         parser = argparse.ArgumentParser()
 
         parser.add_argument('data',
-                            help='filename of the pipeline execution data',
+                            help='filename of the pipeline execution data, '
+                            'or a directory it has been unpacked into',
                             type=str, nargs='?', default=None)
+        parser.add_argument('--graph-backend', choices=['networkx', 'csr'],
+                            default='networkx',
+                            help='how to store the host graph; csr takes '
+                            'far less memory for large graphs')
+        parser.add_argument('--load-report', action='store_true',
+                            help='print the time, bytes, rows and peak '
+                            'memory of this process taken to load each '
+                            'piece of data')
+        parser.add_argument('--no-cache', dest='cache', action='store_false',
+                            help='parse archives every time rather than '
+                            'keeping parsed data in ~/.cache/beavr')
 
         args = parser.parse_args()
 
@@ -29,7 +41,9 @@ class VisApplication(wx.App):
         wx.ConfigBase.Set(self.config)
 
         # Create and show the main window
-        self.frame = MainInterface(None, filename=args.data)
+        self.frame = MainInterface(None, filename=args.data,
+                graph_backend=args.graph_backend,
+                load_report=args.load_report, cache=args.cache)
         self.SetTopWindow(self.frame)
         self.frame.Show()
 
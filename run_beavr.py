@@ -5,7 +5,7 @@
 # the three-clause BSD license; see LICENSE.
 #
 
-from beavr.visapplication import run
+from beavr.commands import main
 
 if __name__ == '__main__':
-    run()
+    main()
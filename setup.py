@@ -6,6 +6,8 @@
 
 from setuptools import setup
 
+from beavr import __version__
+
 # Convert README from Markdown to reStructuredText.  This requires the pypandoc
 # module; if this module is not present the long_description will be empty so
 # make sure you have it when creating packages for PyPI.
@@ -17,7 +19,7 @@ except (IOError, ImportError):
 
 setup(
     name = "BEAVr",
-    version = "1.0",
+    version = __version__,
     author = "Yang Ho, Clayton G. Hobbs, Brandon Mork, Felix Reidl, "
         "Nishant Rodrigues, Blair Sullivan",
     author_email = "blair_sullivan@ncsu.edu",
@@ -25,7 +27,7 @@ setup(
     license = "BSD",
     keywords = "concuss graph network visualization",
     url = "https://www.github.com/theoryinpractice/BEAVr",
-    packages = ["beavr", "beavr.concuss"],
+    packages = ["beavr", "beavr.concuss", "beavr.bench"],
     long_description = long_description,
     classifiers = [
         "Development Status :: 5 - Production/Stable",
@@ -45,7 +47,8 @@ setup(
     },
     entry_points = {
         "console_scripts": [
-            "beavr=beavr.visapplication:run"
+            "beavr=beavr.commands:main",
+            "beavr-bench=beavr.bench.suite:main"
         ]
     }
 )
@@ -5,10 +5,832 @@
 #
 
 import unittest
+import ast
+import mmap
+import re
+import os
+import os.path as path
+import threading
+import shutil
+import sys
+import tempfile
+from cStringIO import StringIO
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
 
 import networkx as nx
+import numpy as np
+
+from beavr.concuss import visualizerbackend, dataloader, batch
+from beavr.concuss.coloringhistory import ColoringHistory, \
+        LazyColoringHistory
+from beavr.concuss.vertexids import VertexIds
+from beavr.concuss.colorindex import ColorIndex
+from beavr.concuss.components import IncrementalComponents
+from beavr.concuss.colorsets import ColorsetCounts, read_colorset_counts
+from beavr.concuss import dptable, graphreaders
+from beavr.bench.dptable import legacy_read_dp_table
+from beavr.bench.edgelist import legacy_read_edgelist, legacy_read_leda, \
+        write_leda, SizedStringIO
+from beavr.bench.gml import legacy_read_gml
+from beavr.bench import suite as bench_suite
+from beavr.bench.synthetic import generate as generate_synthetic
+from beavr.bench.xmlgraph import write_gexf, write_graphml
+from beavr.dataloader import DataLoaderFactory, InvalidArchiveError, \
+        LoadCancelledError, UnknownPipelineError
+from beavr.archive import map_member, open_archive
+from beavr.pack import pack, main as pack_main
+from beavr.cache import ArchiveCache, directory_size
+from beavr.csrgraph import CSRGraph
+
+# Directory holding the CONCUSS archives used for testing
+archive_dir = path.join(path.dirname(path.dirname(path.abspath(__file__))),
+        'testing', 'concuss')
+
+def edge_set(graph):
+    """Get the edges of an undirected graph, whichever way round they are"""
+    return set(frozenset(edge) for edge in graph.edges())
+
+class TestConcussDataLoader(unittest.TestCase):
+
+    def setUp(self):
+        """ Sets up the necessary objects to run"""
+        self.filename = path.join(archive_dir, 'karate_p4.zip')
+        self.dlf = DataLoaderFactory(cache=False)
+
+    def test_lazy_load(self):
+        eager = self.dlf.load_data(self.filename)
+        lazy = self.dlf.load_data(self.filename, lazy=True)
+        try:
+            # Nothing has been loaded yet
+            for name in lazy.lazy_attributes:
+                self.assertFalse(name in lazy.__dict__,
+                        msg='{0} loaded too early'.format(name))
+            # Loading one attribute does not load the others
+            self.assertEquals(lazy.tdd.edges(), eager.tdd.edges())
+            self.assertTrue('tdd' in lazy.__dict__)
+            self.assertFalse('table' in lazy.__dict__)
+            # Lazily loaded data matches eagerly loaded data
+            self.assertEquals(lazy.table.keys(), eager.table.keys())
+            self.assertEquals(lazy.table.counts.tolist(),
+                    eager.table.counts.tolist())
+            self.assertEquals(lazy.counts_per_colorset.to_dict(),
+                    eager.counts_per_colorset.to_dict())
+            self.assertEquals([c.tolist() for c in lazy.colorings],
+                    [c.tolist() for c in eager.colorings])
+            self.assertEquals(len(lazy.colorings), 5)
+            # Loaded values are memoized
+            self.assertTrue(lazy.table is lazy.table)
+        finally:
+            lazy.close()
+
+    def test_loaded_callback(self):
+        lazy = self.dlf.load_data(self.filename, lazy=True)
+        try:
+            loaded = []
+            lazy.loaded = loaded.append
+            self.assertFalse(lazy.is_loaded('tdd'))
+            lazy.tdd
+            self.assertTrue(lazy.is_loaded('tdd'))
+            # Attributes loaded along the way are reported too
+            self.assertEquals(loaded[-1], 'tdd')
+            self.assertTrue(all(lazy.is_loaded(name) for name in loaded))
+        finally:
+            lazy.close()
+
+    def test_load_progress(self):
+        progress = []
+        def record(name, bytes_read, size):
+            progress.append((name, bytes_read, size))
+        self.dlf.load_data(self.filename, progress=record)
+        # Every member we read is reported as read completely
+        names = set(name for name, _, _ in progress)
+        self.assertTrue('count/dp_table.txt' in names)
+        self.assertTrue('color/colorings/4' in names)
+        for name in names:
+            last = [p for p in progress if p[0] == name][-1]
+            self.assertEquals(last[1], last[2],
+                    msg='{0} not completely read'.format(name))
+
+    def test_parallel_colorings(self):
+        filename = path.join(archive_dir, 'netscience_p4.zip')
+        serial = self.dlf.load_data(filename, lazy=True)
+        parallel = self.dlf.load_data(filename, lazy=True)
+        try:
+            parallel.parallel_colorings_size = 0
+            parallel.processes = 2
+            self.assertEquals(len(parallel.colorings), 7)
+            for s_col, p_col in zip(serial.colorings, parallel.colorings):
+                self.assertEquals(s_col.tolist(), p_col.tolist())
+        finally:
+            serial.close()
+            parallel.close()
+
+    def test_lazy_colorings(self):
+        filename = path.join(archive_dir, 'netscience_p4.zip')
+        eager = self.dlf.load_data(filename)
+        directory = tempfile.mkdtemp()
+        try:
+            dlf = DataLoaderFactory(cache=ArchiveCache(directory))
+            lazy = dlf.load_data(filename, lazy=True)
+            lazy.lazy_colorings_size = 0
+            lazy.load()
+            self.assertTrue(isinstance(lazy.colorings, LazyColoringHistory))
+            # No step is read until it is needed
+            stats = dict((s.name, s) for s in lazy.load_stats)
+            self.assertEquals(stats['colorings'].members, [])
+            self.assertEquals(lazy.colorings[-1].tolist(),
+                    eager.colorings[-1].tolist())
+            self.assertEquals([c.tolist() for c in lazy.colorings],
+                    [c.tolist() for c in eager.colorings])
+            for step in range(len(eager.colorings)):
+                self.assertEquals(lazy.colorings.changed_vertices(step)
+                        .tolist(), eager.colorings.changed_vertices(step)
+                        .tolist())
+            # Saving the colorings to the cache would read every step
+            entry = dlf.cache.entry(filename)
+            self.assertFalse('colorings' in os.listdir(entry.directory))
+            self.assertTrue('table' in os.listdir(entry.directory))
+            lazy.close()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_parse_coloring(self):
+        coloring = dataloader.parse_coloring('0: 3\n2: 1\n\n1: 2\n')
+        self.assertEquals(coloring.tolist(), [3, 2, 1])
+        # Lines without colors are skipped, missing nodes get color 0
+        coloring = dataloader.parse_coloring('# colors\n3: 1\n0: 2\n')
+        self.assertEquals(coloring.tolist(), [2, 0, 0, 1])
+
+    def test_sparse_vertex_ids(self):
+        # Rewrite the archive with huge, sparse vertex ids; everything is
+        # still numbered by the original dense ids
+        def sparse(match):
+            return str(int(match.group(0)) * 1000003 + (1 << 40))
+        vertex = re.compile(r'\d+')
+        temp_dir = tempfile.mkdtemp()
+        try:
+            filename = path.join(temp_dir, 'sparse.zip')
+            with ZipFile(self.filename, 'r') as archive, \
+                    ZipFile(filename, 'w') as out:
+                for name in archive.namelist():
+                    data = archive.read(name)
+                    if name in ['karate.txt', 'count/big_component.txt',
+                            'count/tdd.txt']:
+                        data = vertex.sub(sparse, data)
+                    elif name.startswith('color/colorings/'):
+                        data = re.sub(r'(?m)^\d+', sparse, data)
+                    elif name == 'count/dp_table.txt':
+                        data = re.sub(r'(?m)^\[.*\{$',
+                                lambda m: vertex.sub(sparse, m.group(0)), data)
+                    out.writestr(name, data)
+
+            expected = self.dlf.load_data(self.filename)
+            loaded = self.dlf.load_data(filename)
+            self.assertEquals(loaded.vertex_ids.ids.tolist(),
+                    [v * 1000003 + (1 << 40) for v in range(34)])
+            self.assertEquals(sorted(loaded.graph.edges()),
+                    sorted(expected.graph.edges()))
+            self.assertEquals(sorted(loaded.big_component.edges()),
+                    sorted(expected.big_component.edges()))
+            self.assertEquals(sorted(loaded.tdd.edges()),
+                    sorted(expected.tdd.edges()))
+            self.assertEquals(loaded.table.keys(), expected.table.keys())
+            self.assertEquals([c.tolist() for c in loaded.colorings],
+                    [c.tolist() for c in expected.colorings])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_vertex_ids(self):
+        vertex_ids = VertexIds.from_vertices([70, 5, 1 << 50, 5])
+        self.assertFalse(vertex_ids.identity)
+        self.assertEquals(vertex_ids.index([[1 << 50, 5]]).tolist(), [[2, 0]])
+        self.assertEquals(vertex_ids.external([1, 2]).tolist(),
+                [70, 1 << 50])
+        with self.assertRaises(ValueError):
+            vertex_ids.index([6])
+        self.assertEquals(vertex_ids.contains([[70, 6, -1]]).tolist(),
+                [[True, False, False]])
+        coloring = dataloader.parse_coloring('70: 3\n5: 1\n', vertex_ids)
+        self.assertEquals(coloring.tolist(), [1, 3, 0])
+        # Colors of vertices which are not in the host graph are left out
+        coloring = dataloader.parse_coloring('70: 3\n6: 2\n5: 1\n',
+                vertex_ids)
+        self.assertEquals(coloring.tolist(), [1, 3, 0])
+        self.assertTrue(VertexIds.from_vertices([2, 0, 1]).identity)
+        with self.assertRaises(ValueError):
+            VertexIds.from_vertices([2, 0, 1]).index([3])
+
+    def test_coloring_step_order(self):
+        names = ['color/colorings/{0}'.format(i) for i in range(12)]
+        self.assertEquals(sorted(reversed(names),
+                key=dataloader.coloring_step_key), names)
+
+    def test_read_dp_table(self):
+        for name in ['karate_k3.zip', 'karate_p4.zip', 'netscience_p4.zip']:
+            with ZipFile(path.join(archive_dir, name), 'r') as archive:
+                data = archive.read('count/dp_table.txt')
+            expected = legacy_read_dp_table(StringIO(data))
+            # Small chunks make blocks span several reads
+            for chunk_size in [64, 1 << 22]:
+                table = dptable.read_dp_table(StringIO(data), chunk_size)
+                self.assertEquals(sorted(table.keys()), sorted(expected),
+                        msg='Wrong DP table for {0}'.format(name))
+                for key, rows in expected.iteritems():
+                    self.assertEquals(table[key], rows,
+                            msg='Wrong DP table for {0}'.format(name))
+
+    def test_dp_table_columns(self):
+        data = ('[3, 1] {\n\t1; []; []\n\t5; [0, 2]; [2:0]\n}\n'
+                '[3] {\n\t2; [1, 2]; [1:0, 2:1]\n}\n')
+        table = dptable.read_dp_table(StringIO(data))
+        self.assertEquals(len(table), 2)
+        self.assertTrue((3, 1) in table)
+        self.assertFalse((1, 3) in table)
+        self.assertEquals(table.row_range((3,)), (2, 3))
+        self.assertEquals(table.counts.tolist(), [1, 5, 2])
+        self.assertEquals(table.vertex_masks.tolist(), [0, 5, 6])
+        self.assertEquals(table[(3, 1)], [[1, [], {}], [5, [0, 2], {2: 0}]])
+        self.assertEquals(table[(3,)], [[2, [1, 2], {1: 0, 2: 1}]])
+
+    def test_read_bad_dp_table(self):
+        for data in ['[1] {\n\t1; [0]; [0:0]\n', '[1] {\n\t1; [0; [0:0]\n}',
+                '[1] {\n\t1; [0]; [0:x]\n}', '[1] {\n\t[0]; [0:0]\n}']:
+            with self.assertRaises(ValueError):
+                dptable.read_dp_table(StringIO(data))
+
+    def test_load_cancelled(self):
+        cancel_event = threading.Event()
+        cancel_event.set()
+        with self.assertRaises(LoadCancelledError):
+            self.dlf.load_data(self.filename, cancel_event=cancel_event)
+
+    def tearDown(self):
+        """Cleans up after tests are run"""
+
+
+class TestArchiveCache(unittest.TestCase):
+
+    def setUp(self):
+        """ Sets up the necessary objects to run"""
+        self.directory = tempfile.mkdtemp()
+        self.cache = ArchiveCache(self.directory)
+        self.dlf = DataLoaderFactory(cache=self.cache)
+
+    def test_restore_from_cache(self):
+        filename = path.join(archive_dir, 'karate_p4.zip')
+        parsed = self.dlf.load_data(filename)
+        entry = self.cache.entry(filename)
+        self.assertEquals(sorted(os.listdir(entry.directory)),
+                sorted(dataloader.ConcussDataLoader.cached_attributes))
+
+        # Data is now restored from the cache rather than parsed
+        restored = self.dlf.load_data(filename, lazy=True)
+        restored.load_graph = None
+        self.assertEquals(sorted(restored.graph.edges()),
+                sorted(parsed.graph.edges()))
+        restored.close()
+
+        restored = self.dlf.load_data(filename)
+        self.assertEquals(sorted(restored.tdd.edges()),
+                sorted(parsed.tdd.edges()))
+        self.assertTrue(restored.tdd.is_directed())
+        self.assertEquals(restored.counts_per_colorset.to_dict(),
+                parsed.counts_per_colorset.to_dict())
+        self.assertEquals([c.tolist() for c in restored.colorings],
+                [c.tolist() for c in parsed.colorings])
+        for key in parsed.table.keys():
+            self.assertEquals(restored.table[key], parsed.table[key])
+
+    def test_csr_graph_backend(self):
+        filename = path.join(archive_dir, 'karate_p4.zip')
+        expected = DataLoaderFactory(cache=False).load_data(filename).graph
+        dlf = DataLoaderFactory(cache=self.cache, graph_backend='csr')
+        for _ in range(2):
+            # Parsed the first time, memory-mapped from the cache the second
+            graph = dlf.load_data(filename).graph
+            self.assertTrue(isinstance(graph, CSRGraph))
+            self.assertEquals(graph.nodes(), sorted(expected.nodes()))
+            self.assertEquals(graph.number_of_edges(),
+                    expected.number_of_edges())
+        self.assertTrue(isinstance(graph.neighbors_array, np.memmap))
+
+    def test_cache_groups(self):
+        filename = path.join(archive_dir, 'karate_p4.zip')
+        parsed = self.dlf.load_data(filename)
+        entry = self.cache.entry(filename)
+        shutil.rmtree(path.join(entry.directory, 'graph'))
+
+        # The vertex ids are not restored without the graph, and both come
+        # from one parse of the graph's file
+        loaded = self.dlf.load_data(filename, lazy=True)
+        reads = []
+        read_host_graph_arrays = loaded.read_host_graph_arrays
+        loaded.read_host_graph_arrays = lambda: reads.append(1) or \
+                read_host_graph_arrays()
+        self.assertEquals(sorted(loaded.graph.edges()),
+                sorted(parsed.graph.edges()))
+        self.assertEquals(len(reads), 1)
+        stats = dict((s.name, s) for s in loaded.load_stats)
+        self.assertEquals(stats['vertex_ids'].source, 'archive')
+        loaded.close()
+
+    def test_load_stats(self):
+        filename = path.join(archive_dir, 'karate_p4.zip')
+        parsed = self.dlf.load_data(filename)
+        stats = dict((s.name, s) for s in parsed.load_stats)
+        self.assertEquals(sorted(stats),
+                sorted(dataloader.ConcussDataLoader.lazy_attributes))
+        # The vertex ids are found while loading the graph, from its file
+        self.assertTrue(stats['vertex_ids'].nested)
+        self.assertEquals(stats['vertex_ids'].members, ['karate.txt'])
+        self.assertEquals(stats['vertex_ids'].rows, 78)
+        self.assertFalse(stats['graph'].nested)
+        self.assertTrue(stats['graph'].seconds >= stats['vertex_ids'].seconds)
+        self.assertEquals(stats['colorings'].members,
+                ['color/colorings/{0}'.format(i) for i in range(5)])
+        with ZipFile(filename) as archive:
+            info = archive.getinfo('count/dp_table.txt')
+        self.assertEquals(stats['table'].compressed_bytes, info.compress_size)
+        self.assertEquals(stats['table'].uncompressed_bytes, info.file_size)
+        for s in parsed.load_stats:
+            self.assertEquals(s.source, 'archive')
+            # Peak memory is only measured when asked for
+            self.assertEquals(s.peak_memory, None)
+        measured = DataLoaderFactory(stats=True).load_data(filename)
+        for s in measured.load_stats:
+            self.assertTrue(s.peak_memory is None or s.peak_memory >= 0)
+
+        restored = self.dlf.load_data(filename)
+        stats = dict((s.name, s) for s in restored.load_stats)
+        self.assertEquals(stats['table'].source, 'cache')
+        self.assertEquals(stats['table'].members, [])
+        self.assertEquals(stats['table'].uncompressed_bytes,
+                sum(a.nbytes for a in
+                    restored.table.to_arrays().itervalues()))
+        self.assertEquals(stats['title_items'].source, 'archive')
+
+    def test_key(self):
+        filename = path.join(self.directory, 'karate_p4.zip')
+        shutil.copy(path.join(archive_dir, 'karate_p4.zip'), filename)
+        key = self.cache.key(filename)
+        self.assertEquals(self.cache.key(path.join(self.directory, '.',
+            'karate_p4.zip')), key)
+        # A copy elsewhere, or the same file once modified, gets a new key
+        self.assertNotEquals(self.cache.key(path.join(archive_dir,
+            'karate_p4.zip')), key)
+        os.utime(filename, (0, 12345))
+        self.assertNotEquals(self.cache.key(filename), key)
+
+        # Verified entries notice changed contents with the same size and
+        # modification time, and start over
+        self.cache.verify = True
+        self.dlf.load_data(filename)
+        entry = self.cache.entry(filename)
+        self.assertTrue('graph' in os.listdir(entry.directory))
+        with open(filename, 'r+b') as archive_file:
+            archive_file.seek(-1, os.SEEK_END)
+            last = archive_file.read(1)
+            archive_file.seek(-1, os.SEEK_END)
+            archive_file.write(chr(ord(last) ^ 1))
+        os.utime(filename, (0, 12345))
+        entry = self.cache.entry(filename)
+        self.assertEquals(os.listdir(entry.directory), ['digest'])
+
+    def test_cache_failure(self):
+        # Data the cache cannot take is still loaded
+        filename = path.join(archive_dir, 'karate_p4.zip')
+        dl = self.dlf.load_data(filename, lazy=True)
+        try:
+            def fail(value):
+                raise ValueError('Cannot convert')
+            dl.cached_attributes = dict(dl.cached_attributes,
+                    tdd=(fail, None))
+            self.assertEquals(sorted(dl.tdd.edges()), sorted(
+                DataLoaderFactory().load_data(filename).tdd.edges()))
+            self.assertFalse('tdd' in os.listdir(dl.cache_entry().directory))
+        finally:
+            dl.close()
+        self.assertEquals(DataLoaderFactory().cache, None)
+
+    def test_evict(self):
+        self.dlf.load_data(path.join(archive_dir, 'karate_p4.zip'))
+        size = directory_size(self.directory)
+        # The most recently used entry is kept even if it is too big
+        self.cache.max_size = size - 1
+        self.dlf.load_data(path.join(archive_dir, 'netscience_p4.zip'))
+        self.assertEquals(len(os.listdir(self.directory)), 1)
+        self.assertTrue(directory_size(self.directory) > size)
+
+    def tearDown(self):
+        """Cleans up after tests are run"""
+        shutil.rmtree(self.directory)
+
+
+class TestArchives(unittest.TestCase):
+
+    def setUp(self):
+        """ Sets up the necessary objects to run"""
+        self.filename = path.join(archive_dir, 'karate_p4.zip')
+        self.directory = tempfile.mkdtemp()
+        self.dlf = DataLoaderFactory(cache=False)
+        self.expected = self.dlf.load_data(self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertLoadsSame(self, dl):
+        self.assertEquals(sorted(dl.graph.edges()),
+                sorted(self.expected.graph.edges()))
+        self.assertEquals(sorted(dl.tdd.edges()),
+                sorted(self.expected.tdd.edges()))
+        self.assertEquals(dl.table.keys(), self.expected.table.keys())
+        self.assertEquals(dl.counts_per_colorset.to_dict(),
+                self.expected.counts_per_colorset.to_dict())
+        self.assertEquals([c.tolist() for c in dl.colorings],
+                [c.tolist() for c in self.expected.colorings])
+
+    def test_directory(self):
+        unpacked = path.join(self.directory, 'karate')
+        with ZipFile(self.filename, 'r') as archive:
+            archive.extractall(unpacked)
+            names = sorted(name for name in archive.namelist()
+                    if not name.endswith('/'))
+        directory = open_archive(unpacked)
+        self.assertEquals(sorted(directory.namelist()), names)
+        self.assertEquals(directory.getinfo('count/tdd.txt').file_size,
+                path.getsize(path.join(unpacked, 'count', 'tdd.txt')))
+        with self.assertRaises(KeyError):
+            directory.getinfo('count/missing.txt')
+
+        self.assertLoadsSame(self.dlf.load_data(unpacked))
+        # Large members are memory-mapped, and workers read the colorings
+        # from the directory too
+        dl = self.dlf.load_data(unpacked, lazy=True)
+        try:
+            dl.map_size = 0
+            dl.parallel_colorings_size = 0
+            dl.processes = 2
+            self.assertLoadsSame(dl)
+        finally:
+            dl.close()
+
+        # Directories are cached by their contents
+        cache = ArchiveCache(path.join(self.directory, 'cache'))
+        key = cache.key(unpacked)
+        self.assertEquals(cache.key(unpacked), key)
+        with open(path.join(unpacked, 'count', 'tdd.txt'), 'a') as tdd_file:
+            tdd_file.write('\n')
+        self.assertNotEquals(cache.key(unpacked), key)
+
+    def test_packed(self):
+        for name in ['karate_p4.zip', 'netscience_p4.zip']:
+            filename = path.join(archive_dir, name)
+            expected = self.dlf.load_data(filename)
+            for compress in [False, True]:
+                packed = path.join(self.directory, 'packed.zip')
+                pack(filename, packed, compress)
+                for backend in ['networkx', 'csr']:
+                    factory = DataLoaderFactory(cache=False,
+                            graph_backend=backend)
+                    dl = factory.load_data(packed, lazy=True)
+                    try:
+                        self.assertEquals(dl.archive_version, 2)
+                        self.assertEquals(dl.title_items,
+                                expected.title_items)
+                        self.assertEquals(edge_set(dl.graph),
+                                edge_set(expected.graph))
+                        self.assertEquals(edge_set(dl.pattern),
+                                edge_set(expected.pattern))
+                        self.assertEquals(edge_set(dl.big_component),
+                                edge_set(expected.big_component))
+                        self.assertEquals(sorted(dl.tdd.edges()),
+                                sorted(expected.tdd.edges()))
+                        for key in expected.table:
+                            self.assertEquals(dl.table[key],
+                                    expected.table[key])
+                        self.assertEquals(dl.counts_per_colorset.to_dict(),
+                                expected.counts_per_colorset.to_dict())
+                        self.assertEquals([c.tolist() for c in dl.colorings],
+                                [c.tolist() for c in expected.colorings])
+                        # Uncompressed arrays are mapped, aligned, in place
+                        masks = dl.counts_per_colorset.masks
+                        self.assertFalse(masks.flags.writeable)
+                        if not compress:
+                            base = masks
+                            while isinstance(base, np.ndarray):
+                                base = base.base
+                            self.assertTrue(isinstance(base, mmap.mmap))
+                            self.assertEquals(masks.ctypes.data % 16, 0)
+                    finally:
+                        dl.close()
+
+    def test_stored_members(self):
+        stored = path.join(self.directory, 'stored.zip')
+        with ZipFile(self.filename, 'r') as archive, \
+                ZipFile(stored, 'w', ZIP_STORED) as out:
+            for name in archive.namelist():
+                out.writestr(name, archive.read(name))
+            out.writestr('compressed.txt', 'a\nb', ZIP_DEFLATED)
+
+        with open_archive(stored) as archive:
+            for name in archive.namelist():
+                mapped = map_member(archive, name)
+                if name == 'compressed.txt' or name.endswith('/'):
+                    self.assertTrue(mapped is None)
+                    continue
+                with mapped:
+                    self.assertEquals(mapped.read(), archive.read(name))
+            # Reading in pieces and by line
+            with map_member(archive, 'count/tdd.txt') as mapped:
+                lines = archive.read('count/tdd.txt').splitlines(True)
+                self.assertEquals(mapped.readline(), lines[0])
+                self.assertEquals(mapped.read(1), lines[1][0])
+                self.assertEquals(list(mapped), [lines[1][1:]] + lines[2:])
+                self.assertEquals(mapped.read(), '')
+
+        dl = self.dlf.load_data(stored, lazy=True)
+        try:
+            dl.map_size = 0
+            self.assertLoadsSame(dl)
+        finally:
+            dl.close()
+
+    def test_validate(self):
+        packed = path.join(self.directory, 'packed.zip')
+        pack(self.filename, packed)
+        for filename in [self.filename, packed,
+                path.join(archive_dir, 'netscience_p4.zip')]:
+            self.assertEquals(self.dlf.validate(filename), [])
+            # Large members are only sampled at their ends
+            with open_archive(filename) as archive:
+                dl = self.dlf.data_loader(archive)
+                dl.sample_size = 64
+                self.assertEquals(dl.validate(), [])
+
+        error = path.join(path.dirname(archive_dir), 'examples',
+                'karate_error.zip')
+        self.assertEquals(self.dlf.validate(error),
+                ["Unknown pipeline 'concussion'"])
+        with self.assertRaises(UnknownPipelineError):
+            self.dlf.load_data(error)
+
+        # Every problem is reported, including those at the ends of members
+        # which are too large to be read whole
+        broken = path.join(self.directory, 'broken.zip')
+        with ZipFile(self.filename, 'r') as archive, \
+                ZipFile(broken, 'w', ZIP_STORED) as out:
+            for name in archive.namelist():
+                if name == 'karate.txt':
+                    continue
+                data = archive.read(name)
+                if name == 'visinfo.cfg':
+                    data = re.sub(r'motif = .*', '', data)
+                elif name == 'color/colorings/2':
+                    data += '7: x\n'
+                elif name == 'count/dp_table.txt':
+                    data = data[:-2]
+                out.writestr(name, data)
+        with open_archive(broken) as archive:
+            dl = self.dlf.data_loader(archive)
+            dl.sample_size = 64
+            self.assertEquals(dl.validate(), [
+                'visinfo.cfg: no motif option in [graphs]',
+                'karate.txt: missing',
+                'color/colorings/2: Malformed coloring file near the end',
+                'count/dp_table.txt: DP table ends in the middle of a block'])
+        with self.assertRaises(InvalidArchiveError) as raised:
+            self.dlf.load_data(broken, lazy=True, validate=True)
+        self.assertEquals(len(raised.exception.problems), 4)
+        self.dlf.load_data(broken, lazy=True).close()
+
+    def test_unvalidated_archive(self):
+        # out.zip names no config file and holds no colorings
+        out = path.join(archive_dir, 'out.zip')
+        self.assertEquals(self.dlf.validate(out), ['visinfo.cfg: the '
+            'pipeline command names no config file'])
+
+        # Library callers load it as they did before validation
+        dl = self.dlf.load_data(out, lazy=True)
+        try:
+            self.assertEquals(dl.graph.number_of_nodes(), 34)
+            rows = list(batch.batch_decompose(dl.graph, dl.colorings[-1], 2,
+                processes=1))
+            self.assertEquals([row['colors'] for row in rows], [(0,)])
+        finally:
+            dl.close()
+        results = bench_suite.run_suite([out], [],
+                bench_suite.parse_options(['--repeat', '1']))
+        self.assertEquals(list(results['errors']), ['out.zip'])
+
+        # The command line tools check it first, and say what is wrong
+        packed = path.join(self.directory, 'packed.zip')
+        stderr = sys.stderr
+        for main, argv in [(batch.main, [out]), (pack_main, [out, packed])]:
+            sys.stderr = StringIO()
+            try:
+                with self.assertRaises(SystemExit) as raised:
+                    main(argv)
+                message = sys.stderr.getvalue()
+            finally:
+                sys.stderr = stderr
+            self.assertEquals(raised.exception.code, 1)
+            self.assertIn('names no config file', message)
+        self.assertFalse(path.exists(packed))
+
+
+class TestGraphReaders(unittest.TestCase):
+
+    def test_read_gml(self):
+        # Matches the original reader on a bundled archive
+        with ZipFile(path.join(archive_dir, 'netscience_p4.zip')) as archive:
+            data = archive.read('netscience.gml')
+        expected = legacy_read_gml(StringIO(data))
+        for chunk_size in [100, 1 << 20]:
+            graph = graphreaders.read_gml_arrays(StringIO(data),
+                    chunk_size).to_networkx()
+            self.assertEquals(sorted(graph.nodes()), sorted(expected.nodes()))
+            self.assertEquals(sorted(graph.edges()), sorted(expected.edges()))
+
+    def test_read_gml_layout(self):
+        # Blocks on one line, strings holding brackets and nested blocks
+        data = ('Creator "someone [1]"\ngraph [ directed 0\n'
+                'node [ id 1 label "a ] b" graphics [ x 1.0 y 2.0 ] ]\n'
+                'node [ id 2 ] node [ id 7 ]\n'
+                'edge [ source 1 target 2 label "multi\nline" ] ]')
+        for chunk_size in [1, 7, 1 << 20]:
+            graph = graphreaders.read_gml_arrays(StringIO(data), chunk_size)
+            self.assertEquals(sorted(graph.nodes().tolist()), [1, 2, 7])
+            self.assertEquals(graph.edges().tolist(), [[1, 2]])
+        for bad in ['graph [ node [ id 1 ]', 'graph [ edge [ source 1 ] ]',
+                'graph [ node [ id "1 ] ]']:
+            with self.assertRaises(ValueError):
+                graphreaders.read_gml_arrays(StringIO(bad))
+
+
+    def test_read_xml(self):
+        edges = [(0, 1), (1, 2), (5, 2)]
+        for writer in write_gexf, write_graphml:
+            out = StringIO()
+            writer(out, edges)
+            for chunk_size in [1, 50, 1 << 16]:
+                graph = graphreaders.read_xml_arrays(
+                        StringIO(out.getvalue()), chunk_size)
+                self.assertEquals(graph.edges().tolist(),
+                        [list(edge) for edge in edges])
+        for bad in ['<graph><edge source="1" target="2"></graph>',
+                '<graph><edge source="1" /></graph>']:
+            with self.assertRaises(ValueError):
+                graphreaders.read_xml_arrays(StringIO(bad))
+
+    def test_read_edgelist(self):
+        # Matches the original reader on a bundled big component
+        with ZipFile(path.join(archive_dir, 'karate_p4.zip')) as archive:
+            data = archive.read('count/big_component.txt')
+        expected = legacy_read_edgelist(StringIO(data))
+        graph = graphreaders.read_edgelist(StringIO(data))
+        self.assertEquals(sorted(graph.edges()), sorted(expected.edges()))
+
+        # Comments, blank lines and chunks ending mid-line; a file large
+        # enough is parsed by worker processes
+        data = '# comment\n1 2\n\n  3\t4\n   # indented\n5 6'
+        for chunk_size in [1, 5, 1 << 20]:
+            for parallel_size in [None, 0]:
+                graph = graphreaders.read_edgelist_arrays(SizedStringIO(data),
+                        parallel_size, 2, chunk_size)
+                self.assertEquals(graph.edges().tolist(),
+                        [[1, 2], [3, 4], [5, 6]])
+        for bad in ['1 2\n3\n', '1 2\n3 x\n', '1 2 3\n']:
+            with self.assertRaises(ValueError):
+                graphreaders.read_edgelist_arrays(StringIO(bad))
+
+    def test_read_leda(self):
+        edges = [(0, 1), (1, 2), (5, 2)]
+        out = StringIO()
+        write_leda(out, edges)
+        data = out.getvalue().replace('\n3\n1 2', '\n3\n# edges\n\n1 2')
+        expected = legacy_read_leda(StringIO(data))
+        for chunk_size in [1, 1 << 20]:
+            for parallel_size in [None, 0]:
+                graph = graphreaders.read_leda_arrays(SizedStringIO(data),
+                        parallel_size, 2, chunk_size)
+                self.assertEquals(graph.edges().tolist(),
+                        [list(edge) for edge in edges])
+        self.assertEquals(sorted(graphreaders.read_leda(
+            StringIO(data)).edges()), sorted(expected.edges()))
+        with self.assertRaises(ValueError):
+            graphreaders.read_leda_arrays(StringIO('LEDA.GRAPH\n'))
+
+
+class TestColoringHistory(unittest.TestCase):
+
+    def setUp(self):
+        """ Sets up the necessary objects to run"""
+        self.colorings = [[0, 0, 0, 0], [0, 1, 0, 0], [0, 1, 2, 0],
+                [0, 1, 2, 0, 3], [0, 1, 2], [4, 1, 2, 0], [4, 1, 2, 0]]
+        self.history = ColoringHistory(self.colorings, keyframe_interval=3)
+
+    def test_get_step(self):
+        self.assertEquals(len(self.history), len(self.colorings))
+        # Every step can be rebuilt, in any order
+        for step in [6, 0, 4, 5, 1, 3, 2, 2, 5]:
+            self.assertEquals(self.history[step].tolist(),
+                    self.colorings[step], msg='Wrong coloring at step {0}'
+                    .format(step))
+        self.assertEquals(self.history[-2].tolist(), self.colorings[-2])
+        self.assertEquals([c.tolist() for c in self.history], self.colorings)
+        with self.assertRaises(IndexError):
+            self.history[len(self.colorings)]
+
+    def test_deltas(self):
+        # Only the vertices that changed color are stored for each step
+        self.assertEquals(self.history.changed_vertices(1).tolist(), [1])
+        self.assertEquals(self.history.changed_vertices(4).tolist(), [4])
+        self.assertEquals(self.history.changed_vertices(6).tolist(), [])
+        self.assertEquals(self.history.color_set(3), {0, 1, 2, 3})
+
+    def test_lazy_history(self):
+        read = []
+        def read_step(step):
+            read.append(step)
+            return self.colorings[step]
+        lazy = LazyColoringHistory(read_step, len(self.colorings),
+                cached_steps=2)
+        self.assertEquals(len(lazy), len(self.colorings))
+        # Only the steps asked for are read, and recent ones are kept
+        self.assertEquals(lazy[-1].tolist(), self.colorings[-1])
+        self.assertEquals(lazy[3].tolist(), self.colorings[3])
+        self.assertEquals(lazy[6].tolist(), self.colorings[6])
+        self.assertEquals(read, [6, 3])
+        self.assertEquals(lazy.changed_vertices(4).tolist(), [4])
+        self.assertEquals(read, [6, 3, 4])
+        self.assertEquals(lazy.color_set(3), {0, 1, 2, 3})
+        with self.assertRaises(IndexError):
+            lazy[len(self.colorings)]
+
+        for step in range(len(self.colorings)):
+            self.assertEquals(lazy.changed_vertices(step).tolist(),
+                    self.history.changed_vertices(step).tolist())
+        restored = ColoringHistory.from_arrays(lazy.to_arrays())
+        self.assertEquals([c.tolist() for c in restored], self.colorings)
+
+    def tearDown(self):
+        """Cleans up after tests are run"""
+
+
+class TestColorsetCounts(unittest.TestCase):
+
+    def setUp(self):
+        """ Sets up the necessary objects to run"""
+        self.data = ('0,1,2 : 62\n0,1,2,3 : 266\n(1, 2, 70) : 7\n'
+                '0,1,3 : 10\n1,2 : 5\n0,1,2 : 63\n')
+        self.counts = read_colorset_counts(StringIO(self.data), chunk_size=16)
+
+    def test_read(self):
+        # Later lines win, as they did when the file was read into a dict
+        self.assertEquals(self.counts.to_dict(), {(0, 1, 2): 63,
+            (0, 1, 2, 3): 266, (1, 2, 70): 7, (0, 1, 3): 10, (1, 2): 5})
+        self.assertEquals(self.counts[(2, 1, 0)], 63)
+        self.assertEquals(self.counts.get((0, 1)), None)
+        self.assertFalse((1, 2, 200) in self.counts)
+        with self.assertRaises(ValueError):
+            read_colorset_counts(StringIO('0,1,2 : 62\n0,x,2 : 3\n'))
+
+    def test_bundled_counts(self):
+        # Matches the original literal_eval parser on a bundled archive
+        with ZipFile(path.join(archive_dir, 'netscience_p4.zip')) as archive:
+            data = archive.read('combine/counts_per_colorset.txt')
+        expected = {}
+        for line in data.splitlines():
+            colorset, count = line.split(':')
+            expected[ast.literal_eval(colorset.strip())] = int(count)
+        self.assertEquals(read_colorset_counts(StringIO(data)).to_dict(),
+                expected)
+        self.assertEquals(ColorsetCounts.from_dict(expected).to_dict(),
+                expected)
+
+    def test_queries(self):
+        self.assertEquals(self.counts.totals_by_size(), {2: 5, 3: 80, 4: 266})
+        self.assertEquals(sorted(self.counts.of_size(3).keys()),
+                [(0, 1, 2), (0, 1, 3), (1, 2, 70)])
+        self.assertEquals(sorted(self.counts.group_by_size()[2].keys()),
+                [(1, 2)])
+        # Sizes asked for are there even with no color sets, as for the
+        # totals page of the Combine tab
+        counts = self.counts.select(self.counts.sizes() != 3)
+        self.assertEquals(sorted(counts.group_by_size()), [2, 4])
+        by_size = counts.group_by_size(range(2, 5))
+        self.assertEquals(sorted(by_size), [2, 3, 4])
+        self.assertEquals(by_size[3].colorsets(5), [])
+        self.assertEquals(sorted(by_size[4].keys()), [(0, 1, 2, 3)])
+        self.assertEquals(sorted(self.counts.subsets((0, 1, 2, 3)).keys()),
+                [(0, 1, 2), (0, 1, 2, 3), (0, 1, 3), (1, 2)])
+        self.assertEquals(sorted(self.counts.supersets((1, 2)).keys()),
+                [(0, 1, 2), (0, 1, 2, 3), (1, 2), (1, 2, 70)])
+        self.assertEquals(len(self.counts.supersets((1, 100))), 0)
+
+    def tearDown(self):
+        """Cleans up after tests are run"""
 
-from beavr.concuss import visualizerbackend
 
 class TestDecompositionGenerator(unittest.TestCase):
 
@@ -49,6 +871,103 @@ class TestDecompositionGenerator(unittest.TestCase):
         # Assert that it has no edges
         self.assertEquals(comps[1].edges(), [], msg='Wrong edge set')
 
+    def test_csr_graph_components(self):
+        # A CSRGraph host graph gives the same components as NetworkX
+        csr_generator = visualizerbackend.DecompositionGenerator(
+                CSRGraph.from_networkx(self.graph), self.coloring)
+        for cs in [{0, 1, 2}, {0, 1, 5}, {1, 3, 5}, set()]:
+            expected = self.decomp_generator.get_connected_components(cs)
+            comps = csr_generator.get_connected_components(cs)
+            self.assertEquals(sorted(sorted(c.edges()) for c in comps),
+                    sorted(sorted(c.edges()) for c in expected))
+            self.assertEquals(sorted(c.occ for c in comps),
+                    sorted(c.occ for c in expected))
+
+    def test_decompose_cache(self):
+        comps, layouts = self.decomp_generator.decompose({0, 1, 5})
+        self.assertEquals([c.nodes() for c in comps], [[0, 1], [5]])
+        self.assertEquals(len(layouts), 2)
+        # Coming back to a color set reuses its components and layouts
+        self.decomp_generator.decompose({2, 3})
+        again = self.decomp_generator.decompose(frozenset([5, 1, 0]))
+        self.assertTrue(again[0] is comps and again[1] is layouts)
+        self.assertEquals(self.decomp_generator.cached_bytes,
+                visualizerbackend.decomposition_size(comps) +
+                visualizerbackend.decomposition_size(
+                    self.decomp_generator.cache[frozenset([2, 3])][0]))
+
+        # The least recently used are dropped once the cache is too big, but
+        # the latest is always kept
+        self.decomp_generator.cache_size = 1
+        self.decomp_generator.decompose({2, 3})
+        self.assertEquals(self.decomp_generator.cache.keys(),
+                [frozenset([2, 3])])
+        self.assertFalse(self.decomp_generator.decompose({0, 1, 5})[0]
+                is comps)
+
+    def test_incremental_components(self):
+        # Toggling colors one at a time keeps the same components as
+        # computing them from scratch, on both backends
+        rng = np.random.RandomState(0)
+        graph = nx.gnm_random_graph(200, 400, seed=1)
+        coloring = rng.randint(0, 6, 200).tolist()
+        for host in (graph, CSRGraph.from_networkx(graph)):
+            components = IncrementalComponents(host, coloring)
+            color_set = set()
+            for color in rng.randint(0, 7, 60).tolist():
+                color_set ^= {color}
+                components.set_colors(color_set)
+                expected = list(nx.connected_component_subgraphs(
+                    graph.subgraph([v for v in graph
+                        if coloring[v] in color_set])))
+                graphs = components.component_graphs()
+                self.assertEquals(sorted(sorted(c) for c in graphs),
+                        sorted(sorted(c) for c in expected))
+                self.assertEquals(sorted(sorted(map(sorted, c.edges()))
+                    for c in graphs), sorted(sorted(map(sorted, c.edges()))
+                        for c in expected))
+                self.assertTrue(all(c.node[v]['color'] == coloring[v]
+                    for c in graphs for v in c))
+
+        # Components away from a toggled color keep their graphs
+        components = IncrementalComponents(self.graph, self.coloring)
+        components.set_colors({0, 1, 4, 5})
+        before = components.component_graphs()
+        components.remove_color(0)
+        after = components.component_graphs()
+        self.assertTrue(after[1] is before[1])
+        self.assertEquals(after[0].nodes(), [1])
+
+    def test_isomorphic_components(self):
+        # Components are only counted together if they are isomorphic with
+        # their colors kept
+        path = nx.path_graph(3)
+        reversed_path = nx.relabel_nodes(path, lambda v: 2 - v)
+        cube = nx.cubical_graph()
+        reversed_cube = nx.relabel_nodes(cube, lambda v: 7 - v)
+        wagner = nx.circulant_graph(8, [1, 4])
+        parts = [(path, [0, 1, 2]), (cube, [0] * 8), (path, [1, 0, 2]),
+                (reversed_path, [2, 1, 0]), (wagner, [0] * 8),
+                (reversed_cube, [0] * 8)]
+        graph = nx.Graph()
+        coloring = []
+        for part, colors in parts:
+            graph.add_edges_from((u + len(coloring), v + len(coloring))
+                    for u, v in part.edges())
+            coloring.extend(colors)
+        generator = visualizerbackend.DecompositionGenerator(graph, coloring)
+        comps = generator.get_connected_components({0, 1, 2})
+        self.assertEquals([(len(c), c.occ) for c in comps],
+                [(3, 2), (8, 2), (3, 1), (8, 1)])
+
+        # The cube and the Wagner graph are both 3-regular, so colors and
+        # degrees alone cannot tell them apart
+        for part in (cube, wagner):
+            for v in part:
+                part.node[v]['color'] = 0
+        self.assertEquals(visualizerbackend.component_fingerprint(cube),
+                visualizerbackend.component_fingerprint(wagner))
+
     def test_get_tree_layout(self):
         # Get a tree layout of the whole original graph
         layout = self.decomp_generator.get_tree_layout(self.graph)
@@ -67,6 +986,122 @@ class TestDecompositionGenerator(unittest.TestCase):
         """Cleans up after tests are run"""
 
 
+class TestColorIndex(unittest.TestCase):
+
+    def setUp(self):
+        """ Sets up the necessary objects to run"""
+        self.graph = nx.gnm_random_graph(60, 150, seed=3)
+        self.coloring = np.random.RandomState(2).choice([2, 5, 7, 11], 60)
+        self.index = ColorIndex(self.graph, self.coloring)
+
+    def test_classes_and_pairs(self):
+        for color in [2, 5, 7, 11]:
+            self.assertEquals(sorted(self.index.color_class(color)),
+                    [v for v in self.graph if self.coloring[v] == color])
+            for other in [2, 5, 7, 11]:
+                expected = sorted((u, v) if self.coloring[u] == color else
+                        (v, u) for u, v in self.graph.edges()
+                        if {self.coloring[u], self.coloring[v]} ==
+                        {color, other})
+                self.assertEquals(sorted(map(tuple,
+                    self.index.pair_edges(color, other).tolist())), expected)
+        self.assertEquals(len(self.index.color_class(3)), 0)
+        self.assertEquals(self.index.pair_edges(2, 3).shape, (0, 2))
+
+    def test_subgraph(self):
+        # Induced subgraphs match NetworkX's, on both backends
+        for graph in (self.graph, CSRGraph.from_networkx(self.graph)):
+            index = ColorIndex(graph, self.coloring)
+            for color_set in [set(), {5}, {2, 11}, {2, 5, 7, 11}]:
+                expected = self.graph.subgraph([v for v in self.graph
+                    if self.coloring[v] in color_set])
+                subgraph = index.subgraph(color_set)
+                self.assertEquals(subgraph.nodes(), sorted(expected))
+                self.assertEquals(sorted(subgraph.edges()),
+                        sorted(tuple(sorted(e)) for e in expected.edges()))
+                self.assertEquals(index.in_colors(np.arange(60),
+                    color_set).tolist(),
+                    [c in color_set for c in self.coloring])
+
+    def tearDown(self):
+        """Cleans up after tests are run"""
+
+
+class TestBatchDecompose(unittest.TestCase):
+
+    def setUp(self):
+        """ Sets up the necessary objects to run"""
+        self.graph = nx.gnm_random_graph(80, 120, seed=4)
+        self.coloring = np.random.RandomState(5).randint(0, 5, 80)
+
+    def test_batch_decompose(self):
+        progress = []
+        rows = list(batch.batch_decompose(self.graph, self.coloring, 3,
+                processes=1, progress=lambda *args: progress.append(args)))
+        self.assertEquals([row['colors'] for row in rows],
+                list(batch.enumerate_color_sets(range(5), 3)))
+        self.assertEquals(progress[-1], (25, 25))
+        self.assertEquals(batch.count_color_sets(5, 3), 25)
+        self.assertEquals(batch.count_color_sets(100, 5), sum(
+            batch.binomial(100, size) for size in range(1, 6)))
+        self.assertEquals(batch.binomial(100, 5), 75287520)
+        for row in rows:
+            subgraph = self.graph.subgraph([v for v in self.graph
+                if self.coloring[v] in row['colors']])
+            sizes = sorted(len(c) for c in nx.connected_components(subgraph))
+            self.assertEquals(row['vertices'], len(subgraph))
+            self.assertEquals(row['edges'], subgraph.number_of_edges())
+            self.assertEquals(row['components'], len(sizes))
+            self.assertEquals(row['largest'], max(sizes))
+            self.assertEquals(sum([[size] * n for size, n in row['sizes']],
+                []), sizes)
+            self.assertTrue(row['classes'] <= row['components'])
+
+        # Worker processes find the same, from either kind of host graph
+        self.assertEquals(list(batch.batch_decompose(CSRGraph.from_networkx(
+            self.graph), self.coloring, 3, processes=2)), rows)
+
+        # Rows are found as they are taken, and the workers stop with them
+        found = batch.batch_decompose(self.graph, self.coloring, 3,
+                processes=2)
+        self.assertEquals(next(found), rows[0])
+        found.close()
+
+        cancel_event = threading.Event()
+        cancel_event.set()
+        with self.assertRaises(batch.BatchCancelledError):
+            list(batch.batch_decompose(self.graph, self.coloring, 3,
+                processes=2, cancel_event=cancel_event))
+
+    def test_table(self):
+        rows = list(batch.batch_decompose(self.graph, self.coloring, 2,
+                processes=1))
+        out = StringIO()
+        batch.write_table(rows, out)
+        self.assertEquals(batch.read_table(StringIO(out.getvalue())), rows)
+        with self.assertRaises(ValueError):
+            batch.read_table(['colors\tsize\n'])
+
+        ranked = batch.rank(rows, 'components', 3)
+        self.assertEquals(len(ranked), 3)
+        self.assertEquals(ranked[0]['components'],
+                max(row['components'] for row in rows))
+        self.assertTrue(ranked[0]['components'] >= ranked[1]['components']
+                >= ranked[2]['components'])
+        with self.assertRaises(ValueError):
+            batch.rank(rows, 'colors')
+
+        # Keeping the highest ranked rows as they come in ranks the same
+        kept = batch.top_rows(iter(rows), 1)
+        self.assertTrue(len(kept) < len(rows))
+        for column in batch.rank_columns:
+            self.assertEquals(batch.rank(kept, column, 1),
+                    batch.rank(rows, column, 1))
+
+    def tearDown(self):
+        """Cleans up after tests are run"""
+
+
 class TestCountGenerator(unittest.TestCase):
 
     def setUp(self):
@@ -119,6 +1154,103 @@ class TestCombineSetGenerator(unittest.TestCase):
         """Cleans up after tests are run"""
 
 
+class TestBenchSuite(unittest.TestCase):
+
+    def setUp(self):
+        """ Sets up the necessary objects to run"""
+        self.filename = path.join(archive_dir, 'karate_p4.zip')
+        self.directory = tempfile.mkdtemp()
+        self.options = bench_suite.parse_options(['--repeat', '1',
+            '--color-sets', '2', '--scale-source', self.filename])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_run_suite_errors(self):
+        # Inputs which cannot be benchmarked are noted, and the rest run
+        results = bench_suite.run_suite([path.join(archive_dir, 'out.zip'),
+            self.filename], [], self.options)
+        self.assertEquals(sorted(results['errors']), ['out.zip'])
+        self.assertEquals(sorted(results['inputs']), ['karate_p4.zip'])
+
+    def test_scale_archive(self):
+        scaled = path.join(self.directory, 'scaled')
+        bench_suite.scale_archive(self.filename, scaled, 3)
+        dl = DataLoaderFactory(cache=False).load_data(scaled)
+        expected = DataLoaderFactory(cache=False).load_data(self.filename)
+        n = expected.graph.number_of_nodes()
+        self.assertEquals(dl.graph.number_of_nodes(), 3 * n)
+        self.assertEquals(dl.graph.number_of_edges(),
+                3 * expected.graph.number_of_edges())
+        self.assertEquals(dl.colorings[-1].tolist(),
+                expected.colorings[-1].tolist() * 3)
+        self.assertEquals(dl.table.keys(), expected.table.keys())
+
+    def test_synthetic_archive(self):
+        filename = path.join(self.directory, 'synthetic.zip')
+        generate_synthetic(filename, 2000, colors=10, pattern_size=3,
+                steps=4)
+        dl = DataLoaderFactory(cache=False).load_data(filename)
+        self.assertTrue(1900 < dl.graph.number_of_nodes() <= 2000)
+        # Each step changes fewer vertices, down to the coloring by depth
+        changed = [len(dl.colorings.changed_vertices(step))
+                for step in range(1, 4)]
+        self.assertEquals(changed, sorted(changed, reverse=True))
+        self.assertEquals(len(dl.colorings.color_set(-1)), 10)
+        # Every color set of 2 or 3 of the 10 colors is counted
+        self.assertEquals(len(dl.counts_per_colorset), 45 + 120)
+
+        # The TDD is a tree on the big component, whose edges join vertices
+        # to their ancestors
+        component = dl.big_component
+        self.assertTrue(nx.is_connected(component))
+        self.assertEquals(sorted(dl.tdd.nodes()), sorted(component.nodes()))
+        self.assertEquals(dl.tdd.number_of_edges(),
+                component.number_of_nodes() - 1)
+        for u, v in component.edges():
+            self.assertTrue(nx.has_path(dl.tdd, u, v) or
+                    nx.has_path(dl.tdd, v, u))
+        for key in dl.table.keys():
+            self.assertTrue(set(key) <= set(component.nodes()))
+
+        # The Count tab finds k-patterns in the table
+        np.random.seed(0)
+        generator = visualizerbackend.CountGenerator(component, dl.pattern,
+                dl.tdd, dl.table, dl.colorings[-1], 'brewer')
+        self.assertEquals(len(generator.k_patterns),
+                generator.k_pat_count)
+
+        # The same seed makes the same archive
+        again = path.join(self.directory, 'again.zip')
+        generate_synthetic(again, 2000, colors=10, pattern_size=3, steps=4)
+        with ZipFile(filename) as first, ZipFile(again) as second:
+            for name in first.namelist():
+                self.assertEquals(first.read(name), second.read(name))
+
+    def test_run_suite(self):
+        results = bench_suite.run_suite([self.filename], [2], self.options,
+                synthetic=[500])
+        self.assertEquals(sorted(results['inputs']),
+                ['karate_p4.zip', 'karate_p4x2', 'synthetic-500'])
+        self.assertEquals(results['errors'], {})
+        benchmarks = set((r['input'], r['benchmark'])
+                for r in results['results'])
+        for input_name in results['inputs']:
+            for benchmark in ['load.graph', 'load.colorings',
+                    'decompose.color_index', 'decompose.connected_components',
+                    'decompose.tree_layouts', 'decompose.toggle',
+                    'count.init',
+                    'count.attributes', 'combine.color_sets']:
+                self.assertIn((input_name, benchmark), benchmarks)
+
+        # A run compared with itself matches every benchmark
+        rows = bench_suite.compare(results, results)
+        self.assertEquals(len(rows), len(set(bench_suite.result_key(r)
+            for r in results['results'])))
+        for row in rows:
+            self.assertEquals(row[3], row[4])
+
+
 suite = unittest.TestLoader().loadTestsFromTestCase(TestDecompositionGenerator)
 suite = unittest.TestLoader().loadTestsFromTestCase(TestCombineSetGenerator)
 
@@ -5,7 +5,10 @@
 #
 
 import unittest
-from beavr import util
+
+import networkx as nx
+
+from beavr import util, csrgraph
 
 class TestUtil(unittest.TestCase):
 
@@ -77,3 +80,76 @@ suite = unittest.TestLoader().loadTestsFromTestCase(TestUtil)
 
 if __name__ == '__main__':
     unittest.main()
+
+
+class TestCSRGraph(unittest.TestCase):
+
+    def setUp(self):
+        """ Sets up the necessary data structures and variables before tests are run """
+        self.graph = nx.Graph()
+        self.graph.add_nodes_from([0, 3, 9, 12])
+        self.graph.add_edges_from([(1, 2), (2, 4), (4, 1), (5, 6), (6, 6),
+            (7, 8), (8, 10), (10, 11), (11, 5), (2, 1)])
+        self.csr = csrgraph.CSRGraph.from_networkx(self.graph)
+
+    def tearDown(self):
+        """ Cleans up after tests are run """
+
+    def test_structure(self):
+        """ Tests the vertices, edges, degrees and neighbors """
+        self.assertEqual(self.csr.nodes(), sorted(self.graph.nodes()))
+        self.assertEqual(sorted(self.csr.edges()),
+                sorted(tuple(sorted(e)) for e in self.graph.edges()))
+        self.assertEqual(self.csr.number_of_edges(),
+                self.graph.number_of_edges())
+        self.assertEqual(sorted(map(tuple, self.csr.edge_array().tolist())),
+                sorted(self.csr.edges()))
+        self.assertEqual(self.csr.degree(2), 2)
+        self.assertEqual(self.csr.degree(3), 0)
+        self.assertEqual(self.csr.neighbors(5), [6, 11])
+        self.assertTrue(self.csr.has_edge(4, 2))
+        self.assertFalse(self.csr.has_edge(4, 5))
+        self.assertTrue(12 in self.csr)
+        self.assertFalse(13 in self.csr)
+        with self.assertRaises(KeyError):
+            self.csr.neighbors(13)
+
+    def test_components(self):
+        """ Tests connected components, matching NetworkX """
+        expected = sorted(sorted(c) for c in
+                nx.connected_components(self.graph))
+        actual = sorted(c.tolist() for c in self.csr.connected_components())
+        self.assertEqual(actual, expected)
+
+    def test_subgraph(self):
+        """ Tests induced subgraphs and their components """
+        vertices = [1, 2, 5, 6, 7, 8, 10, 11, 13]
+        expected = self.graph.subgraph(vertices)
+        subgraph = self.csr.subgraph(vertices)
+        self.assertEqual(subgraph.nodes(), sorted(expected.nodes()))
+        self.assertEqual(sorted(subgraph.edges()),
+                sorted(tuple(sorted(e)) for e in expected.edges()))
+
+        components = csrgraph.connected_component_subgraphs(self.csr,
+                vertices)
+        self.assertEqual(sorted(sorted(c.edges()) for c in components),
+                sorted(sorted(c.edges()) for c in
+                    nx.connected_component_subgraphs(expected)))
+
+    def test_incident_edges(self):
+        """ Tests the edges at a set of vertices, for both backends """
+        vertices = [5, 3, 2]
+        expected = sorted((v, u) for v in vertices
+                for u in self.graph.neighbors(v))
+        for graph in (self.graph, self.csr):
+            edges = csrgraph.incident_edges(graph, vertices)
+            self.assertEqual(edges.shape, (len(expected), 2))
+            self.assertEqual(sorted(map(tuple, edges.tolist())), expected)
+        self.assertEqual(csrgraph.incident_edges(self.csr, []).shape, (0, 2))
+
+    def test_spring_layout(self):
+        """ Tests that every vertex gets a position in the unit square """
+        layout = self.csr.spring_layout(iterations=10)
+        self.assertEqual(sorted(layout), self.csr.nodes())
+        for x, y in layout.itervalues():
+            self.assertTrue(0 <= x <= 1 and 0 <= y <= 1)